@@ -0,0 +1,33 @@
+"""
+Time the graph.py and core.py hot paths at 10/100/1k/10k nodes with pytest-benchmark.
+The results are saved in .benchmarks so that each run is compared with the previous one
+and the run fail when a hot path become slower than the threshold.
+
+pip install pytest-benchmark
+python -m pytest -q benchmark/bench_hot_paths.py --benchmark-autosave --benchmark-compare --benchmark-compare-fail=median:50%
+"""
+from pathlib import Path
+import sys
+
+import pytest
+
+# skip instead of fail when pytest-benchmark is not installed
+pytest.importorskip("pytest_benchmark")
+
+sys.path.insert(0,str(Path(__file__).resolve().parent))
+
+from hot_paths import (
+    NODE_COUNTS,
+    HOT_PATH_NAMES,
+    get_hot_path_calls
+)
+
+@pytest.mark.parametrize("node_count",NODE_COUNTS)
+@pytest.mark.parametrize("hot_path_name",HOT_PATH_NAMES)
+def test_hot_path(benchmark,hot_path_name:str,node_count:int):
+
+    benchmark.group = hot_path_name
+
+    benchmark.extra_info["node_count"] = node_count
+
+    benchmark(get_hot_path_calls(node_count=node_count)[hot_path_name])
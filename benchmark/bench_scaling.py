@@ -0,0 +1,88 @@
+"""
+Fail when a graph.py or core.py hot path grow faster than linear (such as quadratic) with the number of nodes.
+The time at LARGE_NODE_COUNT is compared with the time at SMALL_NODE_COUNT on the same machine
+so that the check does not depend on how fast the machine is.
+
+python -m pytest -q benchmark/bench_scaling.py
+"""
+from pathlib import Path
+from typing import (
+    Callable,
+    Any
+)
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0,str(Path(__file__).resolve().parent))
+
+from hot_paths import (
+    HOT_PATH_NAMES,
+    get_hot_path_calls
+)
+
+SMALL_NODE_COUNT = 1000
+
+LARGE_NODE_COUNT = 10000
+
+# linear (or n log n) is about 10-15 times slower at 10 times the nodes , quadratic is about 100 times
+MAX_SCALING_RATIO = 35
+
+REPEAT_COUNT = 5
+
+# the calls are repeated until they take at least this long so that the timer resolution does not matter
+MIN_TIMED_SECONDS = 0.02
+
+def get_seconds_per_call(call:Callable[[],Any],call_count:int)->float:
+    """
+    Fastest of REPEAT_COUNT timings so that the other processes of the machine affect it less
+    """
+
+    best_seconds = float("inf")
+
+    for _ in range(REPEAT_COUNT):
+
+        start_time = time.perf_counter()
+
+        for _ in range(call_count):
+            call()
+
+        best_seconds = min(best_seconds,time.perf_counter()-start_time)
+
+    return best_seconds/call_count
+
+def get_call_count(call:Callable[[],Any])->int:
+
+    call_count = 1
+
+    while True:
+
+        start_time = time.perf_counter()
+
+        for _ in range(call_count):
+            call()
+
+        if time.perf_counter()-start_time>=MIN_TIMED_SECONDS:
+            return call_count
+
+        call_count *= 2
+
+@pytest.mark.parametrize("hot_path_name",HOT_PATH_NAMES)
+def test_hot_path_scale_linearly(hot_path_name:str):
+
+    small_call = get_hot_path_calls(node_count=SMALL_NODE_COUNT)[hot_path_name]
+
+    large_call = get_hot_path_calls(node_count=LARGE_NODE_COUNT)[hot_path_name]
+
+    small_call_count = get_call_count(call=small_call)
+
+    small_seconds = get_seconds_per_call(call=small_call,call_count=small_call_count)
+
+    large_seconds = get_seconds_per_call(call=large_call,\
+                                         call_count=max(1,small_call_count*SMALL_NODE_COUNT//LARGE_NODE_COUNT))
+
+    ratio = large_seconds/small_seconds
+
+    assert ratio<MAX_SCALING_RATIO,\
+        f"{hot_path_name} is {ratio:.0f} times slower at {LARGE_NODE_COUNT} nodes than at {SMALL_NODE_COUNT} nodes"
@@ -0,0 +1,83 @@
+"""
+Compare the single walk find_base_tables with the two walk version it replaced
+over the parsed query corpus.
+
+python benchmark/find_base_tables.py
+"""
+from pathlib import Path
+from typing import (
+    Callable,
+    List,
+    Set
+)
+import sys
+import time
+
+sys.path.insert(0,str(Path(__file__).resolve().parent.parent.joinpath("src")))
+
+from sqlglot import (
+    parse_one,
+    exp
+)
+from sqlglot.expressions import Expression
+from lineage import find_base_tables
+from sql_corpus import QUERY_CORPUS
+
+ROUND_COUNT = 200
+
+def two_walk_find_base_tables(ast:Expression)->Set[str]:
+    """
+    find_base_tables before it was changed to one walk
+    """
+
+    ctes:Set[str] = set()
+
+    tables:Set[str] = set()
+
+    for cte in ast.find_all(exp.CTE):
+        ctes.add(cte.alias_or_name)
+
+    for table in ast.find_all(exp.Table):
+        if table.name not in ctes:
+
+            table_name = table.name
+
+            if table.args.get("db") is not None:
+                table_name = table.args["db"].name+"."+table_name
+
+            if table.args.get("catalog") is not None:
+                table_name = table.args["catalog"].name+"."+table_name
+
+            tables.add(table_name)
+
+    return tables
+
+def get_queries_per_second(func:Callable[[Expression],Set[str]],asts:List[Expression])->float:
+
+    start_time = time.perf_counter()
+
+    for _ in range(ROUND_COUNT):
+        for ast in asts:
+            func(ast)
+
+    return ROUND_COUNT*len(asts)/(time.perf_counter()-start_time)
+
+def main()->None:
+
+    for dialect,queries in QUERY_CORPUS:
+
+        asts = [parse_one(sql=x,dialect=dialect) for x in queries]
+
+        for ast in asts:
+            assert find_base_tables(ast)==two_walk_find_base_tables(ast)
+
+        two_walk_qps = get_queries_per_second(func=two_walk_find_base_tables,asts=asts)
+
+        one_walk_qps = get_queries_per_second(func=find_base_tables,asts=asts)
+
+        print(f"{dialect:<8} two walk:{two_walk_qps:>10.0f} query/s "
+              f"one walk:{one_walk_qps:>10.0f} query/s "
+              f"speedup:{one_walk_qps/two_walk_qps:.2f}x")
+
+if __name__=="__main__":
+    main()
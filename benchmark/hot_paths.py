@@ -0,0 +1,241 @@
+"""
+Synthetic inputs of the graph.py and core.py hot paths which scale with the number of nodes.
+Used by bench_hot_paths.py (timing) and bench_scaling.py (quadratic regression check)
+"""
+from pathlib import Path
+from typing import (
+    List,
+    Dict,
+    Tuple,
+    Callable,
+    Any
+)
+import random
+import sys
+
+sys.path.insert(0,str(Path(__file__).resolve().parent.parent.joinpath("src")))
+
+from model import (
+    Activity,
+    ActivityType
+)
+from graph import (
+    Edge,
+    remove_node,
+    replace_node_with_edge,
+    merge_edges
+)
+from core import (
+    get_virtual_graph,
+    resolve_expression,
+    normalize_blob_path
+)
+
+# number of nodes each hot path is timed at
+NODE_COUNTS = [10,100,1000,10000]
+
+SUPPORTED_ACTIVITY_TYPES = [ActivityType.Copy,ActivityType.Procedure,ActivityType.Script]
+
+class ActivityTreeBuilder:
+    """
+    Build the activities of the pipeline which have node_count activities in total.
+    The top level is the chain of the activities which continue until all the activities are built.
+    The ForEach and If activities have width activities in their branches and are nested until depth
+    """
+    def __init__(self,\
+                 node_count:int,\
+                 width:int=5,\
+                 depth:int=3,\
+                 nesting_ratio:float=0.2,\
+                 unsupported_ratio:float=0.1,\
+                 seed:int=0):
+        """
+        nesting_ratio : fraction of the activities which are ForEach or If
+        unsupported_ratio : fraction of the other activities which are not supported (removed from the virtual graph)
+        """
+
+        self.node_count = node_count
+        self.width = width
+        self.depth = depth
+        self.nesting_ratio = nesting_ratio
+        self.unsupported_ratio = unsupported_ratio
+
+        self.randomizer = random.Random(seed)
+
+        self.built_count = 0
+
+    def get_activity(self,level:int,depends_on:List[str])->Activity:
+
+        self.built_count += 1
+
+        name = f"Activity{self.built_count}"
+
+        if level<self.depth and self.randomizer.random()<self.nesting_ratio:
+
+            if self.randomizer.random()<0.5:
+                return Activity(activity_name=name,\
+                                activity_type=ActivityType.ForEach,\
+                                depends_on=depends_on,\
+                                body_children=self.get_branch(level=level+1))
+
+            return Activity(activity_name=name,\
+                            activity_type=ActivityType.If,\
+                            depends_on=depends_on,\
+                            true_children=self.get_branch(level=level+1),\
+                            false_children=self.get_branch(level=level+1))
+
+        if self.randomizer.random()<self.unsupported_ratio:
+            activity_type = ActivityType.Unsupported
+        else:
+            activity_type = self.randomizer.choice(SUPPORTED_ACTIVITY_TYPES)
+
+        return Activity(activity_name=name,\
+                        activity_type=activity_type,\
+                        depends_on=depends_on)
+
+    def get_depends_on(self,activities:List[Activity])->List[str]:
+        """
+        Depend on the previous activity and sometimes on one more activity before it
+        """
+
+        if len(activities)==0:
+            return list()
+
+        depends_on = [activities[-1].activity_name]
+
+        if len(activities)>1 and self.randomizer.random()<0.3:
+            depends_on.append(self.randomizer.choice(activities[:-1]).activity_name)
+
+        return depends_on
+
+    def get_branch(self,level:int)->List[Activity]:
+
+        activities:List[Activity] = list()
+
+        while len(activities)<self.width and self.built_count<self.node_count:
+            activities.append(self.get_activity(level=level,\
+                                                depends_on=self.get_depends_on(activities=activities[-3:])))
+
+        return activities
+
+    def build(self)->List[Activity]:
+
+        activities:List[Activity] = list()
+
+        while self.built_count<self.node_count:
+            activities.append(self.get_activity(level=0,\
+                                                depends_on=self.get_depends_on(activities=activities[-3:])))
+
+        return activities
+
+def get_activity_tree(node_count:int,\
+                      width:int=5,\
+                      depth:int=3,\
+                      nesting_ratio:float=0.2,\
+                      unsupported_ratio:float=0.1,\
+                      seed:int=0)->List[Activity]:
+    return ActivityTreeBuilder(node_count=node_count,\
+                               width=width,\
+                               depth=depth,\
+                               nesting_ratio=nesting_ratio,\
+                               unsupported_ratio=unsupported_ratio,\
+                               seed=seed).build()
+
+def get_edges(node_count:int,prefix:str="Node",seed:int=0)->List[Edge]:
+    """
+    Graph of node_count nodes where each node depend on one or two of the few nodes before it
+    """
+
+    randomizer = random.Random(seed)
+
+    edges:List[Edge] = list()
+
+    for index in range(node_count):
+
+        parent_nodes:List[str] = list()
+
+        if index>0:
+            parent_nodes = [f"{prefix}{x}" for x in sorted(set(randomizer.randint(max(0,index-5),index-1) for _ in range(2)))]
+
+        edges.append(Edge(node_name=f"{prefix}{index}",parent_nodes=parent_nodes))
+
+    return edges
+
+def get_lineage_graphs(node_count:int,seed:int=0)->List[List[Edge]]:
+    """
+    Lineage of the activities of the pipeline (one or a few edges per activity) which have node_count edges in total
+    """
+
+    randomizer = random.Random(seed)
+
+    tables = [f"server.database.dbo.table_{x}" for x in range(max(10,node_count//2))]
+
+    graphs:List[List[Edge]] = list()
+
+    edge_count = 0
+
+    while edge_count<node_count:
+
+        graph = [Edge(node_name=randomizer.choice(tables),parent_nodes=randomizer.sample(tables,randomizer.randint(1,3)))
+                 for _ in range(min(randomizer.randint(1,3),node_count-edge_count))]
+
+        edge_count += len(graph)
+
+        graphs.append(graph)
+
+    return graphs
+
+def get_interpolated_expression(node_count:int)->Tuple[str,Dict[str,str]]:
+    """
+    Expression with node_count @{pipeline().parameters.x} parts and the pipeline parameters to resolve it
+    """
+
+    expression = "/".join(f"@{{pipeline().parameters.p{x}}}" for x in range(node_count))
+
+    pipeline_parameters = {f"p{x}":f"value{x}" for x in range(node_count)}
+
+    return (expression,pipeline_parameters)
+
+def get_blob_path(node_count:int)->str:
+    """
+    Blob path of node_count folders which end with the date partition and the dated file
+    """
+
+    folders = "/".join(f"folder{x}" for x in range(node_count))
+
+    return f"container/{folders}/year=2024/month=01/day=02/data_part_2024_01_02.parquet"
+
+def get_hot_path_calls(node_count:int)->Dict[str,Callable[[],Any]]:
+    """
+    Call of each hot path on the input of node_count nodes.
+    The input is built here so that it is not timed
+    """
+
+    activities = get_activity_tree(node_count=node_count)
+
+    edges = get_edges(node_count=node_count)
+
+    # replace the node in the middle of the graph with the small graph
+    node_name = edges[len(edges)//2].node_name
+
+    replace_edges = get_edges(node_count=10,prefix="Replace")
+
+    lineage_graphs = get_lineage_graphs(node_count=node_count)
+
+    expression,pipeline_parameters = get_interpolated_expression(node_count=node_count)
+
+    blob_path = get_blob_path(node_count=node_count)
+
+    return {
+        "get_virtual_graph":lambda: get_virtual_graph(activities=activities),
+        "remove_node":lambda: remove_node(node_name=node_name,edges=edges),
+        "replace_node_with_edge":lambda: replace_node_with_edge(node_name=node_name,replace_edges=replace_edges,edges=edges),
+        "merge_edges":lambda: merge_edges(graphs=lineage_graphs),
+        "resolve_expression":lambda: resolve_expression(expression=expression,\
+                                                        dataset_parameters=dict(),\
+                                                        pipeline_parameters=pipeline_parameters,\
+                                                        linked_service_parameters=dict()),
+        "normalize_blob_path":lambda: normalize_blob_path(raw_blob_path=blob_path)
+    }
+
+HOT_PATH_NAMES = list(get_hot_path_calls(node_count=NODE_COUNTS[0]).keys())
@@ -0,0 +1,88 @@
+"""
+Compare the one pass merge_edges with folding merge_edge pair by pair
+over the pipelines which have many activity lineages.
+
+python benchmark/merge_edges.py
+"""
+from pathlib import Path
+from typing import List
+import random
+import sys
+import time
+
+sys.path.insert(0,str(Path(__file__).resolve().parent.parent.joinpath("src")))
+
+from graph import (
+    Edge,
+    merge_edge,
+    merge_edges
+)
+
+# number of activity lineages in the pipeline
+ACTIVITY_COUNTS = [1000,2000,4000]
+
+TABLE_COUNT = 5000
+
+def pairwise_merge_edges(graphs:List[List[Edge]])->List[Edge]:
+    """
+    merge_edges before it was changed to one pass
+    """
+
+    if len(graphs)==0:
+        return list()
+
+    merge_graph = graphs[0]
+
+    for index in range(1,len(graphs)):
+        merge_graph = merge_edge(left_edges=merge_graph,right_edges=graphs[index])
+
+    return merge_graph
+
+def get_activity_lineages(activity_count:int)->List[List[Edge]]:
+    """
+    Lineage of the activities which are mostly copy activity (one edge) and some procedure activities (a few edges)
+    """
+
+    randomizer = random.Random(activity_count)
+
+    tables = [f"server.database.dbo.table_{x}" for x in range(TABLE_COUNT)]
+
+    return [
+        [Edge(node_name=randomizer.choice(tables),parent_nodes=randomizer.sample(tables,randomizer.randint(1,3)))
+         for _ in range(1 if randomizer.random()<0.8 else randomizer.randint(2,5))]
+        for _ in range(activity_count)
+    ]
+
+def main()->None:
+
+    for activity_count in ACTIVITY_COUNTS:
+
+        graphs = get_activity_lineages(activity_count=activity_count)
+
+        start_time = time.perf_counter()
+
+        pairwise_edges = pairwise_merge_edges(graphs=graphs)
+
+        pairwise_seconds = time.perf_counter()-start_time
+
+        start_time = time.perf_counter()
+
+        edges = merge_edges(graphs=graphs)
+
+        one_pass_seconds = time.perf_counter()-start_time
+
+        start_time = time.perf_counter()
+
+        merge_edges(graphs=graphs,is_sorted=True)
+
+        sorted_seconds = time.perf_counter()-start_time
+
+        assert edges==pairwise_edges
+
+        print(f"{activity_count:>5} activities pairwise:{pairwise_seconds:>8.3f} s "
+              f"one pass:{one_pass_seconds:>8.4f} s "
+              f"one pass sorted:{sorted_seconds:>8.4f} s "
+              f"speedup:{pairwise_seconds/one_pass_seconds:.0f}x")
+
+if __name__=="__main__":
+    main()
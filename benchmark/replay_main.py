@@ -0,0 +1,116 @@
+"""
+Run main() end to end against the replayed snapshot of the synthetic factory
+so that the throughput and the memory of the whole run are measured without the network and the credentials.
+Each factory size is run in its own process so that its peak RSS is not affected by the others.
+
+python benchmark/replay_main.py
+python benchmark/replay_main.py --max-pipeline-count 500 (only the smaller sizes , as the CI does)
+"""
+from pathlib import Path
+from typing import (
+    List,
+    Tuple,
+    Optional
+)
+import argparse
+import subprocess
+import sys
+import time
+import resource
+import tempfile
+import os
+
+SRC_FOLDER_PATH = Path(__file__).resolve().parent.parent.joinpath("src")
+
+sys.path.insert(0,str(SRC_FOLDER_PATH))
+
+from synthetic import (
+    SyntheticFactory,
+    save_synthetic_snapshot
+)
+
+# (pipeline count,nesting depth)
+FACTORY_SIZES:List[Tuple[int,int]] = [
+    (100,2),
+    (500,2),
+    (1000,3)
+]
+
+def get_max_rss_mb()->float:
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+def run_main(folder_path:str)->None:
+    """
+    Run main() in this process with the snapshot in the folder
+    """
+
+    os.environ["REPLAY_FOLDER_PATH"] = os.path.join(folder_path,"snapshot")
+    os.environ["PLUGIN_FOLDER_PATH"] = os.path.join(folder_path,"plugins")
+    os.environ["LINEAGE_OUTPUT_FILE_PATH"] = os.path.join(folder_path,"lineage.json")
+    os.environ["OPENLINEAGE_OUTPUT_FILE_PATH"] = os.path.join(folder_path,"openlineage.json")
+
+    # config is read when main is imported
+    import logging
+    import main
+
+    logging.getLogger("azure-lineage").disabled = True
+
+    start_time = time.perf_counter()
+
+    exit_code = main.main()
+
+    seconds = time.perf_counter()-start_time
+
+    print(f"{seconds:.3f} {get_max_rss_mb():.1f} {exit_code}")
+
+def main(max_pipeline_count:Optional[int]=None)->None:
+    """
+    max_pipeline_count : only run the factory sizes up to this number of pipelines. Run all the sizes if it is None
+    """
+
+    for pipeline_count,nesting_depth in FACTORY_SIZES:
+
+        if max_pipeline_count is not None and pipeline_count>max_pipeline_count:
+            continue
+
+        with tempfile.TemporaryDirectory() as folder_path:
+
+            os.mkdir(os.path.join(folder_path,"plugins"))
+
+            factory = SyntheticFactory(pipeline_count=pipeline_count,\
+                                       nesting_depth=nesting_depth)
+
+            save_synthetic_snapshot(folder_path=os.path.join(folder_path,"snapshot"),\
+                                    factory=factory)
+
+            output = subprocess.run([sys.executable,__file__,"--run-main",folder_path],\
+                                    check=True,\
+                                    capture_output=True,\
+                                    text=True).stdout.split()
+
+            seconds,max_rss,exit_code = float(output[-3]),float(output[-2]),int(output[-1])
+
+            assert exit_code==0
+
+        print(f"{pipeline_count:>5} pipelines depth {nesting_depth} "
+              f"{seconds:>8.3f} s {pipeline_count/seconds:>8.1f} pipelines/s {max_rss:>8.1f} MB peak RSS")
+
+if __name__=="__main__":
+
+    parser = argparse.ArgumentParser(description="Measure the throughput and the peak RSS of main() on the synthetic factories")
+
+    parser.add_argument("--max-pipeline-count",\
+                        type=int,\
+                        default=None,\
+                        help="only run the factory sizes up to this number of pipelines")
+
+    # run main() of one factory size in the child process
+    parser.add_argument("--run-main",metavar="FOLDER",help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.run_main is not None:
+        run_main(folder_path=args.run_main)
+    else:
+        main(max_pipeline_count=args.max_pipeline_count)
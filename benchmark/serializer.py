@@ -0,0 +1,112 @@
+"""
+Compare writing lineage.json with dataclasses.asdict + json.dump(indent=4)
+and with the serializer backends over the synthetic lineage of 100k edges.
+Each variant is run in its own process so that its peak RSS is not affected by the others.
+
+python benchmark/serializer.py
+"""
+from pathlib import Path
+from typing import (
+    List,
+    Tuple
+)
+import subprocess
+import sys
+import time
+import resource
+import tempfile
+import os
+
+sys.path.insert(0,str(Path(__file__).resolve().parent.parent.joinpath("src")))
+
+from graph import Edge
+from model import PipelineLineage
+import serializer
+
+PIPELINE_COUNT = 1000
+
+EDGE_PER_PIPELINE = 100
+
+PARENT_PER_EDGE = 3
+
+# (name,backend,is_compact)
+VARIANTS:List[Tuple[str,str,bool]] = [
+    ("asdict+json",serializer.JSON_BACKEND,False),
+    ("json",serializer.JSON_BACKEND,False),
+    ("json compact",serializer.JSON_BACKEND,True),
+    ("orjson",serializer.ORJSON_BACKEND,False),
+    ("orjson compact",serializer.ORJSON_BACKEND,True),
+    ("msgspec",serializer.MSGSPEC_BACKEND,False),
+    ("msgspec compact",serializer.MSGSPEC_BACKEND,True)
+]
+
+def get_synthetic_lineage()->List[PipelineLineage]:
+
+    return [
+        PipelineLineage(pipeline_name=f"pipeline_{pipeline_index}",\
+                        lineage=[
+                            Edge(node_name=f"server.dwh.schema_{pipeline_index}.table_{edge_index}",\
+                                 parent_nodes=[f"server.stage.schema_{pipeline_index}.table_{edge_index}_{x}" for x in range(PARENT_PER_EDGE)])
+                            for edge_index in range(EDGE_PER_PIPELINE)
+                        ])
+        for pipeline_index in range(PIPELINE_COUNT)
+    ]
+
+def get_max_rss_mb()->float:
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+def run_variant(variant_index:int)->None:
+
+    name,backend,is_compact = VARIANTS[variant_index]
+
+    lineage = get_synthetic_lineage()
+
+    base_rss = get_max_rss_mb()
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        file_path = os.path.join(folder_path,"lineage.json")
+
+        start_time = time.perf_counter()
+
+        if name=="asdict+json":
+
+            import json
+            from dataclasses import asdict
+
+            with open(file_path,"w") as file:
+                json.dump([asdict(x) for x in lineage],file,indent=4)
+
+        else:
+
+            with open(file_path,"wb") as file:
+                serializer.dump(value=lineage,file=file,is_compact=is_compact,backend=backend)
+
+        seconds = time.perf_counter()-start_time
+
+        file_size = os.path.getsize(file_path)/1024/1024
+
+    print(f"{name:<16} {seconds:>8.3f} s {get_max_rss_mb()-base_rss:>8.1f} MB peak RSS growth {file_size:>8.1f} MB file")
+
+def main()->None:
+
+    edge_count = PIPELINE_COUNT*EDGE_PER_PIPELINE
+
+    print(f"{edge_count} edges")
+
+    for variant_index,(name,backend,_) in enumerate(VARIANTS):
+
+        if backend==serializer.ORJSON_BACKEND and serializer.orjson is None or\
+            backend==serializer.MSGSPEC_BACKEND and serializer.msgspec is None:
+            print(f"{name:<16} not installed")
+            continue
+
+        subprocess.run([sys.executable,__file__,str(variant_index)],check=True)
+
+if __name__=="__main__":
+
+    if len(sys.argv)>1:
+        run_variant(variant_index=int(sys.argv[1]))
+    else:
+        main()
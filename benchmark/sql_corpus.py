@@ -0,0 +1,168 @@
+"""
+Source queries of the copy activities in the shape they are found in the factories.
+Used by the benchmarks of the sql lineage
+"""
+
+TSQL_QUERIES = [
+    """
+    SELECT [o].[OrderID],[o].[OrderDate],[c].[CustomerName],[p].[ProductName],[ol].[Quantity]
+    FROM [Sales].[Orders] AS [o] WITH (NOLOCK)
+    INNER JOIN [Sales].[Customers] AS [c] ON [c].[CustomerID]=[o].[CustomerID]
+    INNER JOIN [Sales].[OrderLines] AS [ol] ON [ol].[OrderID]=[o].[OrderID]
+    INNER JOIN [Warehouse].[StockItems] AS [p] ON [p].[StockItemID]=[ol].[StockItemID]
+    WHERE [o].[LastEditedWhen]>='2024-01-01'
+    """,
+    """
+    WITH LatestInvoice AS (
+        SELECT CustomerID,MAX(InvoiceDate) AS InvoiceDate
+        FROM Sales.Invoices
+        GROUP BY CustomerID
+    ),
+    CustomerBalance AS (
+        SELECT t.CustomerID,SUM(t.OutstandingBalance) AS Balance
+        FROM Sales.CustomerTransactions t
+        JOIN LatestInvoice li ON li.CustomerID=t.CustomerID
+        GROUP BY t.CustomerID
+    )
+    SELECT c.CustomerID,c.CustomerName,cb.Balance,li.InvoiceDate
+    FROM Sales.Customers c
+    LEFT JOIN CustomerBalance cb ON cb.CustomerID=c.CustomerID
+    LEFT JOIN LatestInvoice li ON li.CustomerID=c.CustomerID
+    """,
+    """
+    SELECT s.SupplierID,s.SupplierName,x.TotalAmount
+    FROM Purchasing.Suppliers s
+    CROSS APPLY (
+        SELECT SUM(pol.ExpectedUnitPricePerOuter*pol.OrderedOuters) AS TotalAmount
+        FROM Purchasing.PurchaseOrders po
+        JOIN Purchasing.PurchaseOrderLines pol ON pol.PurchaseOrderID=po.PurchaseOrderID
+        WHERE po.SupplierID=s.SupplierID
+    ) x
+    WHERE EXISTS (SELECT 1 FROM Purchasing.SupplierTransactions st WHERE st.SupplierID=s.SupplierID)
+    """,
+    """
+    SELECT TOP 100 PERCENT e.BusinessEntityID,p.FirstName,p.LastName,d.Name AS Department,
+           CASE WHEN edh.EndDate IS NULL THEN 1 ELSE 0 END AS IsCurrent
+    FROM HumanResources.Employee e
+    JOIN Person.Person p ON p.BusinessEntityID=e.BusinessEntityID
+    JOIN HumanResources.EmployeeDepartmentHistory edh ON edh.BusinessEntityID=e.BusinessEntityID
+    JOIN HumanResources.Department d ON d.DepartmentID=edh.DepartmentID
+    ORDER BY e.BusinessEntityID
+    """,
+    """
+    SELECT 'orders' AS source,COUNT(*) AS row_count FROM dwh.stg.orders
+    UNION ALL
+    SELECT 'order_lines',COUNT(*) FROM dwh.stg.order_lines
+    UNION ALL
+    SELECT 'customers',COUNT(*) FROM dwh.stg.customers
+    UNION ALL
+    SELECT 'products',COUNT(*) FROM dwh.stg.products
+    """,
+    """
+    WITH OrgChart AS (
+        SELECT EmployeeID,ManagerID,0 AS Level FROM dbo.Employees WHERE ManagerID IS NULL
+        UNION ALL
+        SELECT e.EmployeeID,e.ManagerID,oc.Level+1 FROM dbo.Employees e JOIN OrgChart oc ON e.ManagerID=oc.EmployeeID
+    )
+    SELECT oc.EmployeeID,oc.Level,r.RegionName
+    FROM OrgChart oc
+    JOIN dbo.EmployeeRegions er ON er.EmployeeID=oc.EmployeeID
+    JOIN ref.Regions r ON r.RegionID=er.RegionID
+    """,
+    """
+    SELECT f.DateKey,f.ProductKey,f.SalesAmount,
+           ROW_NUMBER() OVER (PARTITION BY f.ProductKey ORDER BY f.DateKey DESC) AS rn
+    FROM dbo.FactInternetSales f
+    JOIN dbo.DimDate dd ON dd.DateKey=f.OrderDateKey
+    JOIN dbo.DimProduct dp ON dp.ProductKey=f.ProductKey
+    JOIN dbo.DimProductSubcategory dps ON dps.ProductSubcategoryKey=dp.ProductSubcategoryKey
+    WHERE dd.CalendarYear IN (SELECT CalendarYear FROM dbo.DimDate WHERE FiscalQuarter=4)
+    """,
+    """
+    SELECT a.AccountNo,a.OpenDate,b.Balance,COALESCE(l.LimitAmount,0) AS LimitAmount
+    FROM core.Accounts a
+    LEFT JOIN core.AccountBalances b ON b.AccountNo=a.AccountNo AND b.AsOfDate=CAST(GETDATE() AS DATE)
+    LEFT JOIN risk.CreditLimits l ON l.AccountNo=a.AccountNo
+    WHERE a.Status NOT IN (SELECT Status FROM ref.ClosedStatuses)
+    """
+]
+
+ORACLE_QUERIES = [
+    """
+    SELECT o.order_id,o.order_date,c.cust_name,i.product_id,i.quantity
+    FROM oe.orders o
+    JOIN oe.customers c ON c.customer_id=o.customer_id
+    JOIN oe.order_items i ON i.order_id=o.order_id
+    WHERE o.order_date>=TO_DATE('2024-01-01','YYYY-MM-DD')
+    """,
+    """
+    WITH dept_costs AS (
+        SELECT d.department_name,SUM(e.salary) AS dept_total
+        FROM hr.employees e
+        JOIN hr.departments d ON e.department_id=d.department_id
+        GROUP BY d.department_name
+    ),
+    avg_cost AS (
+        SELECT SUM(dept_total)/COUNT(*) AS avg FROM dept_costs
+    )
+    SELECT * FROM dept_costs WHERE dept_total>(SELECT avg FROM avg_cost)
+    ORDER BY department_name
+    """,
+    """
+    SELECT e.employee_id,e.last_name,j.job_title,l.city,NVL(e.commission_pct,0) AS commission_pct
+    FROM hr.employees e,hr.jobs j,hr.departments d,hr.locations l
+    WHERE e.job_id=j.job_id
+    AND e.department_id=d.department_id
+    AND d.location_id=l.location_id
+    """,
+    """
+    SELECT p.product_id,p.product_name,inv.quantity_on_hand,w.warehouse_name
+    FROM oe.product_information p
+    JOIN oe.inventories inv ON inv.product_id=p.product_id
+    JOIN oe.warehouses w ON w.warehouse_id=inv.warehouse_id
+    WHERE p.product_status='orderable'
+    AND p.category_id IN (SELECT category_id FROM oe.categories_tab WHERE parent_category_id=10)
+    """,
+    """
+    SELECT t.trx_id,t.trx_date,a.account_code,DECODE(t.trx_type,'D',t.amount,-t.amount) AS signed_amount
+    FROM gl.gl_transactions t
+    JOIN gl.gl_accounts a ON a.account_id=t.account_id
+    LEFT JOIN gl.gl_periods p ON t.trx_date BETWEEN p.start_date AND p.end_date
+    WHERE p.period_status='O'
+    """,
+    """
+    SELECT c.customer_id,c.cust_first_name,c.cust_last_name,s.total
+    FROM oe.customers c
+    JOIN (
+        SELECT customer_id,SUM(order_total) AS total
+        FROM oe.orders
+        WHERE order_status>=4
+        GROUP BY customer_id
+    ) s ON s.customer_id=c.customer_id
+    WHERE ROWNUM<=1000
+    """,
+    """
+    SELECT 'employees' AS source,COUNT(*) AS row_count FROM hr.employees
+    UNION ALL
+    SELECT 'departments',COUNT(*) FROM hr.departments
+    UNION ALL
+    SELECT 'job_history',COUNT(*) FROM hr.job_history
+    UNION ALL
+    SELECT 'countries',COUNT(*) FROM hr.countries
+    """,
+    """
+    SELECT s.shipment_id,s.ship_date,r.route_code,v.vendor_name,
+           LISTAGG(sl.item_code,',') WITHIN GROUP (ORDER BY sl.line_no) AS items
+    FROM scm.shipments s
+    JOIN scm.shipment_lines sl ON sl.shipment_id=s.shipment_id
+    JOIN scm.routes r ON r.route_id=s.route_id
+    JOIN scm.vendors v ON v.vendor_id=s.vendor_id
+    GROUP BY s.shipment_id,s.ship_date,r.route_code,v.vendor_name
+    """
+]
+
+# (dialect,queries)
+QUERY_CORPUS = [
+    ("tsql",TSQL_QUERIES),
+    ("oracle",ORACLE_QUERIES)
+]
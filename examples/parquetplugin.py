@@ -0,0 +1,123 @@
+from plugin import LineageWriterPlugin,LineageContext,ActivityLineageContext
+from typing import Dict,List,Optional,Any
+import os
+
+# pip install pyarrow
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+COLUMN_NAMES = ["pipeline_name","run_id","activity_name","source","target"]
+
+class ParquetLineagePlugin(LineageWriterPlugin):
+    """
+    Write the lineage of the activities as the flat (pipeline_name,run_id,activity_name,source,target) rows
+    so that the warehouse can load it without parsing the nested json of lineage.json.
+    The rows are written in the row groups of PARQUET_ROW_GROUP_SIZE rows.
+
+    PARQUET_LINEAGE_FILE_PATH : output file. It is written as the arrow ipc file when it end with .arrow
+    PARQUET_ROW_GROUP_SIZE : number of rows in a row group
+    """
+
+    def init(self)->bool:
+
+        if pyarrow is None:
+            print("ParquetLineagePlugin::init() pyarrow is not installed")
+            return False
+
+        self.file_path = os.environ.get("PARQUET_LINEAGE_FILE_PATH","lineage.parquet")
+
+        self.row_group_size = int(os.environ.get("PARQUET_ROW_GROUP_SIZE","65536"))
+
+        self.is_arrow_ipc = self.file_path.endswith(".arrow")
+
+        self.schema = pyarrow.schema([(x,pyarrow.string()) for x in COLUMN_NAMES])
+
+        return True
+
+    def is_can_handle(self,\
+                      context:LineageContext)->bool:
+        """
+        check whether the plugin can handle this kind of context
+        """
+        if pyarrow is None:
+            return False
+
+        if not isinstance(context,list):
+            return False
+
+        if len(context)==0:
+            return False
+
+        return isinstance(context[0],ActivityLineageContext)
+
+    def write(self,\
+                context:LineageContext)->bool:
+        """
+        Write the lineage
+        """
+
+        temp_file_path = f"{self.file_path}.tmp"
+
+        writer = self.open_writer(file_path=temp_file_path)
+
+        columns:Dict[str,List[Optional[str]]] = {x:list() for x in COLUMN_NAMES}
+
+        row_count = 0
+
+        try:
+
+            for activity_lineage in context:
+
+                for edge in activity_lineage.lineage:
+
+                    for parent_node in edge.parent_nodes:
+
+                        columns["pipeline_name"].append(activity_lineage.pipeline_name)
+                        columns["run_id"].append(activity_lineage.pipeline_run_id)
+                        columns["activity_name"].append(activity_lineage.activity_name)
+                        columns["source"].append(parent_node)
+                        columns["target"].append(edge.node_name)
+
+                        row_count += 1
+
+                # write at the end of the activity so that the rows of the activity are in the same row group
+
+                if row_count>=self.row_group_size:
+                    self.write_row_group(writer=writer,columns=columns)
+                    columns = {x:list() for x in COLUMN_NAMES}
+                    row_count = 0
+
+            if row_count>0:
+                self.write_row_group(writer=writer,columns=columns)
+
+            writer.close()
+
+        except Exception:
+            writer.close()
+            os.remove(temp_file_path)
+            raise
+
+        os.replace(temp_file_path,self.file_path)
+
+        return True
+
+    def open_writer(self,file_path:str)->Any:
+
+        if self.is_arrow_ipc:
+            return pyarrow.ipc.new_file(file_path,self.schema)
+
+        return pyarrow.parquet.ParquetWriter(file_path,self.schema)
+
+    def write_row_group(self,writer:Any,columns:Dict[str,List[Optional[str]]])->None:
+
+        table = pyarrow.Table.from_pydict(columns,schema=self.schema)
+
+        if self.is_arrow_ipc:
+            writer.write_table(table)
+        else:
+            writer.write_table(table,row_group_size=table.num_rows)
@@ -0,0 +1,629 @@
+import os
+import logging
+import asyncio
+import time
+from azure.identity.aio import DefaultAzureCredential
+from azure.mgmt.datafactory.aio import DataFactoryManagementClient
+from azure.synapse.artifacts.aio import ArtifactsClient
+from azure.mgmt.datafactory.models import RunFilterParameters
+from azure.core.credentials_async import AsyncTokenCredential
+from azure.core.exceptions import DeserializationError
+from azure.core.pipeline import PipelineRequest,PipelineResponse
+from azure.core.pipeline.policies import (
+    AsyncHTTPPolicy,
+    AsyncRetryPolicy
+)
+from typing import (
+    List,
+    Optional,
+    Dict,
+    Any,
+    AsyncIterator
+)
+from model import (
+    APIDatasetResource,
+    APIPipelineResource,
+    APIPipelineRun,
+    APIActivityRun,
+    APILinkedServiceResource,
+    PipelineRuntimeContext,
+    ThrottleStats
+)
+from datetime import datetime
+from search import (
+    group_pipeline_runs,
+    LatestPipelineRunTracker
+)
+from instrument import (
+    INSTRUMENTATION,
+    instrument,
+    record_http_request
+)
+from client import RateLimiter
+from apiutil import (
+    get_linked_service_url,
+    to_api_dataset_resource,
+    to_api_synapse_dataset_resource,
+    to_api_linked_service_resource,
+    to_api_raw_linked_service_resource,
+    to_api_pipeline_resource,
+    to_api_pipeline_run,
+    to_api_activity_run,
+    get_pipeline_run_filter_parameters,
+    get_bulk_run_filter_parameters,
+    get_activity_run_filter_parameters,
+    get_latest_pipeline_runs,
+    to_runtime_context
+)
+import aiohttp
+
+class AsyncRateLimitPolicy(AsyncHTTPPolicy):
+    """
+    Asynchronous http pipeline policy of the sdk which send the request through the rate limiter
+    and retry the throttled request
+    """
+
+    def __init__(self,rate_limiter:RateLimiter):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+
+    async def send(self,request:PipelineRequest)->PipelineResponse:
+
+        attempt = 0
+
+        while True:
+
+            await asyncio.sleep(self.rate_limiter.reserve())
+
+            if INSTRUMENTATION.is_enabled:
+
+                start_time = time.monotonic()
+
+                response = await self.next.send(request)
+
+                record_http_request(seconds=time.monotonic()-start_time,\
+                                    status_code=response.http_response.status_code,\
+                                    headers=response.http_response.headers)
+            else:
+                response = await self.next.send(request)
+
+            headers = response.http_response.headers
+
+            self.rate_limiter.update(headers=headers)
+
+            if not self.rate_limiter.is_retry(status_code=response.http_response.status_code,\
+                                              attempt=attempt):
+                return response
+            
+            await asyncio.sleep(self.rate_limiter.get_retry_delay(headers=headers,\
+                                                                  attempt=attempt))
+
+            attempt += 1
+
+class AsyncAzureClient:
+    """
+    Asynchronous azure client for both azure data factory and azure synapse
+    """
+    def __init__(self,\
+                 azure_client_id:str,\
+                 azure_tenant_id:str,\
+                 azure_client_secret:str,\
+                 subscription_id:str,
+                 resource_group_name:str,
+                 data_factory_or_workspace:str,\
+                 is_data_factory:bool=True,\
+                 rate_limiter:Optional[RateLimiter]=None):
+        """
+        rate_limiter : rate limiter shared by all the requests of the client. Use the default rate limit if it is None
+        """
+
+        os.environ["AZURE_CLIENT_ID"] = azure_client_id
+        os.environ["AZURE_TENANT_ID"] = azure_tenant_id
+        os.environ["AZURE_CLIENT_SECRET"] = azure_client_secret
+
+        self.resource_group_name = resource_group_name
+        self.data_factory_or_workspace = data_factory_or_workspace
+
+        self.credential = DefaultAzureCredential()
+
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+
+        self.rate_limiter = rate_limiter
+
+        if is_data_factory:
+            self.client = AsyncDataFactoryClient(credential=self.credential,\
+                                                 subscription_id=subscription_id,\
+                                                 resource_group_name=resource_group_name,\
+                                                 data_factory_name=data_factory_or_workspace,\
+                                                 rate_limiter=rate_limiter)
+        else:
+            self.client = AsyncSynapseClient(credential=self.credential,\
+                                             workspace_name=data_factory_or_workspace,\
+                                             rate_limiter=rate_limiter)
+
+    async def __aenter__(self)->"AsyncAzureClient":
+        return self
+
+    async def __aexit__(self,*args)->None:
+        await self.close()
+
+    async def close(self)->None:
+        await self.client.close()
+        await self.credential.close()
+
+    def get_throttle_stats(self)->ThrottleStats:
+        return self.rate_limiter.get_stats()
+
+    @instrument(failed_result=None)
+    async def get_datasets(self)->Optional[List[APIDatasetResource]]:
+        return await self.client.get_datasets()
+
+    @instrument(failed_result=None)
+    async def get_linked_service(self)->Optional[List[APILinkedServiceResource]]:
+        return await self.client.get_linked_service()
+
+    @instrument(failed_result=None)
+    async def get_pipelines(self)->Optional[List[APIPipelineResource]]:
+        return await self.client.get_pipelines()
+
+    @instrument(failed_result=None)
+    async def get_pipeline_runs(self,pipeline_name:str,days:int=1)->Optional[List[APIPipelineRun]]:
+        return await self.client.get_pipeline_runs(pipeline_name=pipeline_name,\
+                                                   days=days)
+
+    @instrument(failed_result=None)
+    async def get_bulk_pipeline_runs(self,pipeline_names:List[str],days:int=1,time_from:Optional[datetime]=None)->Optional[Dict[str,List[APIPipelineRun]]]:
+        return await self.client.get_bulk_pipeline_runs(pipeline_names=pipeline_names,\
+                                                        days=days,\
+                                                        time_from=time_from)
+
+    @instrument(failed_result=None)
+    async def get_activities_run(self,pipeline_run:APIPipelineRun)->Optional[List[APIActivityRun]]:
+        return await self.client.get_activities_run(pipeline_run=pipeline_run)
+
+
+class AsyncDataFactoryClient:
+
+    def __init__(self,\
+                 credential:AsyncTokenCredential,\
+                 subscription_id:str,\
+                 resource_group_name:str,\
+                 data_factory_name:str,\
+                 rate_limiter:RateLimiter,\
+                 base_url:str="https://management.azure.com",\
+                 **client_kwargs):
+        """
+        client_kwargs : additional configuration of the sdk client (transport,policies)
+        """
+
+        self.client = DataFactoryManagementClient(
+                credential=credential,
+                subscription_id=subscription_id,
+                base_url=base_url,
+                **get_async_client_policies(rate_limiter=rate_limiter),
+                **client_kwargs
+        )
+
+        self.resource_group_name = resource_group_name
+
+        self.data_factory_name = data_factory_name
+
+        self.fallback_client = AsyncFallbackDataFactoryClient(credential=credential,\
+                                                              subscription_id=subscription_id,\
+                                                              resource_group_name=resource_group_name,\
+                                                              data_factory_name=data_factory_name,\
+                                                              rate_limiter=rate_limiter,\
+                                                              base_url=base_url)
+
+    async def close(self)->None:
+        await self.client.close()
+
+    async def get_datasets(self)->Optional[List[APIDatasetResource]]:
+
+        try:
+            return [
+                to_api_dataset_resource(dataset_resource=x)
+                async for x in self.client.datasets.list_by_factory(resource_group_name=self.resource_group_name,\
+                                                                    factory_name=self.data_factory_name)
+            ]
+        except Exception:
+            return None
+
+    async def get_linked_service(self)->Optional[List[APILinkedServiceResource]]:
+        try:
+            return [
+                to_api_linked_service_resource(linked_service_resource=x)
+                async for x in self.client.linked_services.list_by_factory(resource_group_name=self.resource_group_name,\
+                                                                           factory_name=self.data_factory_name)
+            ]
+        except DeserializationError:
+            return await self.fallback_client.get_linked_service()
+        except Exception:
+            return None
+
+    async def get_pipelines(self)->Optional[List[APIPipelineResource]]:
+
+        try:
+            return [
+                to_api_pipeline_resource(pipeline_resource=x)
+                async for x in self.client.pipelines.list_by_factory(resource_group_name=self.resource_group_name,\
+                                                                     factory_name=self.data_factory_name)
+            ]
+        except Exception:
+            return None
+
+    async def get_pipeline_runs(self,pipeline_name:str,days:int=1)->Optional[List[APIPipelineRun]]:
+
+        filter_params = get_pipeline_run_filter_parameters(pipeline_name=pipeline_name,\
+                                                           days=days)
+
+        if filter_params is None:
+            return None
+
+        try:
+            return [x async for x in self.iter_pipeline_runs(filter_params=filter_params)]
+        except Exception:
+            return None
+
+    async def get_bulk_pipeline_runs(self,pipeline_names:List[str],days:int=1,time_from:Optional[datetime]=None)->Optional[Dict[str,List[APIPipelineRun]]]:
+        """
+        Get the pipeline runs of multiple pipelines using a single query per batch of pipeline names.
+        Return the pipeline runs group by pipeline name.
+        The runs older than the latest run of each pipeline are not read as only the latest run is used
+        time_from : only get the pipeline runs updated after it instead of the last days (incremental extraction)
+        """
+
+        batch_filter_params = get_bulk_run_filter_parameters(pipeline_names=pipeline_names,\
+                                                             days=days,\
+                                                             time_from=time_from)
+
+        if batch_filter_params is None:
+            return None
+
+        pipeline_runs:List[APIPipelineRun] = list()
+
+        try:
+
+            for batch_pipeline_names,filter_params in batch_filter_params:
+
+                latest_run_tracker = LatestPipelineRunTracker(pipeline_names=batch_pipeline_names)
+
+                # stop reading the next pages once every pipeline of the batch has its latest run
+
+                async for pipeline_run in self.iter_pipeline_runs(filter_params=filter_params):
+
+                    pipeline_runs.append(pipeline_run)
+
+                    latest_run_tracker.add(pipeline_run=pipeline_run)
+
+                    if latest_run_tracker.is_complete():
+                        break
+
+            return group_pipeline_runs(pipeline_runs=pipeline_runs)
+
+        except Exception:
+            return None
+
+    async def iter_pipeline_runs(self,filter_params:RunFilterParameters)->AsyncIterator[APIPipelineRun]:
+        """
+        Yield the pipeline runs page by page by following the continuation token.
+        Raise the exception of the sdk when the query fail
+        """
+
+        while True:
+
+            respond = await self.client.pipeline_runs.query_by_factory(
+                resource_group_name=self.resource_group_name,\
+                factory_name=self.data_factory_name,\
+                filter_parameters=filter_params
+            )
+
+            for pipeline_run in respond.value:
+                yield to_api_pipeline_run(pipeline_run=pipeline_run)
+
+            if not respond.continuation_token:
+                return
+
+            filter_params.continuation_token = respond.continuation_token
+
+    async def get_activities_run(self,pipeline_run:APIPipelineRun)->Optional[List[APIActivityRun]]:
+
+        try:
+            return [x async for x in self.iter_activities_run(pipeline_run=pipeline_run)]
+        except Exception:
+            return None
+
+    async def iter_activities_run(self,pipeline_run:APIPipelineRun)->AsyncIterator[APIActivityRun]:
+        """
+        Yield the activity runs of the pipeline run page by page by following the continuation token.
+        Raise the exception of the sdk when the query fail
+        """
+
+        filter_params = get_activity_run_filter_parameters(pipeline_run=pipeline_run)
+
+        while True:
+
+            respond = await self.client.activity_runs.query_by_pipeline_run(
+                resource_group_name=self.resource_group_name,\
+                factory_name=self.data_factory_name,\
+                run_id=pipeline_run.run_id,\
+                filter_parameters=filter_params
+            )
+
+            for activity in respond.value:
+                yield to_api_activity_run(activity_run=activity)
+
+            if not respond.continuation_token:
+                return
+
+            filter_params.continuation_token = respond.continuation_token
+
+
+class AsyncSynapseClient:
+
+    def __init__(self,\
+                 credential:AsyncTokenCredential,\
+                 workspace_name:str,\
+                 rate_limiter:RateLimiter,\
+                 endpoint:Optional[str]=None,\
+                 **client_kwargs):
+        """
+        endpoint : endpoint of the workspace. Default to the development endpoint of the workspace
+        client_kwargs : additional configuration of the sdk client (transport,policies)
+        """
+
+        if endpoint is None:
+            endpoint = f"https://{workspace_name}.dev.azuresynapse.net"
+
+        self.client = ArtifactsClient(credential=credential,\
+                                      endpoint=endpoint,\
+                                      **get_async_client_policies(rate_limiter=rate_limiter),\
+                                      **client_kwargs)
+
+    async def close(self)->None:
+        await self.client.close()
+
+    async def get_datasets(self)->Optional[List[APIDatasetResource]]:
+
+        try:
+            datasets = [
+                to_api_synapse_dataset_resource(dataset_resource=x)
+                async for x in self.client.dataset.get_datasets_by_workspace()
+            ]
+
+            return [x for x in datasets if x is not None]
+
+        except Exception:
+            return None
+
+    async def get_linked_service(self)->Optional[List[APILinkedServiceResource]]:
+
+        try:
+            return [
+                to_api_linked_service_resource(linked_service_resource=x)
+                async for x in self.client.linked_service.get_linked_services_by_workspace()
+            ]
+        except Exception:
+            return None
+
+    async def get_pipelines(self)->Optional[List[APIPipelineResource]]:
+
+        try:
+            return [
+                to_api_pipeline_resource(pipeline_resource=x)
+                async for x in self.client.pipeline.get_pipelines_by_workspace()
+            ]
+        except Exception:
+            return None
+
+    async def get_pipeline_runs(self,pipeline_name:str,days:int=1)->Optional[List[APIPipelineRun]]:
+
+        filter_params = get_pipeline_run_filter_parameters(pipeline_name=pipeline_name,\
+                                                           days=days)
+
+        if filter_params is None:
+            return None
+
+        try:
+            return [x async for x in self.iter_pipeline_runs(filter_params=filter_params)]
+        except Exception:
+            return None
+
+    async def get_bulk_pipeline_runs(self,pipeline_names:List[str],days:int=1,time_from:Optional[datetime]=None)->Optional[Dict[str,List[APIPipelineRun]]]:
+        """
+        Get the pipeline runs of multiple pipelines using a single query per batch of pipeline names.
+        Return the pipeline runs group by pipeline name.
+        The runs older than the latest run of each pipeline are not read as only the latest run is used
+        time_from : only get the pipeline runs updated after it instead of the last days (incremental extraction)
+        """
+
+        batch_filter_params = get_bulk_run_filter_parameters(pipeline_names=pipeline_names,\
+                                                             days=days,\
+                                                             time_from=time_from)
+
+        if batch_filter_params is None:
+            return None
+
+        pipeline_runs:List[APIPipelineRun] = list()
+
+        try:
+
+            for batch_pipeline_names,filter_params in batch_filter_params:
+
+                latest_run_tracker = LatestPipelineRunTracker(pipeline_names=batch_pipeline_names)
+
+                # stop reading the next pages once every pipeline of the batch has its latest run
+
+                async for pipeline_run in self.iter_pipeline_runs(filter_params=filter_params):
+
+                    pipeline_runs.append(pipeline_run)
+
+                    latest_run_tracker.add(pipeline_run=pipeline_run)
+
+                    if latest_run_tracker.is_complete():
+                        break
+
+            return group_pipeline_runs(pipeline_runs=pipeline_runs)
+
+        except Exception:
+            return None
+
+    async def iter_pipeline_runs(self,filter_params:RunFilterParameters)->AsyncIterator[APIPipelineRun]:
+        """
+        Yield the pipeline runs page by page by following the continuation token.
+        Raise the exception of the sdk when the query fail
+        """
+
+        while True:
+
+            respond = await self.client.pipeline_run.query_pipeline_runs_by_workspace(
+                filter_parameters=filter_params
+            )
+
+            for pipeline_run in respond.value:
+                yield to_api_pipeline_run(pipeline_run=pipeline_run)
+
+            if not respond.continuation_token:
+                return
+
+            filter_params.continuation_token = respond.continuation_token
+
+    async def get_activities_run(self,pipeline_run:APIPipelineRun)->Optional[List[APIActivityRun]]:
+
+        try:
+            return [x async for x in self.iter_activities_run(pipeline_run=pipeline_run)]
+        except Exception:
+            return None
+
+    async def iter_activities_run(self,pipeline_run:APIPipelineRun)->AsyncIterator[APIActivityRun]:
+        """
+        Yield the activity runs of the pipeline run page by page by following the continuation token.
+        Raise the exception of the sdk when the query fail
+        """
+
+        filter_params = get_activity_run_filter_parameters(pipeline_run=pipeline_run)
+
+        while True:
+
+            respond = await self.client.pipeline_run.query_activity_runs(
+                pipeline_name=pipeline_run.pipeline_name,\
+                run_id=pipeline_run.run_id,\
+                filter_parameters=filter_params
+            )
+
+            for activity in respond.value:
+                yield to_api_activity_run(activity_run=activity)
+
+            if not respond.continuation_token:
+                return
+
+            filter_params.continuation_token = respond.continuation_token
+
+
+class AsyncFallbackDataFactoryClient:
+    def __init__(self,\
+                 credential:AsyncTokenCredential,\
+                 subscription_id:str,\
+                 resource_group_name:str,\
+                 data_factory_name:str,\
+                 rate_limiter:RateLimiter,\
+                 base_url:str="https://management.azure.com"):
+
+        self.credential = credential
+
+        self.subscription_id = subscription_id
+
+        self.resource_group_name = resource_group_name
+
+        self.data_factory_name = data_factory_name
+
+        self.base_url = base_url
+
+        self.rate_limiter = rate_limiter
+
+    async def get_linked_service(self)->Optional[List[APILinkedServiceResource]]:
+
+        url = get_linked_service_url(base_url=self.base_url,\
+                                     subscription_id=self.subscription_id,\
+                                     resource_group_name=self.resource_group_name,\
+                                     data_factory_name=self.data_factory_name)
+
+        try:
+
+            access_token = await self.credential.get_token("https://management.azure.com/.default")
+
+            headers = {"Authorization": f"Bearer {access_token.token}"}
+
+            async with aiohttp.ClientSession() as session:
+
+                attempt = 0
+
+                while True:
+
+                    await asyncio.sleep(self.rate_limiter.reserve())
+
+                    async with session.get(url=url,headers=headers) as response:
+
+                        self.rate_limiter.update(headers=response.headers)
+
+                        if not self.rate_limiter.is_retry(status_code=response.status,\
+                                                          attempt=attempt):
+                            
+                            respond = await response.json()
+                            break
+
+                        delay = self.rate_limiter.get_retry_delay(headers=response.headers,\
+                                                                  attempt=attempt)
+
+                    await asyncio.sleep(delay)
+
+                    attempt += 1
+
+            return [to_api_raw_linked_service_resource(raw_linked_service=x) for x in respond.get("value")]
+
+        except Exception:
+            return None
+
+
+def get_async_client_policies(rate_limiter:RateLimiter)->Dict[str,Any]:
+    """
+    Return the configuration of the asynchronous sdk client which send the requests through the rate limiter.
+    The retry policy of the sdk only retry the connection error as the throttled request is retried by the rate limiter
+    """
+    return {
+        "per_retry_policies":[AsyncRateLimitPolicy(rate_limiter=rate_limiter)],
+        "retry_policy":AsyncRetryPolicy(retry_status=0)
+    }
+
+@instrument()
+async def gather_runtime_contexts(client:AsyncAzureClient,\
+                                  pipeline_runs:Dict[str,List[APIPipelineRun]],\
+                                  concurrency:int=1)->Dict[str,PipelineRuntimeContext]:
+    """
+    Get the runtime context of the latest run of each pipeline.
+    At most concurrency activity run queries are in flight at the same time.
+    The pipeline whose activity runs cannot be fetched is skipped
+
+    pipeline_runs (pipeline_name,pipeline runs) : pipeline to get the runtime context
+    """
+
+    semaphore = asyncio.Semaphore(max(1,concurrency))
+
+    async def get_runtime_context(pipeline_run:APIPipelineRun)->Optional[PipelineRuntimeContext]:
+
+        async with semaphore:
+            activities_run = await client.get_activities_run(pipeline_run=pipeline_run)
+
+        if activities_run is None:
+            logging.getLogger("azure-lineage").warning(f"Getting activity runs of {pipeline_run.pipeline_name}:fail")
+            return None
+
+        return to_runtime_context(pipeline_run=pipeline_run,\
+                                  activities_run=activities_run)
+
+    latest_pipeline_infos = get_latest_pipeline_runs(pipeline_runs=pipeline_runs)
+
+    runtime_contexts = await asyncio.gather(*[get_runtime_context(pipeline_run=x) for x in latest_pipeline_infos])
+
+    return {x.pipeline_name:x for x in runtime_contexts if x is not None}
@@ -0,0 +1,322 @@
+from typing import (
+    List,
+    Optional,
+    Dict,
+    Any,
+    Tuple
+)
+from model import (
+    APIDatasetResource,
+    APITriggerResource,
+    APIPipelineResource,
+    APIPipelineRun,
+    APIActivityRun,
+    APILinkedServiceResource,
+    PipelineRuntimeContext,
+    ActivityType
+)
+from datetime import (
+    datetime,
+    timedelta,
+    timezone
+)
+from azure.mgmt.datafactory.models import (
+    RunFilterParameters,
+    RunQueryFilter,
+    RunQueryOrderBy
+)
+from munch import Munch
+from util import (
+    has_field,
+    get_batches
+)
+from core import get_activity_type
+from search import find_latest_pipeline_info
+
+# the request and respond shaping shared by the sync (client.py) and the asynchronous (aioclient.py) clients
+# so that they only differ in how the requests are sent
+
+# maximum number of pipeline names send in a single "In" filter of the pipeline run query
+
+PIPELINE_RUN_BATCH_SIZE = 50
+
+def get_linked_service_url(base_url:str,\
+                           subscription_id:str,\
+                           resource_group_name:str,\
+                           data_factory_name:str)->str:
+    """
+    Return the rest url of the linked services of the data factory which the fallback clients call
+    """
+    return (
+        f"{base_url}/subscriptions/{subscription_id}"
+        f"/resourceGroups/{resource_group_name}"
+        f"/providers/Microsoft.DataFactory/factories/{data_factory_name}"
+        f"/linkedservices?api-version=2018-06-01"
+    )
+
+def to_api_dataset_resource(dataset_resource:Any)->APIDatasetResource:
+    """
+    Convert the dataset of the data factory sdk to APIDatasetResource
+    """
+    return APIDatasetResource(
+        dataset_name=dataset_resource.name,\
+        linked_service_name=dataset_resource.properties.linked_service_name.reference_name,\
+        azure_data_type=dataset_resource.properties.type,\
+        properties=dataset_resource.properties
+    )
+
+def to_api_synapse_dataset_resource(dataset_resource:Any)->Optional[APIDatasetResource]:
+    """
+    Convert the dataset of the synapse sdk to APIDatasetResource.
+    Return None if the dataset is not supported
+    """
+
+    # SqlPoolTable does not have the linked servie reference name
+
+    linked_service_name = None
+
+    if dataset_resource.properties.linked_service_name is not None:
+        linked_service_name = dataset_resource.properties.linked_service_name.reference_name
+
+    azure_data_type = dataset_resource.properties.type
+
+    if azure_data_type is None and \
+        hasattr(dataset_resource.properties,"additional_properties"):
+
+        if not has_field(dataset_resource.properties.additional_properties,"sqlPool"):
+            return None
+
+        azure_data_type = dataset_resource.properties.additional_properties["sqlPool"]["type"]
+
+    return APIDatasetResource(
+        dataset_name=dataset_resource.name,\
+        linked_service_name=linked_service_name,\
+        azure_data_type=azure_data_type,\
+        properties=dataset_resource.properties
+    )
+
+def to_api_linked_service_resource(linked_service_resource:Any)->APILinkedServiceResource:
+    """
+    Convert the linked service of the sdk to APILinkedServiceResource
+    """
+    return APILinkedServiceResource(
+        linked_service_name=linked_service_resource.name,\
+        azure_data_type=linked_service_resource.properties.type,\
+        properties=linked_service_resource.properties
+    )
+
+def to_api_raw_linked_service_resource(raw_linked_service:Dict[str,Any])->APILinkedServiceResource:
+    """
+    Convert the rest json of the linked service which the sdk cannot deserialize to APILinkedServiceResource
+    """
+    return APILinkedServiceResource(
+        linked_service_name=raw_linked_service["name"],\
+        azure_data_type=raw_linked_service["properties"]["type"],\
+        properties=Munch.fromDict(raw_linked_service["properties"])
+    )
+
+def to_api_trigger_resource(trigger_resource:Any)->APITriggerResource:
+    """
+    Convert the trigger of the sdk to APITriggerResource
+    """
+
+    pipeline_names:List[str] = list()
+
+    if hasattr(trigger_resource.properties,"pipelines"):
+
+        pipeline_names=[
+            pipeline.pipeline_reference.reference_name \
+            for pipeline in trigger_resource.properties.pipelines
+        ]
+
+    return APITriggerResource(
+        trigger_name=trigger_resource.name,\
+        trigger_type=trigger_resource.properties.type,\
+        runtime_state=trigger_resource.properties.runtime_state,\
+        pipeline_names=pipeline_names
+    )
+
+def to_api_pipeline_resource(pipeline_resource:Any)->APIPipelineResource:
+    """
+    Convert the pipeline of the sdk to APIPipelineResource
+    """
+
+    activities = list()
+
+    if getattr(pipeline_resource,"activities",None) is not None:
+        activities = pipeline_resource.activities
+
+    return APIPipelineResource(
+        name=pipeline_resource.name,\
+        activities=activities
+    )
+
+def to_api_pipeline_run(pipeline_run:Any)->APIPipelineRun:
+    """
+    Convert the pipeline run of the sdk to APIPipelineRun
+    """
+    return APIPipelineRun(
+        pipeline_name=pipeline_run.pipeline_name,\
+        run_id=pipeline_run.run_id,\
+        run_start=pipeline_run.run_start,\
+        run_end=pipeline_run.run_end,\
+        is_latest=pipeline_run.is_latest,
+        parameters=pipeline_run.parameters,
+        run_status=pipeline_run.status
+    )
+
+def to_api_activity_run(activity_run:Any)->APIActivityRun:
+    """
+    Convert the activity run of the sdk to APIActivityRun
+    """
+
+    input = None
+
+    if hasattr(activity_run,"input"):
+        input = activity_run.input
+
+    return APIActivityRun(
+        activity_name=activity_run.activity_name,
+        activity_type=activity_run.activity_type,
+        input=input,
+        run_id=activity_run.pipeline_run_id,
+        run_start=activity_run.activity_run_start,
+        run_end=activity_run.activity_run_end,
+        run_status=activity_run.status
+    )
+
+def get_run_filter_parameters(pipeline_names:List[str],\
+                              operator:str,\
+                              time_from:datetime,\
+                              time_to:datetime)->RunFilterParameters:
+    """
+    Return the filter of the pipeline run query on pipeline names.
+    The runs are ordered from the latest run start so that the reader can stop early
+    """
+
+    return RunFilterParameters(
+        last_updated_after=time_from,
+        last_updated_before=time_to,
+        filters=[
+            RunQueryFilter(
+                operand="PipelineName",
+                operator=operator,
+                values=pipeline_names
+            )
+        ],
+        order_by=[
+            RunQueryOrderBy(
+                order_by="RunStart",
+                order="DESC"
+            )
+        ]
+    )
+
+def get_pipeline_run_filter_parameters(pipeline_name:str,days:int)->Optional[RunFilterParameters]:
+    """
+    Return the filter of the pipeline run query on the pipeline in the last days.
+    Return None if days is less than 1
+    """
+
+    if days<1:
+        return None
+
+    time_now = datetime.now(timezone.utc)
+
+    return get_run_filter_parameters(pipeline_names=[pipeline_name],\
+                                     operator="Equals",\
+                                     time_from=time_now - timedelta(days=days),\
+                                     time_to=time_now)
+
+def get_bulk_run_filter_parameters(pipeline_names:List[str],\
+                                   days:int,\
+                                   time_from:Optional[datetime]=None)->Optional[List[Tuple[List[str],RunFilterParameters]]]:
+    """
+    Return the batch of the pipeline names and the filter of the pipeline run query on that batch.
+    Return None if days is less than 1
+    time_from : only get the pipeline runs updated after it instead of the last days (incremental extraction)
+    """
+
+    if days<1:
+        return None
+
+    time_now = datetime.now(timezone.utc)
+
+    if time_from is None:
+        time_from = time_now - timedelta(days=days)
+
+    return [
+        (batch_pipeline_names,get_run_filter_parameters(pipeline_names=batch_pipeline_names,\
+                                                        operator="In",\
+                                                        time_from=time_from,\
+                                                        time_to=time_now))
+        for batch_pipeline_names in get_batches(values=pipeline_names,\
+                                                batch_size=PIPELINE_RUN_BATCH_SIZE)
+    ]
+
+def get_activity_run_filter_parameters(pipeline_run:APIPipelineRun)->RunFilterParameters:
+    """
+    Return the filter of the activity run query of the pipeline run
+    """
+    return RunFilterParameters(
+        last_updated_after=pipeline_run.run_start,
+        last_updated_before=pipeline_run.run_end
+    )
+
+def get_latest_pipeline_runs(pipeline_runs:Dict[str,List[APIPipelineRun]])->List[APIPipelineRun]:
+    """
+    Get the latest run of each pipeline. The pipeline without the latest run is skipped
+
+    pipeline_runs (pipeline_name,pipeline runs)
+    """
+
+    latest_pipeline_infos:List[APIPipelineRun] = list()
+
+    for pipeline_name in pipeline_runs:
+
+        latest_pipeline_info = find_latest_pipeline_info(pipeline_runs=pipeline_runs[pipeline_name])
+
+        if latest_pipeline_info is None:
+            continue
+
+        latest_pipeline_infos.append(latest_pipeline_info)
+
+    return latest_pipeline_infos
+
+def to_runtime_context(pipeline_run:APIPipelineRun,\
+                       activities_run:List[APIActivityRun])->PipelineRuntimeContext:
+    """
+    Create the runtime context from the pipeline run and the activity runs of that pipeline run
+    """
+
+    activity_source_inputs: Dict[str, Dict[str, Any]] = dict()
+
+    pipeline_parameters:Dict[str,str] = dict()
+
+    if pipeline_run.parameters is not None:
+        pipeline_parameters = pipeline_run.parameters
+
+    for activity_run in activities_run:
+
+        if get_activity_type(activity_run.activity_type) == ActivityType.Copy and\
+            activity_run.input:
+
+            source = activity_run.input.get("source", {})
+
+            # if our SqlPoolSource has no mapping , it fall back to CopySource based type , source field is in additional_properties
+
+            if not source and has_field(activity_run.input,"additional_properties"):
+                source = activity_run.input.additional_properties.get("source",{})
+
+            if source:
+                activity_source_inputs[activity_run.activity_name] = source
+
+    return PipelineRuntimeContext(
+        pipeline_name=pipeline_run.pipeline_name,\
+        run_id=pipeline_run.run_id,\
+        run_start=pipeline_run.run_start,\
+        run_end=pipeline_run.run_end,
+        pipeline_parameters=pipeline_parameters,\
+        activity_source_inputs=activity_source_inputs,
+        pipeline_run_status=pipeline_run.run_status
+    )
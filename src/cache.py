@@ -0,0 +1,70 @@
+from typing import (
+    Dict,
+    Any,
+    Optional,
+    Set,
+    Tuple
+)
+from pathlib import Path
+import os
+import pickle
+
+class StaticPipelineCache:
+    """
+    On disk cache of the compiled static pipelines (without the sdk object of the activities).
+    Each pipeline is stored with the content hash of its definition and the datasets it use.
+    """
+    def __init__(self,file_path:str):
+
+        self.file_path = Path(file_path)
+
+        # pipeline name -> (key,static pipeline,name of the activities which have the sdk object)
+        self.pipelines:Dict[str,Tuple[str,Any,Set[str]]] = dict()
+
+        self.hit_count = 0
+        self.miss_count = 0
+
+        try:
+            with self.file_path.open("rb") as file:
+                self.pipelines = pickle.load(file)
+        except Exception:
+            # cache is empty or written by the incompatible version
+            self.pipelines = dict()
+
+    def get(self,pipeline_name:str,key:str)->Optional[Tuple[Any,Set[str]]]:
+        """
+        Return (static pipeline,name of the activities which have the sdk object) or None if the pipeline has changed
+        """
+
+        cached = self.pipelines.get(pipeline_name)
+
+        if cached is None or cached[0]!=key:
+            self.miss_count += 1
+            return None
+        
+        self.hit_count += 1
+
+        return (cached[1],cached[2])
+
+    def put(self,pipeline_name:str,key:str,static_pipeline:Any,raw_activity_names:Set[str])->None:
+        self.pipelines[pipeline_name] = (key,static_pipeline,raw_activity_names)
+
+    def save(self,pipeline_names:Optional[Set[str]]=None)->None:
+        """
+        pipeline_names : pipelines which still exist. The removed pipelines are dropped from the cache
+        """
+
+        if pipeline_names is not None:
+            self.pipelines = {
+                pipeline_name:cached for pipeline_name,cached in self.pipelines.items()
+                if pipeline_name in pipeline_names
+            }
+
+        self.file_path.parent.mkdir(parents=True,exist_ok=True)
+
+        temp_file_path = self.file_path.with_suffix(".tmp")
+
+        with temp_file_path.open("wb") as file:
+            pickle.dump(self.pipelines,file,protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temp_file_path,self.file_path)
@@ -1,11 +1,13 @@
 import os
+import logging
 from azure.identity import DefaultAzureCredential
 from azure.mgmt.datafactory import DataFactoryManagementClient
 from typing import (
     List,
     Optional,
     Dict,
-    Any
+    Any,
+    Iterator
 )
 from model import (
     APIDatasetResource,
@@ -17,29 +19,272 @@ from model import (
     Dataset,
     LinkedService,
     PipelineRuntimeContext,
-    ActivityType
+    ThrottleStats
 )
 from datetime import (
     datetime,
-    timedelta,
     timezone
 )
-from azure.mgmt.datafactory.models import (
-    RunFilterParameters,
-    RunQueryFilter
-)
+from azure.mgmt.datafactory.models import RunFilterParameters
 from azure.synapse.artifacts import ArtifactsClient
 from azure.core.exceptions import DeserializationError
-from munch import Munch
-from util import has_field
 import requests
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
+from azure.core.pipeline import PipelineRequest,PipelineResponse
+from azure.core.pipeline.policies import (
+    HTTPPolicy,
+    RetryPolicy
+)
+from email.utils import parsedate_to_datetime
+import threading
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from connector import (
     get_dataset_type,
     get_dataset_info,
     get_linked_service_info,
     get_linked_service_type
 )
-from core import get_activity_type
+from search import (
+    group_pipeline_runs,
+    LatestPipelineRunTracker
+)
+from apiutil import (
+    get_linked_service_url,
+    to_api_dataset_resource,
+    to_api_synapse_dataset_resource,
+    to_api_linked_service_resource,
+    to_api_raw_linked_service_resource,
+    to_api_trigger_resource,
+    to_api_pipeline_resource,
+    to_api_pipeline_run,
+    to_api_activity_run,
+    get_pipeline_run_filter_parameters,
+    get_bulk_run_filter_parameters,
+    get_activity_run_filter_parameters,
+    get_latest_pipeline_runs,
+    to_runtime_context
+)
+from instrument import (
+    INSTRUMENTATION,
+    instrument,
+    record_http_request
+)
+
+# http status code which mean the request is throttled by the api
+
+THROTTLED_STATUS_CODES = {429,503}
+
+# prefix of the header which tell the remaining number of requests in the current quota window
+
+RATE_LIMIT_REMAINING_HEADER_PREFIX = "x-ms-ratelimit-remaining-"
+
+class RateLimiter:
+    """
+    Token bucket rate limiter shared by all the clients (and threads) calling the api.
+    The rate is decreased when the api throttle the request or the remaining quota is low ,
+    and slowly recovered to the configured rate afterward
+    """
+    def __init__(self,\
+                 requests_per_second:float=10,\
+                 burst:int=20,\
+                 max_retry:int=6,\
+                 backoff_factor:float=1,\
+                 max_backoff:float=60,\
+                 low_remaining_threshold:int=100):
+        """
+        requests_per_second : maximum rate of the requests
+        burst : maximum number of requests which can be sent at once
+        max_retry : maximum number of retry of the throttled request
+        backoff_factor : base seconds of the exponential backoff when the api does not tell how long to wait
+        max_backoff : maximum seconds to wait before retrying
+        low_remaining_threshold : remaining quota under which the rate is decreased
+        """
+
+        self.max_requests_per_second = requests_per_second
+        self.min_requests_per_second = requests_per_second/20
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_retry = max_retry
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.low_remaining_threshold = low_remaining_threshold
+
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        # requests are not allowed until this time after being throttled
+        self.paused_until = 0.0
+
+        self.request_count = 0
+        self.throttled_count = 0
+        self.retry_count = 0
+        self.wait_seconds = 0.0
+
+        self.lock = threading.Lock()
+
+    def reserve(self)->float:
+        """
+        Take a token for a request.
+        Return the seconds the caller has to wait before sending the request
+        """
+
+        with self.lock:
+
+            now = time.monotonic()
+
+            self.tokens = min(float(self.burst),\
+                              self.tokens+(now-self.updated_at)*self.requests_per_second)
+            
+            self.updated_at = now
+
+            self.tokens -= 1
+
+            self.request_count += 1
+
+            delay = max(0.0,self.paused_until-now)
+
+            if self.tokens<0:
+                delay = max(delay,-self.tokens/self.requests_per_second)
+
+            self.wait_seconds += delay
+
+            return delay
+
+    def acquire(self)->None:
+        """
+        Block until the request can be sent
+        """
+
+        delay = self.reserve()
+
+        if delay>0:
+            time.sleep(delay)
+
+    def is_retry(self,status_code:int,attempt:int)->bool:
+        """
+        Return whether the response of the attempt should be retried
+        """
+        
+        if status_code not in THROTTLED_STATUS_CODES:
+            return False
+        
+        with self.lock:
+
+            self.throttled_count += 1
+
+            if attempt>=self.max_retry:
+                return False
+            
+            self.retry_count += 1
+
+        return True
+
+    def get_retry_delay(self,headers:Dict[str,str],attempt:int)->float:
+        """
+        Return seconds to wait before retrying the throttled request.
+        Use the Retry-After header when it exists , otherwise use jittered exponential backoff.
+        All the requests are paused for that duration and the rate is decreased
+        """
+
+        retry_after = get_retry_after(headers=headers)
+
+        if retry_after is None:
+
+            backoff = min(self.max_backoff,self.backoff_factor*(2**attempt))
+
+            delay = backoff/2 + random.uniform(0,backoff/2)
+
+        else:
+            delay = min(self.max_backoff,retry_after) + random.uniform(0,self.backoff_factor)
+
+        with self.lock:
+
+            self.paused_until = max(self.paused_until,time.monotonic()+delay)
+
+            self.requests_per_second = max(self.min_requests_per_second,\
+                                           self.requests_per_second/2)
+            
+            self.wait_seconds += delay
+
+        return delay
+
+    def update(self,headers:Dict[str,str])->None:
+        """
+        Adjust the rate using the remaining quota in x-ms-ratelimit-remaining-* headers
+        """
+
+        remaining = get_rate_limit_remaining(headers=headers)
+
+        with self.lock:
+
+            if remaining is not None and remaining<self.low_remaining_threshold:
+
+                self.requests_per_second = max(self.min_requests_per_second,\
+                                               self.requests_per_second/2)
+                
+                return
+            
+            # recover the rate slowly
+
+            self.requests_per_second = min(self.max_requests_per_second,\
+                                           self.requests_per_second+self.max_requests_per_second/20)
+
+    def get_stats(self)->ThrottleStats:
+
+        with self.lock:
+
+            return ThrottleStats(
+                request_count=self.request_count,\
+                throttled_count=self.throttled_count,\
+                retry_count=self.retry_count,\
+                wait_seconds=self.wait_seconds,\
+                requests_per_second=self.requests_per_second
+            )
+
+class RateLimitPolicy(HTTPPolicy):
+    """
+    Http pipeline policy of the sdk which send the request through the rate limiter
+    and retry the throttled request
+    """
+
+    def __init__(self,rate_limiter:RateLimiter):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+
+    def send(self,request:PipelineRequest)->PipelineResponse:
+
+        attempt = 0
+
+        while True:
+
+            self.rate_limiter.acquire()
+
+            if INSTRUMENTATION.is_enabled:
+
+                start_time = time.monotonic()
+
+                response = self.next.send(request)
+
+                record_http_request(seconds=time.monotonic()-start_time,\
+                                    status_code=response.http_response.status_code,\
+                                    headers=response.http_response.headers)
+            else:
+                response = self.next.send(request)
+
+            headers = response.http_response.headers
+
+            self.rate_limiter.update(headers=headers)
+
+            if not self.rate_limiter.is_retry(status_code=response.http_response.status_code,\
+                                              attempt=attempt):
+                return response
+            
+            time.sleep(self.rate_limiter.get_retry_delay(headers=headers,\
+                                                         attempt=attempt))
+
+            attempt += 1
 
 class AzureClient:
     """
@@ -52,7 +297,12 @@ class AzureClient:
                  subscription_id:str,
                  resource_group_name:str,
                  data_factory_or_workspace:str,\
-                 is_data_factory:bool=True):
+                 is_data_factory:bool=True,\
+                 connection_pool_size:int=10,\
+                 rate_limiter:Optional[RateLimiter]=None):
+        """
+        rate_limiter : rate limiter shared by all the requests of the client. Use the default rate limit if it is None
+        """
                 
         os.environ["AZURE_CLIENT_ID"] = azure_client_id
         os.environ["AZURE_TENANT_ID"] = azure_tenant_id
@@ -61,33 +311,74 @@ class AzureClient:
         self.resource_group_name = resource_group_name
         self.data_factory_or_workspace = data_factory_or_workspace
 
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+
+        self.rate_limiter = rate_limiter
+
         if is_data_factory:
             self.client = DataFactoryClient(credential=DefaultAzureCredential(),\
                                         subscription_id=subscription_id,\
                                         resource_group_name=resource_group_name,\
-                                        data_factory_name=data_factory_or_workspace)
+                                        data_factory_name=data_factory_or_workspace,\
+                                        connection_pool_size=connection_pool_size,\
+                                        rate_limiter=rate_limiter)
         else:
             self.client = SynapseClient(credential=DefaultAzureCredential(),\
-                                        workspace_name=data_factory_or_workspace)
+                                        workspace_name=data_factory_or_workspace,\
+                                        connection_pool_size=connection_pool_size,\
+                                        rate_limiter=rate_limiter)
             
+    def get_throttle_stats(self)->ThrottleStats:
+        return self.rate_limiter.get_stats()
+            
+    @instrument(failed_result=None)
     def get_datasets(self)->Optional[List[APIDatasetResource]]:
         return self.client.get_datasets() 
     
+    @instrument(failed_result=None)
     def get_linked_service(self)->Optional[List[APILinkedServiceResource]]:
         return self.client.get_linked_service()
     
+    @instrument(failed_result=None)
     def get_triggers(self)->Optional[List[APITriggerResource]]:
         return self.client.get_triggers()
 
+    @instrument(failed_result=None)
     def get_pipelines(self)->Optional[List[APIPipelineResource]]:
         return self.client.get_pipelines()
 
+    @instrument(failed_result=None)
     def get_pipeline_runs(self,pipeline_name:str,days:int=1)->Optional[List[APIPipelineRun]]:
         return self.client.get_pipeline_runs(pipeline_name=pipeline_name,\
                                              days=days)
 
+    @instrument(failed_result=None)
+    def get_bulk_pipeline_runs(self,pipeline_names:List[str],days:int=1,time_from:Optional[datetime]=None)->Optional[Dict[str,List[APIPipelineRun]]]:
+        return self.client.get_bulk_pipeline_runs(pipeline_names=pipeline_names,\
+                                                  days=days,\
+                                                  time_from=time_from)
+
+    def iter_pipeline_runs(self,pipeline_name:str,days:int=1)->Iterator[APIPipelineRun]:
+        """
+        Yield the pipeline runs from the latest run start, page by page.
+        Raise the exception of the sdk when the query fail
+        """
+
+        filter_params = get_pipeline_run_filter_parameters(pipeline_name=pipeline_name,\
+                                                           days=days)
+
+        if filter_params is None:
+            return
+        
+        yield from self.client.iter_pipeline_runs(filter_params=filter_params)
+
+    @instrument(failed_result=None)
     def get_activities_run(self,pipeline_run:APIPipelineRun)->Optional[List[APIActivityRun]]:
         return self.client.get_activities_run(pipeline_run=pipeline_run)
+    
+    def iter_activities_run(self,pipeline_run:APIPipelineRun)->Iterator[APIActivityRun]:
+        return self.client.iter_activities_run(pipeline_run=pipeline_run)
    
 
 class DataFactoryClient:
@@ -96,11 +387,15 @@ class DataFactoryClient:
                  credential:DefaultAzureCredential,\
                  subscription_id:str,\
                  resource_group_name:str,\
-                 data_factory_name:str):
+                 data_factory_name:str,\
+                 rate_limiter:RateLimiter,\
+                 connection_pool_size:int=10):
         
         self.client = DataFactoryManagementClient(
                 credential=credential,
-                subscription_id=subscription_id
+                subscription_id=subscription_id,
+                transport=get_transport(connection_pool_size=connection_pool_size),
+                **get_client_policies(rate_limiter=rate_limiter)
         )
 
         self.resource_group_name = resource_group_name
@@ -112,20 +407,16 @@ class DataFactoryClient:
         self.fallback_client = FallbackDataFactoryClient(access_token=access_token,\
                                                          subscription_id=subscription_id,\
                                                          resource_group_name=resource_group_name,\
-                                                         data_factory_name=data_factory_name)
+                                                         data_factory_name=data_factory_name,\
+                                                         rate_limiter=rate_limiter)
 
     def get_datasets(self)->Optional[List[APIDatasetResource]]:
         
         try:
             return [
-                APIDatasetResource(
-                    dataset_name=dataset_resource.name,\
-                    linked_service_name=dataset_resource.properties.linked_service_name.reference_name,\
-                    azure_data_type=dataset_resource.properties.type,\
-                    properties=dataset_resource.properties
-                )
-                for dataset_resource in self.client.datasets.list_by_factory(resource_group_name=self.resource_group_name,\
-                                                                            factory_name=self.data_factory_name)
+                to_api_dataset_resource(dataset_resource=x)
+                for x in self.client.datasets.list_by_factory(resource_group_name=self.resource_group_name,\
+                                                              factory_name=self.data_factory_name)
             ]
         except Exception:
             return None
@@ -133,13 +424,9 @@ class DataFactoryClient:
     def get_linked_service(self)->Optional[List[APILinkedServiceResource]]:
         try:
             return [
-                APILinkedServiceResource(
-                    linked_service_name=linked_service_resource.name,
-                    azure_data_type=linked_service_resource.properties.type,
-                    properties=linked_service_resource.properties
-                )
-                for linked_service_resource in self.client.linked_services.list_by_factory(resource_group_name=self.resource_group_name,\
-                                                                                           factory_name=self.data_factory_name)
+                to_api_linked_service_resource(linked_service_resource=x)
+                for x in self.client.linked_services.list_by_factory(resource_group_name=self.resource_group_name,\
+                                                                     factory_name=self.data_factory_name)
             ]
         except DeserializationError:
             return self.fallback_client.get_linked_service()
@@ -148,119 +435,116 @@ class DataFactoryClient:
 
     def get_triggers(self)->Optional[List[APITriggerResource]]:
         
-        triggers:List[APITriggerResource] = list()
-
         try:
-            for trigger_resource in self.client.triggers.list_by_factory(resource_group_name=self.resource_group_name,\
-                                                                        factory_name=self.data_factory_name):
-                
-                trigger_name = trigger_resource.name
+            return [
+                to_api_trigger_resource(trigger_resource=x)
+                for x in self.client.triggers.list_by_factory(resource_group_name=self.resource_group_name,\
+                                                              factory_name=self.data_factory_name)
+            ]
+        except Exception:
+            return None
+        
+    def get_pipelines(self)->Optional[List[APIPipelineResource]]:
 
-                trigger_type = trigger_resource.properties.type
+        try:
+            return [
+                to_api_pipeline_resource(pipeline_resource=x)
+                for x in self.client.pipelines.list_by_factory(resource_group_name=self.resource_group_name,\
+                                                               factory_name=self.data_factory_name)
+            ]
+        except Exception:
+            return None
 
-                runtime_state = trigger_resource.properties.runtime_state
+    def get_pipeline_runs(self,pipeline_name:str,days:int=1)->Optional[List[APIPipelineRun]]:
 
-                pipeline_names:List[str] = list()
+        filter_params = get_pipeline_run_filter_parameters(pipeline_name=pipeline_name,\
+                                                           days=days)
 
-                if hasattr(trigger_resource.properties,"pipelines"):
+        if filter_params is None:
+            return None
 
-                    pipeline_names=[
-                        pipeline.pipeline_reference.reference_name \
-                        for pipeline in trigger_resource.properties.pipelines
-                    ]
-    
-                triggers.append(APITriggerResource(
-                        trigger_name=trigger_name,\
-                        trigger_type=trigger_type,\
-                        runtime_state=runtime_state,\
-                        pipeline_names=pipeline_names
-                    ))
-
-                    
-            return triggers
-        
+        try:
+            return list(self.iter_pipeline_runs(filter_params=filter_params))
         except Exception:
             return None
-        
-    def get_pipelines(self)->Optional[List[APIPipelineResource]]:
 
-        pipelines:List[APIPipelineResource] = list()
+    def get_bulk_pipeline_runs(self,pipeline_names:List[str],days:int=1,time_from:Optional[datetime]=None)->Optional[Dict[str,List[APIPipelineRun]]]:
+        """
+        Get the pipeline runs of multiple pipelines using a single query per batch of pipeline names.
+        Return the pipeline runs group by pipeline name.
+        The runs older than the latest run of each pipeline are not read as only the latest run is used
+        time_from : only get the pipeline runs updated after it instead of the last days (incremental extraction)
+        """
+
+        batch_filter_params = get_bulk_run_filter_parameters(pipeline_names=pipeline_names,\
+                                                             days=days,\
+                                                             time_from=time_from)
+
+        if batch_filter_params is None:
+            return None
+
+        pipeline_runs:List[APIPipelineRun] = list()
 
         try:
-            for pipeline_resource in self.client.pipelines.list_by_factory(
-                resource_group_name=self.resource_group_name,\
-                factory_name=self.data_factory_name
-            ):
-                pipeline_name = pipeline_resource.name
 
-                activities = list()
+            for batch_pipeline_names,filter_params in batch_filter_params:
 
-                if hasattr(pipeline_resource,"activities"):
-                    activities = pipeline_resource.activities
+                latest_run_tracker = LatestPipelineRunTracker(pipeline_names=batch_pipeline_names)
 
-                pipelines.append(
-                    APIPipelineResource(
-                        name=pipeline_name,\
-                        activities=activities
-                    )
-                )
+                # stop reading the next pages once every pipeline of the batch has its latest run
 
-            return pipelines
-        except Exception:
-            return None
+                for pipeline_run in self.iter_pipeline_runs(filter_params=filter_params):
 
-    def get_pipeline_runs(self,pipeline_name:str,days:int=1)->Optional[List[APIPipelineRun]]:
+                    pipeline_runs.append(pipeline_run)
 
-        if days<1:
-            return None
+                    latest_run_tracker.add(pipeline_run=pipeline_run)
 
-        time_now = datetime.now(timezone.utc)
+                    if latest_run_tracker.is_complete():
+                        break
 
-        time_from = time_now - timedelta(days=days)
+            return group_pipeline_runs(pipeline_runs=pipeline_runs)
 
-        filter_params = RunFilterParameters(
-            last_updated_after=time_from,
-            last_updated_before=time_now,
-            filters=[
-                RunQueryFilter(
-                    operand="PipelineName",
-                    operator="Equals",
-                    values=[pipeline_name]
-                )
-            ]
-        )
+        except Exception:
+            return None
 
+    def iter_pipeline_runs(self,filter_params:RunFilterParameters)->Iterator[APIPipelineRun]:
+        """
+        Yield the pipeline runs page by page by following the continuation token.
+        Raise the exception of the sdk when the query fail
+        """
 
-        try:
-            pipeline_runs = self.client.pipeline_runs.query_by_factory(
+        while True:
+
+            respond = self.client.pipeline_runs.query_by_factory(
                 resource_group_name=self.resource_group_name,\
                 factory_name=self.data_factory_name,\
                 filter_parameters=filter_params
             )
 
-            return [APIPipelineRun(
-                pipeline_name=x.pipeline_name,\
-                run_id=x.run_id,\
-                run_start=x.run_start,\
-                run_end=x.run_end,\
-                is_latest=x.is_latest,
-                parameters=x.parameters,
-                run_status=x.status
-            ) for x in pipeline_runs.value]
-        
+            for pipeline_run in respond.value:
+                yield to_api_pipeline_run(pipeline_run=pipeline_run)
+
+            if not respond.continuation_token:
+                return
+
+            filter_params.continuation_token = respond.continuation_token
+
+    def get_activities_run(self,pipeline_run:APIPipelineRun)->Optional[List[APIActivityRun]]:
+
+        try:
+            return list(self.iter_activities_run(pipeline_run=pipeline_run))
         except Exception:
             return None
 
-    def get_activities_run(self,pipeline_run:APIPipelineRun)->Optional[List[APIActivityRun]]:
+    def iter_activities_run(self,pipeline_run:APIPipelineRun)->Iterator[APIActivityRun]:
+        """
+        Yield the activity runs of the pipeline run page by page by following the continuation token.
+        Raise the exception of the sdk when the query fail
+        """
 
-        filter_params = RunFilterParameters(
-            last_updated_after=pipeline_run.run_start,
-            last_updated_before=pipeline_run.run_end
-        )
+        filter_params = get_activity_run_filter_parameters(pipeline_run=pipeline_run)
 
-        activities_run:List[APIActivityRun] = list()
-        
-        try:
+        while True:
 
             respond = self.client.activity_runs.query_by_pipeline_run(
                 resource_group_name=self.resource_group_name,\
@@ -270,205 +554,147 @@ class DataFactoryClient:
             )
 
             for activity in respond.value:
+                yield to_api_activity_run(activity_run=activity)
 
-                input = None
-
-                if hasattr(activity,"input"):
-                    input = activity.input
-
-                activities_run.append(
-                    APIActivityRun(
-                        activity_name=activity.activity_name,
-                        activity_type=activity.activity_type,
-                        input=input,
-                        run_id=activity.pipeline_run_id,
-                        run_start=activity.activity_run_start,
-                        run_end=activity.activity_run_end,
-                        run_status=activity.status
-                    )
-                )
-
-            return activities_run
+            if not respond.continuation_token:
+                return
 
-        except Exception:
-            return None
+            filter_params.continuation_token = respond.continuation_token
 
 
 class SynapseClient:
 
     def __init__(self,\
                  credential:DefaultAzureCredential,\
-                 workspace_name:str):
+                 workspace_name:str,\
+                 rate_limiter:RateLimiter,\
+                 connection_pool_size:int=10):
         
         self.client = ArtifactsClient(credential=credential,\
-                                      endpoint=f"https://{workspace_name}.dev.azuresynapse.net")
+                                      endpoint=f"https://{workspace_name}.dev.azuresynapse.net",\
+                                      transport=get_transport(connection_pool_size=connection_pool_size),\
+                                      **get_client_policies(rate_limiter=rate_limiter))
         
-    
     def get_datasets(self)->List[APIDatasetResource]:
 
-        dataset:List[APIDatasetResource] = list()
-
         try:
+            datasets = [to_api_synapse_dataset_resource(dataset_resource=x) for x in self.client.dataset.get_datasets_by_workspace()]
 
-            for dataset_resource in self.client.dataset.get_datasets_by_workspace():
-
-                # SqlPoolTable does not have the linked servie reference name
-                
-                linked_service_name = None
+            return [x for x in datasets if x is not None]
 
-                if dataset_resource.properties.linked_service_name is not None:
-                    linked_service_name = dataset_resource.properties.linked_service_name.reference_name
-
-                azure_data_type = dataset_resource.properties.type
-
-                if azure_data_type is None and \
-                    hasattr(dataset_resource.properties,"additional_properties"):
-
-                    if not has_field(dataset_resource.properties.additional_properties,"sqlPool"):
-                        continue
-
-                    azure_data_type = dataset_resource.properties.additional_properties["sqlPool"]["type"]
-
-                dataset.append(
-                    APIDatasetResource(
-                        dataset_name=dataset_resource.name,\
-                        linked_service_name=linked_service_name,\
-                        azure_data_type=azure_data_type,\
-                        properties=dataset_resource.properties
-                    )
-                )
-            
-            return dataset
-
-        except Exception as e:
+        except Exception:
             return None
         
     def get_linked_service(self)->Optional[List[APILinkedServiceResource]]:
 
         try:
-            return [
-                APILinkedServiceResource(
-                    linked_service_name=linked_service_resource.name,
-                    azure_data_type=linked_service_resource.properties.type,
-                    properties=linked_service_resource.properties
-                )
-                for linked_service_resource in self.client.linked_service.get_linked_services_by_workspace() 
-            ]
+            return [to_api_linked_service_resource(linked_service_resource=x) for x in self.client.linked_service.get_linked_services_by_workspace()]
         except Exception:
             return None
 
  
     def get_triggers(self)->Optional[List[APITriggerResource]]:
 
-        triggers:List[APITriggerResource] = list()
+        try:
+            return [to_api_trigger_resource(trigger_resource=x) for x in self.client.trigger.get_triggers_by_workspace()]
+        except Exception:
+            return None
 
+    def get_pipelines(self)->Optional[List[APIPipelineResource]]:
 
         try:
-            for trigger_resource in self.client.trigger.get_triggers_by_workspace():
-                
-                trigger_name = trigger_resource.name
-
-                trigger_type = trigger_resource.properties.type
+            return [to_api_pipeline_resource(pipeline_resource=x) for x in self.client.pipeline.get_pipelines_by_workspace()]
+        except Exception:
+            return None
 
-                runtime_state = trigger_resource.properties.runtime_state
+    def get_pipeline_runs(self,pipeline_name:str,days:int=1)->Optional[List[APIPipelineRun]]:
 
-                pipeline_names:List[str] = list()
+        filter_params = get_pipeline_run_filter_parameters(pipeline_name=pipeline_name,\
+                                                           days=days)
 
-                if hasattr(trigger_resource.properties,"pipelines"):
+        if filter_params is None:
+            return None
 
-                    pipeline_names=[
-                        pipeline.pipeline_reference.reference_name \
-                        for pipeline in trigger_resource.properties.pipelines
-                    ]
-    
-                triggers.append(APITriggerResource(
-                        trigger_name=trigger_name,\
-                        trigger_type=trigger_type,\
-                        runtime_state=runtime_state,\
-                        pipeline_names=pipeline_names
-                    ))
-
-                    
-            return triggers
-        
+        try:
+            return list(self.iter_pipeline_runs(filter_params=filter_params))
         except Exception:
             return None
 
-    def get_pipelines(self)->Optional[List[APIPipelineResource]]:
+    def get_bulk_pipeline_runs(self,pipeline_names:List[str],days:int=1,time_from:Optional[datetime]=None)->Optional[Dict[str,List[APIPipelineRun]]]:
+        """
+        Get the pipeline runs of multiple pipelines using a single query per batch of pipeline names.
+        Return the pipeline runs group by pipeline name.
+        The runs older than the latest run of each pipeline are not read as only the latest run is used
+        time_from : only get the pipeline runs updated after it instead of the last days (incremental extraction)
+        """
 
-        pipelines:List[APIPipelineResource] = list()
+        batch_filter_params = get_bulk_run_filter_parameters(pipeline_names=pipeline_names,\
+                                                             days=days,\
+                                                             time_from=time_from)
 
+        if batch_filter_params is None:
+            return None
+
+        pipeline_runs:List[APIPipelineRun] = list()
 
         try:
-            for pipeline_resource in self.client.pipeline.get_pipelines_by_workspace():
-                pipeline_name = pipeline_resource.name
 
-                activities = list()
+            for batch_pipeline_names,filter_params in batch_filter_params:
 
-                if hasattr(pipeline_resource,"activities"):
-                    activities = pipeline_resource.activities
+                latest_run_tracker = LatestPipelineRunTracker(pipeline_names=batch_pipeline_names)
 
-                pipelines.append(
-                    APIPipelineResource(
-                        name=pipeline_name,\
-                        activities=activities
-                    )
-                )
+                # stop reading the next pages once every pipeline of the batch has its latest run
 
-            return pipelines
-        except Exception:
-            return None
+                for pipeline_run in self.iter_pipeline_runs(filter_params=filter_params):
 
-    def get_pipeline_runs(self,pipeline_name:str,days:int=1)->Optional[List[APIPipelineRun]]:
+                    pipeline_runs.append(pipeline_run)
 
-        if days<1:
-            return None
+                    latest_run_tracker.add(pipeline_run=pipeline_run)
 
-        time_now = datetime.now(timezone.utc)
+                    if latest_run_tracker.is_complete():
+                        break
 
-        time_from = time_now - timedelta(days=days)
+            return group_pipeline_runs(pipeline_runs=pipeline_runs)
 
-        filter_params = RunFilterParameters(
-            last_updated_after=time_from,
-            last_updated_before=time_now,
-            filters=[
-                RunQueryFilter(
-                    operand="PipelineName",
-                    operator="Equals",
-                    values=[pipeline_name]
-                )
-            ]
-        )
+        except Exception:
+            return None
 
-        try:
-            pipeline_runs = self.client.pipeline_run.query_pipeline_runs_by_workspace(
+    def iter_pipeline_runs(self,filter_params:RunFilterParameters)->Iterator[APIPipelineRun]:
+        """
+        Yield the pipeline runs page by page by following the continuation token.
+        Raise the exception of the sdk when the query fail
+        """
+
+        while True:
+
+            respond = self.client.pipeline_run.query_pipeline_runs_by_workspace(
                 filter_parameters=filter_params
             )
 
-            return [APIPipelineRun(
-                pipeline_name=x.pipeline_name,\
-                run_id=x.run_id,\
-                run_start=x.run_start,\
-                run_end=x.run_end,\
-                is_latest=x.is_latest,
-                parameters=x.parameters,
-                run_status=x.status
-            ) for x in pipeline_runs.value]
-        
+            for pipeline_run in respond.value:
+                yield to_api_pipeline_run(pipeline_run=pipeline_run)
+
+            if not respond.continuation_token:
+                return
+
+            filter_params.continuation_token = respond.continuation_token
+
+    def get_activities_run(self,pipeline_run:APIPipelineRun)->Optional[List[APIActivityRun]]:
+
+        try:
+            return list(self.iter_activities_run(pipeline_run=pipeline_run))
         except Exception:
             return None
- 
 
-    def get_activities_run(self,pipeline_run:APIPipelineRun)->Optional[List[APIActivityRun]]:
+    def iter_activities_run(self,pipeline_run:APIPipelineRun)->Iterator[APIActivityRun]:
+        """
+        Yield the activity runs of the pipeline run page by page by following the continuation token.
+        Raise the exception of the sdk when the query fail
+        """
 
-        filter_params = RunFilterParameters(
-            last_updated_after=pipeline_run.run_start,
-            last_updated_before=pipeline_run.run_end
-        )
+        filter_params = get_activity_run_filter_parameters(pipeline_run=pipeline_run)
 
-        activities_run:List[APIActivityRun] = list()
-        
-        try:
+        while True:
 
             respond = self.client.pipeline_run.query_activity_runs(
                 pipeline_name=pipeline_run.pipeline_name,\
@@ -477,34 +703,20 @@ class SynapseClient:
             )
 
             for activity in respond.value:
+                yield to_api_activity_run(activity_run=activity)
 
-                input = None
+            if not respond.continuation_token:
+                return
 
-                if hasattr(activity,"input"):
-                    input = activity.input
-
-                activities_run.append(
-                    APIActivityRun(
-                        activity_name=activity.activity_name,
-                        activity_type=activity.activity_type,
-                        input=input,
-                        run_id=activity.pipeline_run_id,
-                        run_start=activity.activity_run_start,
-                        run_end=activity.activity_run_end,
-                        run_status=activity.status
-                    )
-                ) 
-            return activities_run
-
-        except Exception:
-            return None
+            filter_params.continuation_token = respond.continuation_token
         
 class FallbackDataFactoryClient:
     def __init__(self,\
                  access_token:str,
                  subscription_id:str,
                  resource_group_name:str,\
-                 data_factory_name:str):
+                 data_factory_name:str,\
+                 rate_limiter:RateLimiter):
         
         self.access_token = access_token
 
@@ -514,31 +726,124 @@ class FallbackDataFactoryClient:
 
         self.data_factory_name = data_factory_name
 
+        self.rate_limiter = rate_limiter
+
     def get_linked_service(self)->Optional[List[APILinkedServiceResource]]:
        
        
-       url = (
-            f"https://management.azure.com/subscriptions/{self.subscription_id}"
-            f"/resourceGroups/{self.resource_group_name}"
-            f"/providers/Microsoft.DataFactory/factories/{self.data_factory_name}"
-            f"/linkedservices?api-version=2018-06-01"
-        )
+       url = get_linked_service_url(base_url="https://management.azure.com",\
+                                    subscription_id=self.subscription_id,\
+                                    resource_group_name=self.resource_group_name,\
+                                    data_factory_name=self.data_factory_name)
        
        headers = {"Authorization": f"Bearer {self.access_token}"}
   
        try:
            
-           response = requests.get(url=url, headers=headers)
+           attempt = 0
+
+           while True:
+
+               self.rate_limiter.acquire()
 
-           return [
-               APILinkedServiceResource(linked_service_name=linked_service_resource["name"],\
-                                            azure_data_type=linked_service_resource["properties"]["type"],\
-                                            properties=Munch.fromDict(linked_service_resource["properties"]))
-           for linked_service_resource in response.json().get("value")]
+               response = requests.get(url=url, headers=headers)
+
+               self.rate_limiter.update(headers=response.headers)
+
+               if not self.rate_limiter.is_retry(status_code=response.status_code,\
+                                                 attempt=attempt):
+                   break
+               
+               time.sleep(self.rate_limiter.get_retry_delay(headers=response.headers,\
+                                                            attempt=attempt))
+               
+               attempt += 1
+
+           return [to_api_raw_linked_service_resource(raw_linked_service=x) for x in response.json().get("value")]
        
        except Exception:
            return None
        
+def get_retry_after(headers:Dict[str,str])->Optional[float]:
+    """
+    Return the seconds to wait in the retry after headers
+    """
+
+    for header_name in ["retry-after-ms","x-ms-retry-after-ms"]:
+
+        value = headers.get(header_name)
+
+        if value is not None:
+            try:
+                return float(value)/1000
+            except ValueError:
+                pass
+
+    value = headers.get("retry-after")
+
+    if value is None:
+        return None
+    
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    # retry after can also be http date
+
+    try:
+        return max(0.0,(parsedate_to_datetime(value)-datetime.now(timezone.utc)).total_seconds())
+    except (TypeError,ValueError):
+        return None
+
+def get_rate_limit_remaining(headers:Dict[str,str])->Optional[int]:
+    """
+    Return the lowest remaining quota in x-ms-ratelimit-remaining-* headers
+    """
+
+    remaining:Optional[int] = None
+
+    for header_name,value in headers.items():
+
+        if not header_name.lower().startswith(RATE_LIMIT_REMAINING_HEADER_PREFIX):
+            continue
+
+        try:
+            value = int(value)
+        except ValueError:
+            continue
+
+        if remaining is None or value<remaining:
+            remaining = value
+
+    return remaining
+
+def get_client_policies(rate_limiter:RateLimiter)->Dict[str,Any]:
+    """
+    Return the configuration of the sdk client which send the requests through the rate limiter.
+    The retry policy of the sdk only retry the connection error as the throttled request is retried by the rate limiter
+    """
+    return {
+        "per_retry_policies":[RateLimitPolicy(rate_limiter=rate_limiter)],
+        "retry_policy":RetryPolicy(retry_status=0)
+    }
+
+def get_transport(connection_pool_size:int)->RequestsTransport:
+    """
+    Return the http transport which can keep connection_pool_size connections open,
+    so that the client can be shared by multiple threads
+    """
+
+    session = requests.Session()
+
+    adapter = HTTPAdapter(pool_connections=connection_pool_size,\
+                          pool_maxsize=connection_pool_size)
+
+    session.mount("https://",adapter)
+
+    return RequestsTransport(session=session,\
+                             session_owner=True)
+
 def get_datasets(client:AzureClient)->Optional[List[Dataset]]:
 
     datasets:List[Dataset] = list()
@@ -595,38 +900,44 @@ def get_linked_service(client:AzureClient)->Optional[List[LinkedService]]:
     
 
 def get_runtime_context(client:AzureClient,\
-                        pipeline_run:APIPipelineRun)->PipelineRuntimeContext:
+                        pipeline_run:APIPipelineRun)->Optional[PipelineRuntimeContext]:
+    """
+    Return None if the activity runs cannot be fetched so that only that pipeline is skipped
+    """
     
-    activity_source_inputs: Dict[str, Dict[str, Any]] = dict()
-
     activities_run = client.get_activities_run(pipeline_run=pipeline_run)
 
-    pipeline_parameters:Dict[str,str] = dict()
+    if activities_run is None:
+        logging.getLogger("azure-lineage").warning(f"Getting activity runs of {pipeline_run.pipeline_name}:fail")
+        return None
 
-    if pipeline_run.parameters is not None:
-        pipeline_parameters = pipeline_run.parameters
+    return to_runtime_context(pipeline_run=pipeline_run,\
+                              activities_run=activities_run)
 
-    for activity_run in activities_run:
+@instrument()
+def get_runtime_contexts(client:AzureClient,\
+                         pipeline_runs:Dict[str,List[APIPipelineRun]],\
+                         concurrency:int=1)->Dict[str,PipelineRuntimeContext]:
+    """
+    Get the runtime context of the latest run of each pipeline.
+    The activity runs are fetched by at most concurrency threads sharing the same client.
+    The pipeline whose activity runs cannot be fetched is skipped
 
-        if get_activity_type(activity_run.activity_type) == ActivityType.Copy and\
-            activity_run.input:
+    pipeline_runs (pipeline_name,pipeline runs) : pipeline to get the runtime context
+    """
 
-            source = activity_run.input.get("source", {})   
+    latest_pipeline_infos = get_latest_pipeline_runs(pipeline_runs=pipeline_runs)
 
-            # if our SqlPoolSource has no mapping , it fall back to CopySource based type , source field is in additional_properties
+    if concurrency<=1:
 
-            if not source and has_field(activity_run.input,"additional_properties"):
-                source = activity_run.input.additional_properties.get("source",{})
+        runtime_contexts = [get_runtime_context(client=client,\
+                                                pipeline_run=x) for x in latest_pipeline_infos]
+    else:
 
-            if source:
-                activity_source_inputs[activity_run.activity_name] = source
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
 
-    return PipelineRuntimeContext(
-        pipeline_name=pipeline_run.pipeline_name,\
-        run_id=pipeline_run.run_id,\
-        run_start=pipeline_run.run_start,\
-        run_end=pipeline_run.run_end,
-        pipeline_parameters=pipeline_parameters,\
-        activity_source_inputs=activity_source_inputs,
-        pipeline_run_status=pipeline_run.run_status
-    )
\ No newline at end of file
+            runtime_contexts = list(executor.map(lambda x:get_runtime_context(client=client,\
+                                                                                pipeline_run=x),\
+                                                 latest_pipeline_infos))
+            
+    return {x.pipeline_name:x for x in runtime_contexts if x is not None}
@@ -1,17 +1,39 @@
-from client import AzureClient
-from decouple import config
+from client import AzureClient,RateLimiter
+from cache import StaticPipelineCache
+from typing import Optional
+from pathlib import Path
+from aioclient import AsyncAzureClient
+from replay import (
+    ReplayAzureClient,
+    AsyncReplayAzureClient
+)
+from writer import OUTPUT_FORMATS
+from serializer import LINEAGE_FORMATS
+from decouple import (
+    config,
+    undefined,
+    Choices
+)
 
-AZURE_CLIENT_ID = config("AZURE_CLIENT_ID",cast=str)
+# snapshot folder which is replayed instead of calling the api. Empty to call the api
+REPLAY_FOLDER_PATH = config("REPLAY_FOLDER_PATH",default="",cast=str)
 
-AZURE_TENANT_ID = config("AZURE_TENANT_ID",cast=str)
+IS_REPLAY = REPLAY_FOLDER_PATH!=""
 
-AZURE_CLIENT_SECRET = config("AZURE_CLIENT_SECRET",cast=str)
+# the credentials are not needed when the snapshot is replayed
+CREDENTIAL_DEFAULT = "" if IS_REPLAY else undefined
 
-SUBSCRIPTION_ID = config("SUBSCRIPTION_ID",cast=str)
+AZURE_CLIENT_ID = config("AZURE_CLIENT_ID",default=CREDENTIAL_DEFAULT,cast=str)
 
-RESOURCE_GROUP_NAME = config("RESOURCE_GROUP_NAME",cast=str)
+AZURE_TENANT_ID = config("AZURE_TENANT_ID",default=CREDENTIAL_DEFAULT,cast=str)
 
-DATA_FACTORY_OR_SYNAPSE_WORKSPACE_NAME = config("DATA_FACTORY_OR_SYNAPSE_WORKSPACE_NAME",cast=str)
+AZURE_CLIENT_SECRET = config("AZURE_CLIENT_SECRET",default=CREDENTIAL_DEFAULT,cast=str)
+
+SUBSCRIPTION_ID = config("SUBSCRIPTION_ID",default=CREDENTIAL_DEFAULT,cast=str)
+
+RESOURCE_GROUP_NAME = config("RESOURCE_GROUP_NAME",default=CREDENTIAL_DEFAULT,cast=str)
+
+DATA_FACTORY_OR_SYNAPSE_WORKSPACE_NAME = config("DATA_FACTORY_OR_SYNAPSE_WORKSPACE_NAME",default=CREDENTIAL_DEFAULT,cast=str)
 
 IS_AZURE_DATA_FACTORY = config("IS_AZURE_DATA_FACTORY",default=True,cast=bool)
 
@@ -23,19 +45,103 @@ OPENLINEAGE_OUTPUT_FILE_PATH = config("OPENLINEAGE_OUTPUT_FILE_PATH",default="op
 
 OPENLINEAGE_PRODUCER = config("OPENLINEAGE_PRODUCER",default="azure-lineage",cast=str)
 
+# json (array of the events) or ndjson (one event per line)
+OPENLINEAGE_OUTPUT_FORMAT = config("OPENLINEAGE_OUTPUT_FORMAT",default="json",cast=Choices(sorted(OUTPUT_FORMATS)))
+
 IS_USE_FQN  = config("IS_USE_FQN",default=True,cast=bool)
 
 LINEAGE_OUTPUT_FILE_PATH = config("LINEAGE_OUTPUT_FILE_PATH",default="lineage.json",cast=str)
 
+IS_SORTED_LINEAGE = config("IS_SORTED_LINEAGE",default=False,cast=bool)
+
+IS_COMPACT_JSON = config("IS_COMPACT_JSON",default=False,cast=bool)
+
+# json (list of the pipeline lineage) or dictionary (node name table and the edges as the node index pairs)
+LINEAGE_OUTPUT_FORMAT = config("LINEAGE_OUTPUT_FORMAT",default="json",cast=Choices(sorted(LINEAGE_FORMATS)))
+
 PLUGIN_FOLDER_PATH = config("PLUGIN_FOLDER_PATH",default="/plugins",cast=str)
 
 IS_DEBUG = config("IS_DEBUG",default=False,cast=bool)
 
+FETCH_CONCURRENCY = config("FETCH_CONCURRENCY",default=4,cast=int)
+
+IS_ASYNC_CLIENT = config("IS_ASYNC_CLIENT",default=False,cast=bool)
+
+API_REQUESTS_PER_SECOND = config("API_REQUESTS_PER_SECOND",default=10,cast=float)
+
+API_BURST = config("API_BURST",default=20,cast=int)
+
+API_MAX_RETRY = config("API_MAX_RETRY",default=6,cast=int)
+
+IS_INCREMENTAL = config("IS_INCREMENTAL",default=False,cast=bool)
+
+INCREMENTAL_STATE_FILE_PATH = config("INCREMENTAL_STATE_FILE_PATH",default="state.json",cast=str)
+
+IS_STATIC_PIPELINE_CACHE = config("IS_STATIC_PIPELINE_CACHE",default=False,cast=bool)
+
+STATIC_PIPELINE_CACHE_FILE_PATH = config("STATIC_PIPELINE_CACHE_FILE_PATH",default="static_pipelines.pickle",cast=str)
+
+SQL_PARSE_CACHE_SIZE = config("SQL_PARSE_CACHE_SIZE",default=1024,cast=int)
+
+SQL_PARSE_MAX_LENGTH = config("SQL_PARSE_MAX_LENGTH",default=100000,cast=int)
+
+SQL_PARSE_TIMEOUT_SECONDS = config("SQL_PARSE_TIMEOUT_SECONDS",default=5,cast=float)
+
+# 0 parse the source sql one by one while extracting the lineage
+SQL_PARSE_PROCESS_COUNT = config("SQL_PARSE_PROCESS_COUNT",default=0,cast=int)
+
+IS_SQL_LINEAGE_STORE = config("IS_SQL_LINEAGE_STORE",default=False,cast=bool)
+
+SQL_LINEAGE_STORE_FILE_PATH = config("SQL_LINEAGE_STORE_FILE_PATH",\
+                                     default=str(Path(LINEAGE_OUTPUT_FILE_PATH).parent.joinpath("sql_lineage.sqlite")),\
+                                     cast=str)
+
+IS_INSTRUMENTATION = config("IS_INSTRUMENTATION",default=False,cast=bool)
+
+RUN_REPORT_FILE_PATH = config("RUN_REPORT_FILE_PATH",default="run_report.json",cast=str)
+
+# empty to not write the prometheus textfile
+PROMETHEUS_TEXTFILE_PATH = config("PROMETHEUS_TEXTFILE_PATH",default="",cast=str)
+
+# shared by the sync and async clients so that the whole run stay under the api limit
+RATE_LIMITER = RateLimiter(requests_per_second=API_REQUESTS_PER_SECOND,\
+                           burst=API_BURST,\
+                           max_retry=API_MAX_RETRY)
+
+def get_static_pipeline_cache()->Optional[StaticPipelineCache]:
+
+    if not IS_STATIC_PIPELINE_CACHE:
+        return None
+    
+    return StaticPipelineCache(file_path=STATIC_PIPELINE_CACHE_FILE_PATH)
+
 def get_api_client()->AzureClient:
+
+    if IS_REPLAY:
+        return ReplayAzureClient(folder_path=REPLAY_FOLDER_PATH,\
+                                 rate_limiter=RATE_LIMITER)
+
     return AzureClient(azure_client_id=AZURE_CLIENT_ID,\
         azure_tenant_id=AZURE_TENANT_ID,\
         azure_client_secret=AZURE_CLIENT_SECRET,\
         subscription_id=SUBSCRIPTION_ID,\
         resource_group_name=RESOURCE_GROUP_NAME,\
         data_factory_or_workspace=DATA_FACTORY_OR_SYNAPSE_WORKSPACE_NAME,\
-        is_data_factory=IS_AZURE_DATA_FACTORY)
\ No newline at end of file
+        is_data_factory=IS_AZURE_DATA_FACTORY,\
+        connection_pool_size=max(10,FETCH_CONCURRENCY),\
+        rate_limiter=RATE_LIMITER)
+
+def get_async_api_client()->AsyncAzureClient:
+
+    if IS_REPLAY:
+        return AsyncReplayAzureClient(folder_path=REPLAY_FOLDER_PATH,\
+                                      rate_limiter=RATE_LIMITER)
+
+    return AsyncAzureClient(azure_client_id=AZURE_CLIENT_ID,\
+        azure_tenant_id=AZURE_TENANT_ID,\
+        azure_client_secret=AZURE_CLIENT_SECRET,\
+        subscription_id=SUBSCRIPTION_ID,\
+        resource_group_name=RESOURCE_GROUP_NAME,\
+        data_factory_or_workspace=DATA_FACTORY_OR_SYNAPSE_WORKSPACE_NAME,\
+        is_data_factory=IS_AZURE_DATA_FACTORY,\
+        rate_limiter=RATE_LIMITER)
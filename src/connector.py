@@ -101,6 +101,20 @@ def get_sql_script(input_source_obj:Dict[str,Any],dataset_type:DatasetType)->Opt
     
     return None
 
+def get_sql_dialect(dataset_type:DatasetType)->Optional[str]:
+    """
+    Get the sqlglot dialect of the sql script for the input dataset.
+    Return None (default dialect) if the dataset type is not a sql database
+    """
+    if dataset_type==DatasetType.Oracle:
+        return "oracle"
+    elif dataset_type==DatasetType.AzureSQL or\
+        dataset_type==DatasetType.Synapse or\
+        dataset_type==DatasetType.OnPrimeMSSQL:
+        return "tsql"
+
+    return None
+
 def is_synapse_sql_pool(dataset_resource:DatasetResource,\
                 dataset_type:DatasetType)->bool:
     
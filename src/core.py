@@ -7,7 +7,6 @@ from model import (
     Parameter,
     ParameterType,
     GenericActivity,
-    Dataset,
     DatasetType,
     StaticPipeline,
     APIPipelineResource
@@ -17,21 +16,39 @@ from typing import (
     Dict,
     Optional,
     Any,
-    Set
+    Set,
+    Tuple
 )
 from graph import (
     Edge,
-    merge_edge,
-    replace_node_with_edge,
-    remove_node
+    ActivityGraph
 )
 from util import (
     has_field,
     create_parameter
 )
-from search import find_dataset
+from search import MetadataCatalog
+from instrument import instrument
+from cache import StaticPipelineCache
+from dataclasses import (
+    asdict,
+    replace
+)
 
 import re
+import json
+import hashlib
+
+# activity type which are kept in the virtual graph
+
+VIRTUAL_GRAPH_ACTIVITY_TYPES = [ActivityType.Copy,\
+                                ActivityType.Procedure,\
+                                ActivityType.Execute,\
+                                ActivityType.Script]
+
+# version of the static pipeline compilation. Increase it when the compilation change so that the cached static pipelines are not used
+
+STATIC_PIPELINE_VERSION = 1
 
 WHOLE_DATASET_PATTERN = re.compile(r"^@dataset\(\)\.(\w+)$")
 
@@ -197,6 +214,19 @@ def get_flatten_branches(activities:List[Activity],\
     Expand the activity with have the inner activity
     """
 
+    graph = ActivityGraph.from_edges(edges=edges)
+
+    flatten_branches(activities=activities,\
+                     graph=graph)
+    
+    return graph.to_edges()
+
+def flatten_branches(activities:List[Activity],\
+                     graph:ActivityGraph)->None:
+    """
+    Expand the activity with have the inner activity in the graph
+    """
+
     for activity in activities:
 
         if activity.activity_type == ActivityType.If:
@@ -205,24 +235,23 @@ def get_flatten_branches(activities:List[Activity],\
 
             false_edges = branch_to_edges(activities=activity.false_children)
 
-            merged_edge = merge_edge(left_edges=true_edges,\
-                                     right_edges=false_edges)
+            branch_graph = ActivityGraph.from_edges(edges=true_edges)
+
+            branch_graph.merge(graph=ActivityGraph.from_edges(edges=false_edges))
             
-            if len(merged_edge)>0:
-                edges = replace_node_with_edge(node_name=activity.activity_name,\
-                                               replace_edges=merged_edge,\
-                                               edges=edges)
+            if len(branch_graph)>0:
+                graph.replace_node_with_graph(node_name=activity.activity_name,\
+                                              graph=branch_graph)
             else:
-                edges = remove_node(node_name=activity.activity_name,\
-                                    edges=edges)
+                graph.remove_node(node_name=activity.activity_name)
             
             # handle nested activites
 
-            edges = get_flatten_branches(activities=activity.true_children,\
-                                         edges=edges)
+            flatten_branches(activities=activity.true_children,\
+                             graph=graph)
             
-            edges = get_flatten_branches(activities=activity.false_children,\
-                                               edges=edges)
+            flatten_branches(activities=activity.false_children,\
+                             graph=graph)
             
 
         elif activity.activity_type in [ActivityType.ForEach,ActivityType.While]:
@@ -230,20 +259,16 @@ def get_flatten_branches(activities:List[Activity],\
             body_edges = branch_to_edges(activities=activity.body_children)
 
             if len(body_edges)>0:
-                edges = replace_node_with_edge(node_name=activity.activity_name,\
-                                               replace_edges=body_edges,\
-                                               edges=edges)
+                graph.replace_node_with_graph(node_name=activity.activity_name,\
+                                              graph=ActivityGraph.from_edges(edges=body_edges))
                 
             else:
-                edges = remove_node(node_name=activity.activity_name,\
-                                    edges=edges)
+                graph.remove_node(node_name=activity.activity_name)
             
             # handle nested activites
 
-            edges = get_flatten_branches(activities=activity.body_children,\
-                                         edges=edges)
-            
-    return edges
+            flatten_branches(activities=activity.body_children,\
+                             graph=graph)
             
 def get_activities_type(activities:List[Activity],\
                       activities_type:Dict[str,ActivityType]=None)->Dict[str,ActivityType]:
@@ -279,39 +304,98 @@ def get_simplify_graph(activities:List[Activity],\
     activities_type = get_activities_type(activities=activities,\
                                         activities_type=dict())
     
-    required_activities_type:List[ActivityType] = [ActivityType.Copy,\
-                                                   ActivityType.Procedure,\
-                                                   ActivityType.Execute,\
-                                                   ActivityType.Script]
-    
     to_remove_node:Set[str] = set()
     
     for edge in edges:
 
-        if activities_type[edge.node_name] not in required_activities_type:
+        if activities_type[edge.node_name] not in VIRTUAL_GRAPH_ACTIVITY_TYPES:
             to_remove_node.add(edge.node_name)
             
+    graph = ActivityGraph.from_edges(edges=edges)
+            
     for node in to_remove_node:
-        
-        result = remove_node(node_name=node,\
-                                edges=edges)
-        
-        if result is not None:
-            edges = result
+        graph.remove_node(node_name=node)
             
-    return edges
+    return graph.to_edges()
+
+def add_raw_activities(activities:List[Activity],\
+                       nodes:List[Tuple[str,List[str]]],\
+                       activities_type:Dict[str,ActivityType],\
+                       branches:List[Tuple[str,int,int]])->None:
+    """
+    Add the activities (include nested activity) in the same order as branch_to_edges
+    nodes (node name,depends on) : nodes of the activities
+    branches (activity name,start,end) : the nested activities of the If/ForEach/While activity are nodes[start:end].
+    The branches are in the same order as they are flatten by get_flatten_branches
+    """
+
+    for activity in activities:
+
+        nodes.append((activity.activity_name,activity.depends_on))
+
+        activities_type[activity.activity_name] = activity.activity_type
+
+        if activity.activity_type not in [ActivityType.If,ActivityType.ForEach,ActivityType.While]:
+            continue
+
+        branch_index = len(branches)
+
+        branches.append((activity.activity_name,len(nodes),len(nodes)))
+
+        add_raw_activities(activities=activity.true_children+\
+                                      activity.false_children+\
+                                      activity.body_children,\
+                           nodes=nodes,\
+                           activities_type=activities_type,\
+                           branches=branches)
+        
+        branches[branch_index] = (activity.activity_name,branches[branch_index][1],len(nodes))
 
 def get_virtual_graph(activities:List[Activity])->List[Edge]:
+    """
+    Get the flatten graph of the supported activities.
+    Build in a single traversal of the activities and give the same graph as
+    branch_to_edges , get_flatten_branches and get_simplify_graph
+    """
 
-    edges = branch_to_edges(activities=activities)
+    nodes:List[Tuple[str,List[str]]] = list()
 
-    edges = get_flatten_branches(activities=activities,\
-                                 edges=edges)
+    activities_type:Dict[str,ActivityType] = dict()
 
-    edges = get_simplify_graph(activities=activities,\
-                               edges=edges)
-    
-    return edges
+    branches:List[Tuple[str,int,int]] = list()
+
+    add_raw_activities(activities=activities,\
+                       nodes=nodes,\
+                       activities_type=activities_type,\
+                       branches=branches)
+
+    graph = ActivityGraph()
+
+    for node_name,depends_on in nodes:
+        graph.add_node(node_name=node_name,\
+                       parent_nodes=depends_on)
+
+    for activity_name,start,end in branches:
+
+        if start==end:
+            graph.remove_node(node_name=activity_name)
+            continue
+
+        branch_graph = ActivityGraph()
+
+        for node_name,depends_on in nodes[start:end]:
+            branch_graph.add_node(node_name=node_name,\
+                                  parent_nodes=depends_on)
+            
+        graph.replace_node_with_graph(node_name=activity_name,\
+                                      graph=branch_graph)
+
+    for node_name in graph.get_node_names():
+
+        if activities_type[node_name] not in VIRTUAL_GRAPH_ACTIVITY_TYPES:
+            graph.remove_node(node_name=node_name)
+
+    return graph.to_edges()
 
 def resolve_expression(expression:str,\
                        dataset_parameters:Dict[str, str],\
@@ -375,28 +459,35 @@ def resolve_expression(expression:str,\
                           reason=f"pipeline parameter '{name}' not in context")
     
     # handle interpolated @{...} anywhere in the expression
-    
-    tokens = INTERPOLATED_PATTERN.findall(expression)
+    # the result is joined from the parts in one pass instead of replacing each @{...} in the whole result (quadratic)
 
-    if tokens:
+    parts:List[str] = list()
 
-        result = expression
+    position = 0
 
-        for interpolated_expression in tokens:
+    for match in INTERPOLATED_PATTERN.finditer(expression):
 
-            resolved = resolve_interpolated_expression(interpolated_expression=interpolated_expression,\
-                                                       dataset_parameters=dataset_parameters,\
-                                                       pipeline_parameters=pipeline_parameters,\
-                                                       linked_service_parameters=linked_service_parameters)
-            if isinstance(resolved, Unresolved):
+        interpolated_expression = match.group(1)
 
-                return Unresolved(expression=expression,\
-                                  reason=f"could not resolve @{{{interpolated_expression}}}: {resolved.reason}")
-            
-            result = result.replace(f"@{{{interpolated_expression}}}",\
-                                    resolved.value,\
-                                    1)
-        return Resolved(result)
+        resolved = resolve_interpolated_expression(interpolated_expression=interpolated_expression,\
+                                                   dataset_parameters=dataset_parameters,\
+                                                   pipeline_parameters=pipeline_parameters,\
+                                                   linked_service_parameters=linked_service_parameters)
+        if isinstance(resolved, Unresolved):
+
+            return Unresolved(expression=expression,\
+                              reason=f"could not resolve @{{{interpolated_expression}}}: {resolved.reason}")
+
+        parts.append(expression[position:match.start()])
+        parts.append(resolved.value)
+
+        position = match.end()
+
+    if len(parts)>0:
+
+        parts.append(expression[position:])
+
+        return Resolved("".join(parts))
 
     # if it is a constant value , just return it
 
@@ -626,7 +717,7 @@ def get_placeholder_activity(activity_name:str)->GenericActivity:
     )
 
 def get_generic_activity(raw_activity:Any,\
-                         datasets:List[Dataset])->GenericActivity:
+                         catalog:MetadataCatalog)->GenericActivity:
 
     activity_type = get_activity_type(raw_activity.type)
 
@@ -670,11 +761,10 @@ def get_generic_activity(raw_activity:Any,\
 
     output_dataset_name = raw_activity.outputs[0].reference_name
 
-    input_dataset = find_dataset(datasets=datasets,\
-                                 search_dataset_name=input_dataset_name)
+    input_dataset = catalog.find_dataset(dataset_name=input_dataset_name)
     
-    output_dataset = find_dataset(datasets=datasets,\
-                                 search_dataset_name=output_dataset_name)
+    output_dataset = catalog.find_dataset(dataset_name=output_dataset_name)
+
     is_input_supported = not(input_dataset is None or input_dataset.type==DatasetType.Unsupported)
 
     is_output_supported = not(output_dataset is None or output_dataset.type==DatasetType.Unsupported)
@@ -713,15 +803,90 @@ def get_generic_activity(raw_activity:Any,\
     )
 
 
+def get_raw_activity_definition(raw_activity:Any)->Any:
+    """
+    Get the json definition of the activity (sdk model or dict)
+    """
+
+    if hasattr(raw_activity,"serialize"):
+        return raw_activity.serialize()
+
+    return raw_activity
+
+def get_referenced_dataset_names(raw_activity:Any)->List[str]:
+
+    dataset_names:List[str] = list()
+
+    for field_name in ["inputs","outputs"]:
+
+        if not has_field(raw_activity,field_name):
+            continue
+
+        dataset_references = getattr(raw_activity,field_name,None)
+
+        if dataset_references is None:
+            continue
+
+        dataset_names.extend([x.reference_name for x in dataset_references])
+
+    return dataset_names
+
+def get_static_pipeline_key(pipeline:APIPipelineResource,\
+                            catalog:MetadataCatalog,\
+                            expanded_activities:Dict[str,Any])->str:
+    """
+    Get the content hash of the pipeline definition and the datasets it use
+    """
+
+    referenced_datasets = {
+        dataset_name:catalog.find_dataset(dataset_name=dataset_name)
+        for activity in expanded_activities.values()
+        for dataset_name in get_referenced_dataset_names(raw_activity=activity)
+    }
+
+    definition = {
+        "version":STATIC_PIPELINE_VERSION,
+        "activities":[get_raw_activity_definition(raw_activity=x) for x in pipeline.activities],
+        "datasets":{
+            dataset_name:asdict(dataset) if dataset is not None else None
+            for dataset_name,dataset in referenced_datasets.items()
+        }
+    }
+
+    raw_definition = json.dumps(definition,sort_keys=True,default=str)
+
+    return hashlib.sha256(raw_definition.encode("utf-8")).hexdigest()
+
+@instrument()
 def get_static_pipeline(pipeline:APIPipelineResource,\
-                        datasets:List[Dataset])->StaticPipeline:
+                        catalog:MetadataCatalog,\
+                        static_pipeline_cache:Optional[StaticPipelineCache]=None)->StaticPipeline:
+    """
+    static_pipeline_cache : cache of the compiled pipeline. The unchanged pipeline is not compiled again
+    """
+
+    expanded_activities = expand_activities(raw_activities=pipeline.activities)
+
+    key = None
+
+    if static_pipeline_cache is not None:
+
+        key = get_static_pipeline_key(pipeline=pipeline,\
+                                      catalog=catalog,\
+                                      expanded_activities=expanded_activities)
+        
+        cached = static_pipeline_cache.get(pipeline_name=pipeline.name,\
+                                           key=key)
+        
+        if cached is not None:
+            return attach_raw_activities(static_pipeline=cached[0],\
+                                         raw_activity_names=cached[1],\
+                                         expanded_activities=expanded_activities)
 
     virtual_graph = get_virtual_graph(activities=to_activities(raw_activities=pipeline.activities))
 
     generic_activities:Dict[str,GenericActivity] = dict()
 
-    expanded_activities = expand_activities(raw_activities=pipeline.activities)
-
     for edge in virtual_graph:
 
         activity = expanded_activities.get(edge.node_name)   
@@ -730,12 +895,49 @@ def get_static_pipeline(pipeline:APIPipelineResource,\
             continue
 
         generic_activity = get_generic_activity(raw_activity=activity,\
-                                                    datasets=datasets)
+                                                    catalog=catalog)
             
         generic_activities[activity.name] = generic_activity
     
-    return StaticPipeline(
+    static_pipeline = StaticPipeline(
         pipeline_name=pipeline.name,\
         virtual_graph=virtual_graph,\
         activities=generic_activities
-    )
\ No newline at end of file
+    )
+
+    if static_pipeline_cache is not None:
+
+        static_pipeline_cache.put(pipeline_name=pipeline.name,\
+                                  key=key,\
+                                  static_pipeline=detach_raw_activities(static_pipeline=static_pipeline),\
+                                  raw_activity_names={
+                                      name for name,activity in generic_activities.items()
+                                      if activity.raw_activity is not None
+                                  })
+
+    return static_pipeline
+
+def detach_raw_activities(static_pipeline:StaticPipeline)->StaticPipeline:
+    """
+    Remove the sdk object from the activities so that the static pipeline can be cached
+    """
+
+    return replace(static_pipeline,\
+                   activities={
+                       name:replace(activity,raw_activity=None)
+                       for name,activity in static_pipeline.activities.items()
+                   })
+
+def attach_raw_activities(static_pipeline:StaticPipeline,\
+                          raw_activity_names:Set[str],\
+                          expanded_activities:Dict[str,Any])->StaticPipeline:
+    """
+    Put back the sdk object of the activities of the cached static pipeline
+    """
+
+    return replace(static_pipeline,\
+                   activities={
+                       name:replace(activity,raw_activity=expanded_activities.get(name)) \
+                        if name in raw_activity_names else activity
+                       for name,activity in static_pipeline.activities.items()
+                   })
\ No newline at end of file
@@ -5,6 +5,7 @@ from typing import (
     Set
 )
 from dataclasses import dataclass
+import sys
 
 
 @dataclass
@@ -12,82 +13,312 @@ class Edge:
     node_name:str
     parent_nodes:List[str]
 
-def is_valid_edge(edge:Edge)->bool:
-    return len(edge.parent_nodes)==len(set(edge.parent_nodes))
+class ActivityGraph:
+    """
+    Graph of the activities indexed by node name.
+    The parents and the children of each node are kept as ordered sets (dict with None value)
+    so that the lookup is O(1) and the node removal is O(degree) while the order of the nodes and the parents
+    is the same as the list of edges
+    """
+    def __init__(self):
+        # node name -> parent node names
+        self.parents:Dict[str,Dict[str,None]] = dict()
+        # node name -> node names which use it as parent (the name may not be a node of the graph)
+        self.children:Dict[str,Dict[str,None]] = dict()
 
-def is_valid_edges(edges:List[Edge])->bool:
+    @staticmethod
+    def from_edges(edges:List[Edge])->"ActivityGraph":
 
-    node_names:List[str] = list()
+        graph = ActivityGraph()
 
-    for edge in edges:
-        if not is_valid_edge(edge=edge):
+        for edge in edges:
+            graph.add_node(node_name=edge.node_name,\
+                           parent_nodes=edge.parent_nodes)
+
+        return graph
+    
+    def to_edges(self)->List[Edge]:
+        return [
+            Edge(node_name=node_name,\
+                 parent_nodes=list(parent_nodes))
+            for node_name,parent_nodes in self.parents.items()
+        ]
+    
+    def copy(self)->"ActivityGraph":
+
+        graph = ActivityGraph()
+
+        graph.parents = {x:dict(y) for x,y in self.parents.items()}
+        graph.children = {x:dict(y) for x,y in self.children.items()}
+
+        return graph
+    
+    def __len__(self)->int:
+        return len(self.parents)
+    
+    def __contains__(self,node_name:str)->bool:
+        return node_name in self.parents
+    
+    def get_node_names(self)->List[str]:
+        return list(self.parents.keys())
+    
+    def get_parents(self,node_name:str)->List[str]:
+        return list(self.parents[node_name])
+    
+    def get_children(self,node_name:str)->List[str]:
+        """
+        Return the nodes which use the node as parent
+        """
+        return list(self.children.get(node_name,dict()))
+    
+    def is_parent(self,node_name:str)->bool:
+        return len(self.children.get(node_name,dict()))>0
+    
+    def add_node(self,node_name:str,parent_nodes:List[str])->None:
+        """
+        Add the node. If the node already exist , add the parents which it does not have yet
+        """
+
+        if node_name not in self.parents:
+            self.parents[node_name] = dict()
+
+        for parent_node in parent_nodes:
+            self.add_parent(node_name=node_name,\
+                            parent_node=parent_node)
+            
+    def add_parent(self,node_name:str,parent_node:str)->None:
+
+        if parent_node in self.parents[node_name]:
+            return
+        
+        self.parents[node_name][parent_node] = None
+
+        if parent_node not in self.children:
+            self.children[parent_node] = dict()
+
+        self.children[parent_node][node_name] = None
+
+    def remove_parent(self,node_name:str,parent_node:str)->None:
+
+        self.parents[node_name].pop(parent_node,None)
+
+        if parent_node in self.children:
+            self.children[parent_node].pop(node_name,None)
+
+    def merge(self,graph:"ActivityGraph")->None:
+        """
+        Add the nodes of the graph. The parents of the existing node are added after its own parents
+        """
+
+        for node_name,parent_nodes in graph.parents.items():
+            self.add_node(node_name=node_name,\
+                          parent_nodes=parent_nodes)
+            
+    def force_remove_node(self,node_name:str)->bool:
+        """
+        Forcefully remove the node. The nodes which use it as parent still keep it as parent
+        """
+
+        if node_name not in self.parents:
             return False
         
-        node_names.append(edge.node_name)
+        for parent_node in self.parents.pop(node_name):
+            self.children[parent_node].pop(node_name,None)
 
-    return len(node_names)==len(set(node_names))
+        return True
+    
+    def remove_node(self,node_name:str)->bool:
+        """
+        Remove the node and connect its parents to the nodes which use it as parent
+        """
 
-def remove_node(node_name:str,edges:List[Edge])->Optional[List[Edge]]:
+        if node_name not in self.parents:
+            return False
+        
+        parent_nodes = list(self.parents[node_name])
+
+        self.force_remove_node(node_name=node_name)
+
+        for child_node in self.get_children(node_name=node_name):
+
+            for parent_node in parent_nodes:
+                self.add_parent(node_name=child_node,\
+                                parent_node=parent_node)
+
+            self.remove_parent(node_name=child_node,\
+                               parent_node=node_name)
+            
+        self.children.pop(node_name,None)
+            
+        return True
     
-    node = get_node(node_name=node_name,edges=edges)
+    def replace_nodes(self,node_name:str,replace_node_names:List[str])->bool:
+        """
+        Replace the node with new nodes in its places
+        replace_node_names : new node which does not already exist
+        """
 
-    if node is None:
-        return None
+        if node_name not in self.parents or node_name in replace_node_names:
+            return False
+        
+        parent_nodes = list(self.parents[node_name])
+        
+        for replace_node_name in replace_node_names:
+            self.add_node(node_name=replace_node_name,\
+                          parent_nodes=parent_nodes)
+            
+        for child_node in self.get_children(node_name=node_name):
+
+            self.remove_parent(node_name=child_node,\
+                               parent_node=node_name)
+            
+            for replace_node_name in replace_node_names:
+                self.add_parent(node_name=child_node,\
+                                parent_node=replace_node_name)
+                
+        return self.remove_node(node_name=node_name)
+    
+    def replace_node_parents(self,node_name:str,replace_node_names:List[str])->bool:
+        """
+        Just replace the node which is used as parent to the new nodes as parents
+        replace_node_names : node which already exists
+        """
+
+        if node_name in replace_node_names or node_name not in self.parents:
+            return False
+        
+        for replace_node_name in replace_node_names:
+            if replace_node_name not in self.parents:
+                return False
+            
+        for child_node in self.get_children(node_name=node_name):
 
-    if not is_node_parent(node_name=node_name,edges=edges):
-        return force_remove_node(node_name=node_name,edges=edges)
+            if child_node in replace_node_names:
+                continue
+
+            self.remove_parent(node_name=child_node,\
+                               parent_node=node_name)
+            
+            for replace_node_name in replace_node_names:
+                if child_node!=replace_node_name:
+                    self.add_parent(node_name=child_node,\
+                                    parent_node=replace_node_name)
+                    
+        return True
     
-    new_edges = force_remove_node(node_name=node_name,edges=edges)
+    def get_disjointed_nodes(self)->List[str]:
+        """
+        Get node which have no parent and is not used by other nodes
+        """
+        return [
+            node_name for node_name,parent_nodes in self.parents.items()
+            if len(parent_nodes)==0 and not self.is_parent(node_name=node_name)
+        ]
+    
+    def get_last_nodes(self)->List[str]:
+        """
+        Get the last nodes (excluding disjointed nodes)
+        """
+        return [
+            node_name for node_name,parent_nodes in self.parents.items()
+            if len(parent_nodes)>0 and not self.is_parent(node_name=node_name)
+        ]
+    
+    def get_first_nodes(self)->List[str]:
+        """
+        Get the first nodes (excluding disjointed nodes)
+        """
+        return [
+            node_name for node_name,parent_nodes in self.parents.items()
+            if len(parent_nodes)==0 and self.is_parent(node_name=node_name)
+        ]
+    
+    def join_to_node(self,node_name:str,graph:"ActivityGraph")->bool:
+        """
+        Join the graph to the node. The first and disjointed nodes of the graph use the node as parent
+        graph : new graph to join
+        """
+
+        if node_name not in self.parents:
+            return False
+        
+        join_node_names = set(graph.get_first_nodes()).union(graph.get_disjointed_nodes())
 
-    used_edges = get_used_edge(node_name=node_name,edges=new_edges)
+        join_node_names.discard(node_name)
 
-    new_used_edges:List[Edge] = list()
+        for concate_node_name,parent_nodes in graph.parents.items():
+
+            self.add_node(node_name=concate_node_name,\
+                          parent_nodes=parent_nodes)
+            
+            if concate_node_name in join_node_names:
+                self.add_parent(node_name=concate_node_name,\
+                                parent_node=node_name)
+                
+        return True
+    
+    def replace_node_with_graph(self,node_name:str,graph:"ActivityGraph")->bool:
+        """
+        Replace the node with the graph. 
+        The parents of the node become the parents of the first nodes of the graph and
+        the last nodes of the graph become the parents of the nodes which use the node as parent
+        graph : graph to replace with. The nodes of the graph should not be existing nodes
+        """
+
+        if node_name not in self.parents:
+            return False
+        
+        first_nodes = graph.get_first_nodes()
 
-    #prepare new edge 
+        last_nodes = graph.get_last_nodes()
 
-    for edge in used_edges:
+        disjointed_nodes = graph.get_disjointed_nodes()
 
-        used_parent_node = list(edge.parent_nodes)
+        back_combine_node_names = last_nodes + [x for x in disjointed_nodes if x not in last_nodes]
 
-        #concate the parent node of the remove node to the node which is using that remove node
+        front_combine_node_names = first_nodes + [x for x in disjointed_nodes if x not in first_nodes]
 
-        for parent_node in node.parent_nodes:
-            if parent_node not in used_parent_node:
-                used_parent_node.append(parent_node)
+        self.join_to_node(node_name=node_name,\
+                          graph=graph)
         
-        #remove the node that we are going to remove as a parents
+        if not self.replace_node_parents(node_name=node_name,\
+                                         replace_node_names=back_combine_node_names):
+            return False
+        
+        remove_node_parents = self.get_parents(node_name=node_name)
 
-        used_parent_node.remove(node.node_name)
+        # we must have the put add parent of remove node to the front and disjointed node of replace edges
 
-        new_used_edges.append(Edge
-                              (
-                                  node_name=edge.node_name,
-                                  parent_nodes=used_parent_node
-                              ))
+        for front_node_name in front_combine_node_names:
+            for parent_node_name in remove_node_parents:
+                self.add_parent(node_name=front_node_name,\
+                                parent_node=parent_node_name)
+                
+        return self.remove_node(node_name=node_name)
 
-    new_parent_used_edge = edge_to_dict(new_used_edges)
+def is_valid_edge(edge:Edge)->bool:
+    return len(edge.parent_nodes)==len(set(edge.parent_nodes))
 
-    final_edge:List[Edge] = list()
-    
-    for edge in new_edges:
+def is_valid_edges(edges:List[Edge])->bool:
 
-        # add the new edge that we have prepare
+    node_names:List[str] = list()
 
-        if edge.node_name in new_parent_used_edge:
+    for edge in edges:
+        if not is_valid_edge(edge=edge):
+            return False
+        
+        node_names.append(edge.node_name)
 
-            final_edge.append(
-                Edge
-                (
-                    node_name=edge.node_name,
-                    parent_nodes=new_parent_used_edge[edge.node_name]
-                )
-            )
+    return len(node_names)==len(set(node_names))
+
+def remove_node(node_name:str,edges:List[Edge])->Optional[List[Edge]]:
 
-            continue
+    graph = ActivityGraph.from_edges(edges=edges)
 
-        final_edge.append(edge)
+    if not graph.remove_node(node_name=node_name):
+        return None
     
-    return final_edge
+    return graph.to_edges()
 
 def force_remove_node(node_name:str,edges:List[Edge])->List[Edge]:
     """
@@ -95,17 +326,7 @@ def force_remove_node(node_name:str,edges:List[Edge])->List[Edge]:
     Return edge with the node remove
     """
 
-    new_edges:List[Edge] = list()
-
-    for edge in edges:
-
-        if edge.node_name==node_name:
-            continue
-
-        new_edges.append(edge)
-
-
-    return new_edges
+    return [x for x in edges if x.node_name!=node_name]
 
 
 def is_node_parent(node_name:str,edges:List[Edge])->bool:
@@ -119,13 +340,7 @@ def get_used_edge(node_name:str,edges:List[Edge])->List[Edge]:
     Return which edge used the node name
     """
     
-    used_edge:List[Edge] = list()
-
-    for edge in edges:
-        if node_name in edge.parent_nodes:
-            used_edge.append(edge)
-
-    return used_edge
+    return [x for x in edges if node_name in x.parent_nodes]
 
 def get_node(node_name:str,edges:List[Edge])->Optional[Edge]:
     
@@ -138,50 +353,50 @@ def get_node(node_name:str,edges:List[Edge])->Optional[Edge]:
 def edge_to_dict(edges:List[Edge])->Dict[str,List[str]]:
     return {x.node_name:x.parent_nodes for x in edges}
 
+def intern_node_name(node_name:str)->str:
+    """
+    Share one copy of the node name because the same table is in the lineage of many pipelines
+    """
+    return sys.intern(node_name)
+
 def merge_edge(left_edges:List[Edge],right_edges:List[Edge])->List[Edge]:
-    
-    graph:Dict[str,Set[str]] = dict()
+    """
+    Merge the edges. If the same node in both edges , the additional right edge node parents are added after the left one
+    """
 
-    # load left side
+    graph = ActivityGraph.from_edges(edges=left_edges)
 
-    for node in left_edges:
-        graph[node.node_name] = set(node.parent_nodes)
-    
-    for node in right_edges:
-        # if the node does not exist in left edge
-        if node.node_name not in graph:
-            graph[node.node_name] = set(node.parent_nodes)
-        else:
-            # if the same node in both edge , add additional right edge node parent
-            graph[node.node_name].update(node.parent_nodes)
-
-    return [
-        Edge(
-            node_name=name,
-            parent_nodes=list(parents)
-        )
-        for name,parents in graph.items()
-    ]
-
-def merge_edges(graphs:List[List[Edge]])->List[Edge]:
-
-    if len(graphs)==0:
-        return list()
-    
-    left_edge = graphs[0]
+    graph.merge(graph=ActivityGraph.from_edges(edges=right_edges))
+
+    return graph.to_edges()
+
+def merge_edges(graphs:List[List[Edge]],is_sorted:bool=False)->List[Edge]:
+    """
+    Merge the edges of all the graphs in one pass into a single node -> parents map.
+    Give the same edges as merging the graphs one by one with merge_edge
+    is_sorted : whether to sort the nodes and their parents by name so that the order does not depend on the order of the graphs
+    """
 
-    merge_graph = left_edge
+    # node name -> parent node names (dict with None value to keep the order of the parents)
+    parents:Dict[str,Dict[str,None]] = dict()
 
-    for index in range(1,len(graphs)):
+    for edges in graphs:
 
-        right_edges = graphs[index]
+        for edge in edges:
 
-        merge_graph = merge_edge(left_edges=left_edge,\
-                                 right_edges=right_edges)
-        
-        left_edge = merge_graph
+            node_parents = parents.get(edge.node_name)
 
-    return merge_graph
+            if node_parents is None:
+                node_parents = dict()
+                parents[edge.node_name] = node_parents
+
+            for parent_node in edge.parent_nodes:
+                node_parents[parent_node] = None
+
+    if is_sorted:
+        return [Edge(node_name=node_name,parent_nodes=sorted(parents[node_name])) for node_name in sorted(parents)]
+
+    return [Edge(node_name=node_name,parent_nodes=list(node_parents)) for node_name,node_parents in parents.items()]
     
 def replace_nodes(node_name:str,replace_node_names:List[str],edges:List[Edge])->Optional[List[Edge]]:
     """
@@ -189,74 +404,13 @@ def replace_nodes(node_name:str,replace_node_names:List[str],edges:List[Edge])->
     replace_node_names : new node which does not already exist
     """
 
-    node = get_node(node_name=node_name,edges=edges)
+    graph = ActivityGraph.from_edges(edges=edges)
 
-    if node is None or node_name in replace_node_names:
+    if not graph.replace_nodes(node_name=node_name,\
+                               replace_node_names=replace_node_names):
         return None
     
-    new_nodes:List[Edge] = list()
-
-    for replace_node_name in replace_node_names:
-        new_nodes.append(
-            Edge
-            (
-                node_name=replace_node_name,\
-                parent_nodes=node.parent_nodes
-            )
-        )
-
-    edges.extend(new_nodes)
-
-    used_edge = get_used_edge(node_name=node_name,edges=edges)
-
-    if len(used_edge)>0:
-
-        new_edge:List[Edge] = list()
-
-        new_used_edge:List[Edge] = list()
-
-        for node in used_edge:
-            new_parents = list(node.parent_nodes)
-
-            #remove the node that we are going to replace as parent
-
-            new_parents.remove(node_name)
-
-            #add new node that we are going to replace with as parent
-
-            for replace_node_name in replace_node_names:
-                if replace_node_name not in new_parents:
-                    new_parents.append(replace_node_name)
-
-            new_used_edge.append(
-                Edge
-                (
-                    node_name=node.node_name,\
-                    parent_nodes=new_parents
-                )
-            )
-
-        new_parent_used_edge = edge_to_dict(new_used_edge)
- 
-        for edge in edges:
-            if edge.node_name in new_parent_used_edge:
-
-                new_edge.append(
-                    Edge
-                    (
-                        node_name=edge.node_name,
-                        parent_nodes=new_parent_used_edge[edge.node_name]
-                    )
-                )
-
-                continue
-
-            new_edge.append(edge)
-
-        edges = new_edge
-
-
-    return remove_node(node_name=node_name,edges=edges)
+    return graph.to_edges()
 
 def replace_node_parents(node_name:str,replace_node_names:List[str],edges:List[Edge])->Optional[List[Edge]]:
     """
@@ -264,70 +418,13 @@ def replace_node_parents(node_name:str,replace_node_names:List[str],edges:List[E
     replace_node_names : node which already exists
     """
 
-    # the new node name cannot be same as org value
+    graph = ActivityGraph.from_edges(edges=edges)
 
-    if node_name in replace_node_names:
+    if not graph.replace_node_parents(node_name=node_name,\
+                                      replace_node_names=replace_node_names):
         return None
     
-    # check if the node we wanted to replace actually exist
-
-    if get_node(node_name=node_name,edges=edges) is None:
-        return None
-    
-    # check if the node we are replacing the parent as actually exist
-
-    for node in replace_node_names:
-        if get_node(node_name=node,edges=edges) is None:
-            return None
-
-    used_edges = get_used_edge(node_name=node_name,edges=edges)
-
-    used_edges = [x for x in used_edges if x.node_name not in replace_node_names]
-
-    used_edges_dict = edge_to_dict(used_edges)
-
-    new_used_edges:List[Edge] = list()
-
-    for edge in used_edges:
-
-        parent_nodes = list(edge.parent_nodes)
-
-        if edge.node_name in used_edges_dict:
-
-            # remove the old parent node
-
-            parent_nodes.remove(node_name)
-
-            # add the new parent node
-
-            for replace_node_name in replace_node_names:
-                if edge.node_name!=replace_node_name and\
-                    replace_node_name not in parent_nodes:
-
-                    parent_nodes.append(replace_node_name)
-
-        new_used_edges.append(Edge(node_name=edge.node_name,\
-                                   parent_nodes=parent_nodes))
-
-    used_edges_dict = edge_to_dict(new_used_edges)
-
-    new_edges:List[Edge] = list()
-
-    for edge in edges:
-        if edge.node_name in used_edges_dict:
-
-            new_edges.append(
-                Edge
-                (
-                    node_name=edge.node_name,
-                    parent_nodes=used_edges_dict[edge.node_name]
-                )
-            )
-
-            continue
-        new_edges.append(edge)
-
-    return new_edges
+    return graph.to_edges()
 
 def replace_node_with_edge(node_name:str,replace_edges:List[Edge],edges:List[Edge])->Optional[List[Edge]]:
     """
@@ -336,121 +433,40 @@ def replace_node_with_edge(node_name:str,replace_edges:List[Edge],edges:List[Edg
     replace_edge : edge to replace with. The replace_edge should not be existing edge
     """
 
-    if get_node(node_name=node_name,edges=edges) is None:
-        return None
-
-    first_nodes = get_first_nodes(edges=replace_edges)
-
-    last_nodes = get_last_nodes(edges=replace_edges)
-
-    disjointed_nodes = get_disjointed_nodes(edges=replace_edges)
-
-    back_combine_edges = merge_edge(left_edges=last_nodes,\
-                               right_edges=disjointed_nodes)
-
-    back_combine_node_names = [x.node_name for x in back_combine_edges]
-
-    new_edges = join_to_node(node_name=node_name,\
-                 concate_edges=replace_edges,\
-                 edges=edges)
-
-
-    new_edges = replace_node_parents(node_name=node_name,\
-                         replace_node_names=back_combine_node_names,\
-                        edges=new_edges)
-    
-    front_combine_edges = merge_edge(left_edges=first_nodes,\
-               right_edges=disjointed_nodes)
-    
-    front_combine_node_names = [x.node_name for x in front_combine_edges]
-
-    remove_node_parents = edge_to_dict(new_edges)[node_name]
-
-
-    #if the node we are going to remove have a parent
-
-    if len(remove_node_parents)>0:
-
-        reconnection_edges:List[Edge] = list()
-
-        # we must have the put add parent of remove node to the front and disjointed node of replace edges
-
-        for edge in new_edges:
-            if edge.node_name in front_combine_node_names:
-                parent_nodes = list(edge.parent_nodes)
-
-                for parent_node_name in remove_node_parents:
-                    if parent_node_name not in parent_nodes:
-                        parent_nodes.append(parent_node_name)
-
-                reconnection_edges.append(
-                    Edge
-                    (
-                        node_name=edge.node_name,
-                        parent_nodes=parent_nodes
-                    )
-                )
+    graph = ActivityGraph.from_edges(edges=edges)
 
-                continue
-
-            reconnection_edges.append(edge)
-
-        new_edges = reconnection_edges
-
-    new_edges = remove_node(node_name=node_name,\
-                edges=new_edges)
-    
-    return new_edges
-
-    
+    if not graph.replace_node_with_graph(node_name=node_name,\
+                                         graph=ActivityGraph.from_edges(edges=replace_edges)):
+        return None
     
+    return graph.to_edges()
 
 def get_disjointed_nodes(edges:List[Edge])->List[Edge]:
     """
     Get node which have no parent and is not used by other nodes
     """
-    disjointed_nodes:List[Edge] = list()
 
-    for edge in edges:
-        if len(edge.parent_nodes)==0 and\
-              not is_node_parent(node_name=edge.node_name,edges=edges):
-            
-            disjointed_nodes.append(edge)
+    node_names = set(ActivityGraph.from_edges(edges=edges).get_disjointed_nodes())
 
-    return disjointed_nodes    
+    return [x for x in edges if x.node_name in node_names]
 
 def get_last_nodes(edges:List[Edge])->List[Edge]:
     """
     Get the last nodes (excluding disjointed nodes)
     """
 
-    last_nodes:List[Edge] = list()
-
-    for edge in edges:
-        if len(edge.parent_nodes)>0 and\
-        not is_node_parent(node_name=edge.node_name,edges=edges):
-            
-            last_nodes.append(edge)
-        
+    node_names = set(ActivityGraph.from_edges(edges=edges).get_last_nodes())
 
-    return last_nodes
+    return [x for x in edges if x.node_name in node_names]
 
 def get_first_nodes(edges:List[Edge])->List[Edge]:
     """
     Get the first nodes (excluding disjointed nodes)
     """
 
-    first_nodes:List[Edge] = list()
-
-    for edge in edges:
-        if len(edge.parent_nodes)==0 and\
-              is_node_parent(node_name=edge.node_name,edges=edges):
-            
-            first_nodes.append(edge)
-
-
-    return first_nodes
+    node_names = set(ActivityGraph.from_edges(edges=edges).get_first_nodes())
 
+    return [x for x in edges if x.node_name in node_names]
 
 def join_to_node(node_name:str,concate_edges:List[Edge],edges:List[Edge])->Optional[List[Edge]]:
     """
@@ -458,110 +474,13 @@ def join_to_node(node_name:str,concate_edges:List[Edge],edges:List[Edge])->Optio
     concate_edges : new edge to join
     """
 
-    if get_node(node_name=node_name,edges=edges) is None:
-        return None
-
-    first_nodes = get_first_nodes(edges=concate_edges)
-
-    disjointed_nodes = get_disjointed_nodes(edges=concate_edges)
-
-    # whether the join node already exist in new edges we wanted to concate
-
-    has_join_nodes = get_node(node_name=node_name,edges=concate_edges) is not None
-
-    new_concate_edges:List[Edge] = list()
-
-    if has_join_nodes:
-
-        new_disjointed_nodes:List[Edge] = list()
-
-        for edge in disjointed_nodes:
-
-            #if it is not a node that we wanted to join to add that join node as parents
-
-            if edge.node_name!=node_name:
-
-                new_disjointed_nodes.append(
-                    Edge
-                    (
-                        node_name=edge.node_name,
-                        parent_nodes=[node_name]
-                    )
-                )
+    graph = ActivityGraph.from_edges(edges=edges)
 
-                continue
-
-            new_disjointed_nodes.append(edge)
-
-        new_first_nodes:List[Edge] = list()
-
-        for edge in first_nodes:
-
-            #if it is not a node that we wanted to join , add that join node as parent nodes
-
-            if edge.node_name!=node_name:
-                parent_nodes = list(edge.parent_nodes)
-                parent_nodes.append(node_name)
-
-                new_first_nodes.append(
-                    Edge
-                    (
-                        node_name=edge.node_name,\
-                        parent_nodes=parent_nodes
-                    )
-                )
-
-                continue
-
-            new_first_nodes.append(edge)
-
-        for edge in concate_edges:
-
-            first_node = get_node(edge.node_name,edges=new_first_nodes)
-
-            is_in_first_node = first_node is not None
-
-            disjointed_node = get_node(edge.node_name,edges=new_disjointed_nodes)
-
-            is_in_disjointed_nodes = disjointed_node is not None
-
-            if is_in_first_node:
-                new_concate_edges.append(first_node)
-            elif is_in_disjointed_nodes:
-                new_concate_edges.append(disjointed_node)
-            else:
-                new_concate_edges.append(edge)
-
-    else:
-
-        # no join nodes has been found , we just have to add them as new edge
-
-        for edge in concate_edges:
-
-            is_in_first_node = get_node(edge.node_name,edges=first_nodes) is not None
-
-            is_in_disjointed_nodes = get_node(edge.node_name,edges=disjointed_nodes) is not None
-
-            #add the node that we wanted to join as parent 
-
-            if is_in_first_node or is_in_disjointed_nodes:
-
-                parent_nodes = list(edge.parent_nodes)
-                parent_nodes.append(node_name)
-
-                new_concate_edges.append(
-                    Edge
-                    (
-                        node_name=edge.node_name,\
-                        parent_nodes=parent_nodes
-                    )
-                )
-
-                continue
-
-            new_concate_edges.append(edge)
-            
-    return merge_edge(left_edges=edges,right_edges=new_concate_edges)
+    if not graph.join_to_node(node_name=node_name,\
+                              graph=ActivityGraph.from_edges(edges=concate_edges)):
+        return None
+    
+    return graph.to_edges()
 
 def get_node_names(edges:List[Edge])->Set[str]:
     """
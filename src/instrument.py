@@ -0,0 +1,302 @@
+from typing import (
+    Dict,
+    Any,
+    Optional,
+    Callable,
+    TypeVar
+)
+from dataclasses import asdict
+from datetime import (
+    datetime,
+    timezone
+)
+from pathlib import Path
+from model import CallStats
+from serializer import dumps
+import functools
+import inspect
+import threading
+import time
+import os
+
+F = TypeVar("F",bound=Callable[...,Any])
+
+# name of the calls of the http requests sent to the api
+HTTP_REQUEST_NAME = "http.request"
+
+# default of failed_result which mean the result is not checked
+NOT_CHECKED = object()
+
+class Instrumentation:
+    """
+    Timers and counters of the stages and the calls of the run.
+    Nothing is collected until it is enabled so that the instrumented functions only check is_enabled
+    """
+
+    def __init__(self):
+
+        self.is_enabled = False
+
+        self.lock = threading.Lock()
+
+        self.reset()
+
+    def reset(self)->None:
+
+        self.started_at = datetime.now(timezone.utc)
+
+        self.start_time = time.monotonic()
+
+        # stage name -> seconds , in the order the stages are started
+        self.stage_seconds:Dict[str,float] = dict()
+
+        self.stage_name:Optional[str] = None
+
+        self.stage_start_time = 0.0
+
+        self.call_stats:Dict[str,CallStats] = dict()
+
+    def enable(self)->None:
+        self.reset()
+        self.is_enabled = True
+
+    def disable(self)->None:
+        self.is_enabled = False
+
+    def record(self,\
+               name:str,\
+               seconds:float=0,\
+               is_error:bool=False,\
+               byte_count:int=0)->None:
+        """
+        Add a call to the stats of the name
+        """
+
+        with self.lock:
+
+            stats = self.call_stats.get(name)
+
+            if stats is None:
+                stats = CallStats()
+                self.call_stats[name] = stats
+
+            stats.call_count += 1
+            stats.seconds += seconds
+            stats.byte_count += byte_count
+            stats.max_seconds = max(stats.max_seconds,seconds)
+
+            if is_error:
+                stats.error_count += 1
+
+    def add_byte_count(self,name:str,byte_count:int)->None:
+        """
+        Add the bytes to the stats of the name without counting a call.
+        Nothing is added when it is not enabled
+        """
+
+        if not self.is_enabled:
+            return
+
+        with self.lock:
+
+            stats = self.call_stats.get(name)
+
+            if stats is None:
+                stats = CallStats()
+                self.call_stats[name] = stats
+
+            stats.byte_count += byte_count
+
+    def start_stage(self,name:str)->None:
+        """
+        End the current stage and start the next one.
+        The stages are the steps of main which run one after another
+        """
+
+        if not self.is_enabled:
+            return
+
+        self.end_stage()
+
+        self.stage_name = name
+        self.stage_start_time = time.monotonic()
+
+    def end_stage(self)->None:
+
+        if self.stage_name is None:
+            return
+
+        seconds = time.monotonic()-self.stage_start_time
+
+        self.stage_seconds[self.stage_name] = self.stage_seconds.get(self.stage_name,0)+seconds
+
+        self.stage_name = None
+
+    def get_report(self,exit_code:int)->Dict[str,Any]:
+
+        # the stage which is running when the run exit is the stage which fail
+        failed_stage = self.stage_name if exit_code!=0 else None
+
+        self.end_stage()
+
+        with self.lock:
+            calls = {name:asdict(stats) for name,stats in sorted(self.call_stats.items())}
+
+        return {
+            "exit_code":exit_code,
+            "started_at":self.started_at.isoformat(),
+            "ended_at":datetime.now(timezone.utc).isoformat(),
+            "seconds":time.monotonic()-self.start_time,
+            "failed_stage":failed_stage,
+            "stages":dict(self.stage_seconds),
+            "calls":calls
+        }
+
+# shared by the whole run
+INSTRUMENTATION = Instrumentation()
+
+def instrument(name:Optional[str]=None,\
+               failed_result:Any=NOT_CHECKED)->Callable[[F],F]:
+    """
+    Time and count the calls of the function (or coroutine function).
+    name : name of the stats. It is the qualified name of the function if it is None
+    failed_result : result which is counted as the error (such as None of the client). Only the exception is counted if it is not given
+    """
+
+    def decorator(func:F)->F:
+
+        stats_name = name if name is not None else func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args,**kwargs):
+
+                if not INSTRUMENTATION.is_enabled:
+                    return await func(*args,**kwargs)
+
+                start_time = time.monotonic()
+
+                try:
+                    result = await func(*args,**kwargs)
+                except BaseException:
+                    INSTRUMENTATION.record(name=stats_name,\
+                                           seconds=time.monotonic()-start_time,\
+                                           is_error=True)
+                    raise
+
+                INSTRUMENTATION.record(name=stats_name,\
+                                       seconds=time.monotonic()-start_time,\
+                                       is_error=failed_result is not NOT_CHECKED and result is failed_result)
+
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args,**kwargs):
+
+            if not INSTRUMENTATION.is_enabled:
+                return func(*args,**kwargs)
+
+            start_time = time.monotonic()
+
+            try:
+                result = func(*args,**kwargs)
+            except BaseException:
+                INSTRUMENTATION.record(name=stats_name,\
+                                       seconds=time.monotonic()-start_time,\
+                                       is_error=True)
+                raise
+
+            INSTRUMENTATION.record(name=stats_name,\
+                                   seconds=time.monotonic()-start_time,\
+                                   is_error=failed_result is not NOT_CHECKED and result is failed_result)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+def get_content_length(headers:Any)->int:
+    """
+    Bytes of the http response. 0 if the response does not have the content-length (chunked)
+    """
+
+    try:
+        return int(headers.get("Content-Length",0))
+    except (TypeError,ValueError):
+        return 0
+
+def record_http_request(seconds:float,status_code:int,headers:Any)->None:
+    INSTRUMENTATION.record(name=HTTP_REQUEST_NAME,\
+                           seconds=seconds,\
+                           is_error=status_code>=400,\
+                           byte_count=get_content_length(headers=headers))
+
+def write_file(file_path:str,data:bytes)->None:
+    """
+    Write to the temporary file and replace so that the reader (node exporter) never see the half written file
+    """
+
+    path = Path(file_path)
+
+    path.parent.mkdir(parents=True,exist_ok=True)
+
+    temp_file_path = path.with_name(f"{path.name}.tmp")
+
+    temp_file_path.write_bytes(data)
+
+    os.replace(temp_file_path,path)
+
+def write_run_report(file_path:str,report:Dict[str,Any])->None:
+    write_file(file_path=file_path,\
+               data=dumps(value=report))
+
+def escape_label(value:str)->str:
+    return value.replace("\\","\\\\").replace("\"","\\\"").replace("\n","\\n")
+
+def to_prometheus_text(report:Dict[str,Any])->str:
+    """
+    Run report in the prometheus text format for the textfile collector of the node exporter
+    """
+
+    lines = [
+        "# HELP azure_lineage_exit_code Exit code of the last run",
+        "# TYPE azure_lineage_exit_code gauge",
+        f"azure_lineage_exit_code {report['exit_code']}",
+        "# HELP azure_lineage_run_seconds Seconds of the last run",
+        "# TYPE azure_lineage_run_seconds gauge",
+        f"azure_lineage_run_seconds {report['seconds']}",
+        "# HELP azure_lineage_stage_seconds Seconds of each stage of the last run",
+        "# TYPE azure_lineage_stage_seconds gauge"
+    ]
+
+    for stage_name,seconds in report["stages"].items():
+        lines.append(f"azure_lineage_stage_seconds{{stage=\"{escape_label(stage_name)}\"}} {seconds}")
+
+    # (metric,field,help)
+    call_metrics = [
+        ("azure_lineage_calls_total","call_count","Number of calls"),
+        ("azure_lineage_errors_total","error_count","Number of failed calls"),
+        ("azure_lineage_bytes_total","byte_count","Bytes received or written by the calls"),
+        ("azure_lineage_call_seconds_total","seconds","Total seconds of the calls"),
+        ("azure_lineage_call_max_seconds","max_seconds","Seconds of the slowest call")
+    ]
+
+    for metric,field_name,help_text in call_metrics:
+
+        metric_type = "gauge" if field_name=="max_seconds" else "counter"
+
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {metric_type}")
+
+        for call_name,stats in report["calls"].items():
+            lines.append(f"{metric}{{name=\"{escape_label(call_name)}\"}} {stats[field_name]}")
+
+    return "\n".join(lines)+"\n"
+
+def write_prometheus_textfile(file_path:str,report:Dict[str,Any])->None:
+    write_file(file_path=file_path,\
+               data=to_prometheus_text(report=report).encode("utf-8"))
@@ -3,41 +3,66 @@ from sqlglot import (
     parse_one,
     exp
 )
+from sqlglot.tokens import (
+    Token,
+    TokenType
+)
 from typing import (
     Set,
     List,
     Optional,
     Dict,
-    Tuple
+    Tuple,
+    FrozenSet
 )
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import sqlglot
+import sqlite3
+import hashlib
+import json
+import signal
+import sys
+import threading
+import time
 from core import (
     resolve_dataset_parameter,
     resolve_table_expression,
     resolve_blob_expression,
     normalize_blob_path
 )
-from search import find_linked_service
+from search import MetadataCatalog
+from instrument import instrument
 from logging import Logger
 from model import (
     GenericActivity,
     PipelineRuntimeContext,
-    LinkedService,
     SingleTableDataset,
     QueryDataset,
     LocationDataset,
     LineageActivityInfo,
     ActivityType,
-    StaticPipeline
+    StaticPipeline,
+    SqlParseCacheStats,
+    SqlDialectStats,
+    SqlParseBudget
 )
 from connector import(
     get_linked_service_host_prefix,
     get_sql_script,
+    get_sql_dialect,
     get_sql_pool_host_prefix
 )
-from graph import Edge
+from graph import (
+    Edge,
+    intern_node_name
+)
 from util import (
     has_field,
-    add_lineage
+    add_lineage,
+    LineageAccumulator,
+    get_batches
 )
 from pluginhelper import (
     LineagePluginWrapper,
@@ -49,13 +74,228 @@ from pluginhelper import (
 )
 from plugin import ActivityLineageContext
 
+# version of the sql normalization (clean_sql,normalize_sql) and the base table extraction (find_base_tables).
+# Increase it when they change so that the stored sql lineage is not used
+
+CLEAN_SQL_VERSION = 3
+
+# name of the dialect in the parse statistics when the sql is parsed without the dialect
+
+DEFAULT_DIALECT_NAME = "default"
+
+class SqlParseTimeout(BaseException):
+    """
+    Raised when the parsing exceed the time budget.
+    It is not the Exception so that it is not swallowed while sqlglot is parsing
+    """
+
+class SqlLineageStore:
+    """
+    SQLite store of the base tables of the sql which is kept across the runs.
+    The store is emptied when it is written by the other sqlglot version or CLEAN_SQL_VERSION
+    """
+    def __init__(self,file_path:str):
+
+        Path(file_path).parent.mkdir(parents=True,exist_ok=True)
+
+        self.connection = sqlite3.connect(file_path)
+
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY,value TEXT)")
+
+        # tables is NULL when the sql cannot be parsed
+        self.connection.execute("CREATE TABLE IF NOT EXISTS sql_lineage (sql_hash TEXT PRIMARY KEY,tables TEXT)")
+
+        version = f"{sqlglot.__version__}:{CLEAN_SQL_VERSION}"
+
+        row = self.connection.execute("SELECT value FROM meta WHERE key='version'").fetchone()
+
+        if row is None or row[0]!=version:
+            self.connection.execute("DELETE FROM sql_lineage")
+            self.connection.execute("INSERT OR REPLACE INTO meta (key,value) VALUES ('version',?)",(version,))
+            self.connection.commit()
+
+    def get(self,sql_hash:str)->Tuple[bool,Optional[FrozenSet[str]]]:
+        """
+        Return (whether the sql is in the store,base tables or None if the sql cannot be parsed)
+        """
+
+        row = self.connection.execute("SELECT tables FROM sql_lineage WHERE sql_hash=?",(sql_hash,)).fetchone()
+
+        if row is None:
+            return (False,None)
+        
+        if row[0] is None:
+            return (True,None)
+        
+        return (True,frozenset(json.loads(row[0])))
+    
+    def put(self,sql_hash:str,tables:Optional[FrozenSet[str]])->None:
+
+        raw_tables = None
+
+        if tables is not None:
+            raw_tables = json.dumps(sorted(tables))
+
+        self.connection.execute("INSERT OR REPLACE INTO sql_lineage (sql_hash,tables) VALUES (?,?)",(sql_hash,raw_tables))
+
+    def close(self)->None:
+        """
+        Write the new sql lineage and close the store
+        """
+        self.connection.commit()
+        self.connection.close()
+
+class SqlLineageCache:
+    """
+    LRU cache of the base tables of the sql keyed by (normalized sql,dialect).
+    The sql which cannot be parsed is also cached so that it is not parsed again
+    """
+    def __init__(self,max_size:int=1024,store:Optional[SqlLineageStore]=None):
+        """
+        max_size : maximum number of sql in the cache. Nothing is cached if it is 0
+        store : persistent store which is looked up when the sql is not in the cache
+        """
+
+        self.max_size = max_size
+
+        self.store = store
+
+        self.store_hit_count = 0
+
+        # value is None when the sql cannot be parsed
+        self.tables:OrderedDict[Tuple[str,Optional[str]],Optional[FrozenSet[str]]] = OrderedDict()
+
+        # sql parsed ahead by parse_sql_lineage_in_processes. It is never evicted
+        self.pinned_tables:Dict[Tuple[str,Optional[str]],Optional[FrozenSet[str]]] = dict()
+
+        self.hit_count = 0
+        self.miss_count = 0
+        self.eviction_count = 0
+
+        self.dialect_stats:Dict[str,SqlDialectStats] = dict()
+
+    def get(self,sql:str,dialect:Optional[str])->Tuple[bool,Optional[FrozenSet[str]]]:
+        """
+        Return (whether the sql is in the cache,base tables or None if the sql cannot be parsed)
+        """
+
+        key = (normalize_sql(sql=sql),dialect)
+
+        if key in self.pinned_tables:
+
+            self.hit_count += 1
+
+            return (True,self.pinned_tables[key])
+
+        if key in self.tables:
+            
+            self.hit_count += 1
+
+            self.tables.move_to_end(key)
+
+            return (True,self.tables[key])
+        
+        if self.store is not None:
+
+            is_found,tables = self.store.get(sql_hash=get_sql_hash(sql=key[0],dialect=dialect))
+
+            if is_found:
+                self.store_hit_count += 1
+                self.add(key=key,tables=tables)
+                return (True,tables)
+        
+        self.miss_count += 1
+
+        return (False,None)
+    
+    def put(self,sql:str,dialect:Optional[str],tables:Optional[FrozenSet[str]],is_persist:bool=True)->None:
+        """
+        is_persist : whether to write the sql to the persistent store
+        """
+
+        key = (normalize_sql(sql=sql),dialect)
+
+        if self.store is not None and is_persist:
+            self.store.put(sql_hash=get_sql_hash(sql=key[0],dialect=dialect),\
+                           tables=tables)
+
+        self.add(key=key,tables=tables)
+
+    def pin(self,sql:str,dialect:Optional[str],tables:Optional[FrozenSet[str]],is_persist:bool=True)->None:
+        """
+        Cache the sql which is not evicted even when the cache is full
+        """
+
+        key = (normalize_sql(sql=sql),dialect)
+
+        if self.store is not None and is_persist:
+            self.store.put(sql_hash=get_sql_hash(sql=key[0],dialect=dialect),\
+                           tables=tables)
+
+        self.pinned_tables[key] = tables
+
+    def is_cached(self,sql:str,dialect:Optional[str])->bool:
+        """
+        Check whether the sql is in the cache or the store without counting it as the hit
+        """
+
+        key = (normalize_sql(sql=sql),dialect)
+
+        if key in self.pinned_tables or key in self.tables:
+            return True
+
+        if self.store is not None:
+            return self.store.get(sql_hash=get_sql_hash(sql=key[0],dialect=dialect))[0]
+
+        return False
+
+    def add(self,key:Tuple[str,Optional[str]],tables:Optional[FrozenSet[str]])->None:
+
+        if self.max_size<=0:
+            return
+
+        self.tables[key] = tables
+
+        self.tables.move_to_end(key)
+
+        while len(self.tables)>self.max_size:
+            self.tables.popitem(last=False)
+            self.eviction_count += 1
+
+    def record_parse(self,dialect:Optional[str],seconds:float,is_fallback:bool)->None:
+
+        stats = self.dialect_stats.setdefault(dialect or DEFAULT_DIALECT_NAME,SqlDialectStats())
+
+        stats.parse_count += 1
+        stats.parse_seconds += seconds
+        stats.max_parse_seconds = max(stats.max_parse_seconds,seconds)
+
+        if is_fallback:
+            stats.fallback_count += 1
+
+    def get_stats(self)->SqlParseCacheStats:
+        return SqlParseCacheStats(hit_count=self.hit_count,\
+                                  store_hit_count=self.store_hit_count,\
+                                  miss_count=self.miss_count,\
+                                  eviction_count=self.eviction_count,\
+                                  failed_count=sum(1 for x in self.tables.values() if x is None)+\
+                                    sum(1 for x in self.pinned_tables.values() if x is None),\
+                                  size=len(self.tables)+len(self.pinned_tables),\
+                                  dialect_stats=dict(self.dialect_stats))
+
 def clean_sql(sql:str)->str:
     return sql.replace("[","").replace("]","")
 
-def get_sql_lineage(sql:str,dialect:str=None)->Set[str]:
+def normalize_sql(sql:str)->str:
     """
-    Get the set of base table (excluding CTE)
+    Normalize the sql which only differ by the line ending or the surrounding whitespace
     """
+    return sql.replace("\r\n","\n").strip()
+
+def get_sql_hash(sql:str,dialect:Optional[str])->str:
+    return hashlib.sha256(f"{dialect}\0{sql}".encode("utf-8")).hexdigest()
+
+def parse_sql_lineage(sql:str,dialect:Optional[str]=None)->Set[str]:
 
     ast = None
 
@@ -63,58 +303,409 @@ def get_sql_lineage(sql:str,dialect:str=None)->Set[str]:
         ast = parse_one(sql=sql)
     else:
         ast = parse_one(sql=sql,dialect=dialect)
-    
 
     return find_base_tables(ast)
 
-def find_base_tables(ast:Expression)->Set[str]:
+def raise_parse_timeout(signum,frame):
+    raise SqlParseTimeout()
+
+def is_parse_timeout_supported()->bool:
+    """
+    The timer signal is only available on unix and its handler can only be set in the main thread
+    """
+    return hasattr(signal,"setitimer") and \
+        threading.current_thread() is threading.main_thread()
+
+def parse_sql_lineage_with_timeout(sql:str,\
+                                   dialect:Optional[str],\
+                                   timeout_seconds:float)->Set[str]:
+    """
+    Raise SqlParseTimeout when the parsing take longer than timeout_seconds.
+    There is no time limit if timeout_seconds is 0 or the timer is not supported
+    """
+
+    if timeout_seconds<=0 or not is_parse_timeout_supported():
+        return parse_sql_lineage(sql=sql,dialect=dialect)
+
+    previous_handler = signal.signal(signal.SIGALRM,raise_parse_timeout)
+
+    signal.setitimer(signal.ITIMER_REAL,timeout_seconds)
+
+    try:
+        return parse_sql_lineage(sql=sql,dialect=dialect)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL,0)
+        signal.signal(signal.SIGALRM,previous_handler)
+
+def parse_sql_lineage_within_budget(sql:str,\
+                                    dialect:Optional[str],\
+                                    budget:Optional[SqlParseBudget])->Tuple[Set[str],bool]:
+    """
+    Return (base tables,whether the sql exceed the budget and the tables are found by scan_sql_tables)
+    """
+
+    if budget is None:
+        return (parse_sql_lineage(sql=sql,dialect=dialect),False)
+
+    if budget.max_length>0 and len(sql)>budget.max_length:
+        return (scan_sql_tables(sql=sql,dialect=dialect),True)
+
+    try:
+        return (parse_sql_lineage_with_timeout(sql=sql,\
+                                               dialect=dialect,\
+                                               timeout_seconds=budget.timeout_seconds),False)
+    except SqlParseTimeout:
+        return (scan_sql_tables(sql=sql,dialect=dialect),True)
+
+@instrument()
+def get_sql_lineage(sql:str,\
+                    dialect:str=None,\
+                    cache:Optional[SqlLineageCache]=None,\
+                    budget:Optional[SqlParseBudget]=None)->Set[str]:
+    """
+    Get the set of base table (excluding CTE)
+    Raise the exception when the sql cannot be parsed
+    cache : cache of the parsed sql. Always parse the sql if it is None
+    budget : the sql which exceed it is scanned for the tables instead of being parsed
+    """
+
+    if cache is None:
+        return parse_sql_lineage_within_budget(sql=sql,dialect=dialect,budget=budget)[0]
     
+    is_found,tables = cache.get(sql=sql,dialect=dialect)
+
+    if is_found:
+
+        if tables is None:
+            raise ValueError("sql cannot be parsed (cached)")
+        
+        return set(tables)
+    
+    start_time = time.perf_counter()
+
+    try:
+        parsed_tables,is_fallback = parse_sql_lineage_within_budget(sql=sql,\
+                                                                    dialect=dialect,\
+                                                                    budget=budget)
+    except Exception:
+        cache.record_parse(dialect=dialect,seconds=time.perf_counter()-start_time,is_fallback=False)
+        cache.put(sql=sql,dialect=dialect,tables=None)
+        raise
+
+    cache.record_parse(dialect=dialect,seconds=time.perf_counter()-start_time,is_fallback=is_fallback)
+
+    tables = frozenset(parsed_tables)
+
+    # the scanned tables depend on the budget of the run so they are not kept across the runs
+    cache.put(sql=sql,dialect=dialect,tables=tables,is_persist=not is_fallback)
+
+    return set(tables)
+
+def parse_sql_batch(queries:List[Tuple[str,Optional[str]]],\
+                    budget:Optional[SqlParseBudget])->List[Tuple[Optional[FrozenSet[str]],bool,float]]:
+    """
+    Parse the batch of (sql,dialect) in the worker process.
+    Return (base tables or None if the sql cannot be parsed,whether the tables are scanned,parse seconds) of each sql
+    """
+
+    results:List[Tuple[Optional[FrozenSet[str]],bool,float]] = list()
+
+    for sql,dialect in queries:
+
+        start_time = time.perf_counter()
+
+        try:
+            tables,is_fallback = parse_sql_lineage_within_budget(sql=sql,\
+                                                                 dialect=dialect,\
+                                                                 budget=budget)
+            results.append((frozenset(tables),is_fallback,time.perf_counter()-start_time))
+        except Exception:
+            results.append((None,False,time.perf_counter()-start_time))
+
+    return results
+
+@instrument()
+def parse_sql_lineage_in_processes(queries:List[Tuple[str,Optional[str]]],\
+                                   cache:SqlLineageCache,\
+                                   process_count:int,\
+                                   budget:Optional[SqlParseBudget]=None)->int:
+    """
+    Parse the distinct (sql,dialect) which are not cached yet in the process pool
+    and pin the result in the cache so that get_sql_lineage does not parse them again.
+    Return the number of sql parsed
+    """
+
+    pending_queries:List[Tuple[str,Optional[str]]] = list()
+
+    seen_keys:Set[Tuple[str,Optional[str]]] = set()
+
+    for sql,dialect in queries:
+
+        key = (normalize_sql(sql=sql),dialect)
+
+        if key in seen_keys or cache.is_cached(sql=sql,dialect=dialect):
+            continue
+
+        seen_keys.add(key)
+
+        pending_queries.append(key)
+
+    if len(pending_queries)==0:
+        return 0
+
+    # a few batches per process so that the long sql in one batch does not keep the other processes idle
+
+    batch_size = max(1,-(-len(pending_queries)//(process_count*4)))
+
+    batches = get_batches(values=pending_queries,batch_size=batch_size)
+
+    with ProcessPoolExecutor(max_workers=process_count) as executor:
+
+        for batch,results in zip(batches,executor.map(parse_sql_batch,batches,[budget]*len(batches))):
+
+            for (sql,dialect),(tables,is_fallback,seconds) in zip(batch,results):
+
+                cache.record_parse(dialect=dialect,seconds=seconds,is_fallback=is_fallback)
+
+                # the scanned tables depend on the budget of the run so they are not kept across the runs
+                cache.pin(sql=sql,dialect=dialect,tables=tables,is_persist=not is_fallback)
+
+    return len(pending_queries)
+
+# tokens after which the table name is expected
+
+TABLE_KEYWORD_TOKENS = {TokenType.FROM,TokenType.JOIN}
+
+NAME_TOKENS = {TokenType.VAR,TokenType.IDENTIFIER}
+
+def scan_table_name(tokens:List[Token],index:int)->Tuple[Optional[str],int]:
+    """
+    Read the dotted name starting at index.
+    Return (name or None if there is no name at index,index after the name and its alias)
+    """
+
+    parts:List[str] = list()
+
+    while index<len(tokens) and tokens[index].token_type in NAME_TOKENS:
+
+        parts.append(tokens[index].text)
+
+        index += 1
+
+        if index<len(tokens) and tokens[index].token_type==TokenType.DOT:
+            index += 1
+        else:
+            break
+
+    if len(parts)==0:
+        return (None,index)
+
+    # skip the alias
+
+    if index<len(tokens) and tokens[index].token_type==TokenType.ALIAS:
+        index += 1
+
+    if index<len(tokens) and tokens[index].token_type in NAME_TOKENS:
+        index += 1
+
+    return (".".join(parts),index)
+
+def scan_sql_tables(sql:str,dialect:Optional[str]=None)->Set[str]:
+    """
+    Get the set of base table (excluding CTE) by only scanning the tokens of the sql.
+    The table is the name after FROM , JOIN and the comma of FROM a,b.
+    It is less accurate than parsing so it is only used when the sql exceed the parse budget
+    """
+
+    tokens = sqlglot.tokenize(sql=sql,read=dialect)
+
     ctes:Set[str] = set()
 
     tables:Set[str] = set()
 
-    for cte in ast.find_all(exp.CTE):
-        ctes.add(cte.alias_or_name)
+    # cte is in "name AS (" form
+
+    for index in range(len(tokens)-2):
+        if tokens[index].token_type in NAME_TOKENS and\
+            tokens[index+1].token_type==TokenType.ALIAS and\
+            tokens[index+2].token_type==TokenType.L_PAREN:
+            ctes.add(tokens[index].text)
+
+    index = 0
+
+    while index<len(tokens):
+
+        if tokens[index].token_type not in TABLE_KEYWORD_TOKENS:
+            index += 1
+            continue
+
+        index += 1
 
-    for table in ast.find_all(exp.Table):
-        #ignore if the table is the cte
-        if table.name not in ctes:
-            tables.add(internal_get_table_name(table))
+        while True:
+
+            table_name,index = scan_table_name(tokens=tokens,index=index)
+
+            if table_name is None:
+                break
+
+            if table_name.split(".")[-1] not in ctes:
+                tables.add(table_name)
+
+            if index<len(tokens) and tokens[index].token_type==TokenType.COMMA:
+                index += 1
+            else:
+                break
 
     return tables
 
-def internal_add_surfix(text:str,surfix:str,false_value:str)->str:
-    if text is None:
-        return false_value
-    
-    return text+surfix
+def find_base_tables(ast:Expression)->Set[str]:
+    """
+    Get the set of base table (excluding CTE) in one walk of the ast.
+    The unqualified table is the CTE only when the CTE is defined in the enclosing query
+    (or before it in the same WITH) so that the table which has the same name as the CTE of the other query is kept
+    """
+
+    tables:Set[str] = set()
+
+    # (expression,names of the CTE visible in the expression)
+    stack:List[Tuple[Expression,FrozenSet[str]]] = [(ast,frozenset())]
+
+    while len(stack)>0:
+
+        expression,ctes = stack.pop()
+
+        if isinstance(expression,exp.Table):
+
+            #ignore if the table is the cte or the temporary table
+            if not (expression.name in ctes and \
+                    expression.args.get("db") is None and \
+                    expression.args.get("catalog") is None) and \
+                not is_temporary_table(table_expression=expression):
+                tables.add(internal_get_table_name(expression))
+
+        with_expression = expression.args.get("with")
+
+        if isinstance(with_expression,exp.With):
+
+            cte_names:List[str] = list()
+
+            for cte in with_expression.expressions:
+
+                # the cte can refer to the previous cte and itself (recursive cte)
+                cte_names.append(cte.alias_or_name)
+
+                stack.append((cte,ctes.union(cte_names)))
+
+            ctes = ctes.union(cte_names)
+
+        for value in expression.args.values():
+
+            if type(value) is list:
+                for child in value:
+                    if isinstance(child,Expression):
+                        stack.append((child,ctes))
+            elif isinstance(value,Expression) and value is not with_expression:
+                stack.append((value,ctes))
+
+    return tables
+
+def is_temporary_table(table_expression:Expression)->bool:
+    """
+    Whether the table is the #temp (local) or ##temp (global) temporary table of tsql.
+    The temporary table only live in the session so it is not the lineage node
+    """
+
+    identifier = table_expression.this
+
+    if not isinstance(identifier,exp.Identifier):
+        return False
+
+    return bool(identifier.args.get("temporary")) or bool(identifier.args.get("global"))
 
 def internal_get_table_name(table_expression:Expression)->str:
     """
     From the table_expression , try to get the table name in 
-    database.schema.table format
+    database.schema.table format.
+    The name is interned because the same table is found in many sql
     """
 
-    database_name = None
+    table_name = table_expression.name
 
-    schema_name = None
+    schema_expression = table_expression.args.get("db")
 
-    table_name = table_expression.name
+    database_expression = table_expression.args.get("catalog")
+
+    if schema_expression is not None:
+        table_name = f"{schema_expression.name}.{table_name}"
+
+    if database_expression is not None:
+        table_name = f"{database_expression.name}.{table_name}"
 
-    if "db" in table_expression.args.keys() and table_expression.args["db"] is not None:
-        schema_name = table_expression.args["db"].name
+    return sys.intern(table_name)
 
-    if "catalog" in table_expression.args.keys() and table_expression.args["catalog"] is not None:
-        database_name = table_expression.args["catalog"].name
+def prepare_source_sql(sql:str,dialect:Optional[str])->str:
 
-    return internal_add_surfix(database_name,".","") + internal_add_surfix(schema_name,".","") + table_name
+    # the bracket is the quoted identifier in tsql
+
+    if dialect=="tsql":
+        return sql
+
+    return clean_sql(sql=sql)
+
+def get_source_sql_queries(static_pipelines:Dict[str,StaticPipeline],\
+                           runtime_contexts:Dict[str,PipelineRuntimeContext])->List[Tuple[str,Optional[str]]]:
+    """
+    Get (sql,dialect) of the query source of the copy activities which resolve_source_table will parse
+    """
+
+    queries:List[Tuple[str,Optional[str]]] = list()
+
+    for pipeline_name,runtime_context in runtime_contexts.items():
+
+        static_pipeline = static_pipelines.get(pipeline_name)
+
+        if static_pipeline is None:
+            continue
+
+        for edge in static_pipeline.virtual_graph:
+
+            activity = static_pipeline.activities[edge.node_name]
+
+            if activity.activity_type!=ActivityType.Copy or\
+                activity.input_dataset is None or\
+                not isinstance(activity.input_dataset.info,QueryDataset):
+                continue
+
+            input_source_obj = runtime_context.activity_source_inputs.get(activity.name)
+
+            if input_source_obj is None:
+                continue
+
+            dataset_type = activity.input_dataset.info.type
+
+            dialect = get_sql_dialect(dataset_type=dataset_type)
+
+            try:
+                sql = get_sql_script(input_source_obj=input_source_obj,\
+                                     dataset_type=dataset_type)
+
+                if sql is None:
+                    continue
+
+                queries.append((prepare_source_sql(sql=sql,dialect=dialect),dialect))
+            except Exception:
+                continue
+
+    return queries
 
 def resolve_source_table(activity:GenericActivity,\
                          runtime:PipelineRuntimeContext,\
-                         linked_services:List[LinkedService],\
+                         catalog:MetadataCatalog,\
                          is_use_fqn:bool,\
                          synapse_workspace_name:Optional[str],\
-                         logger:Optional[Logger])->Set[str]:
+                         logger:Optional[Logger],\
+                         sql_lineage_cache:Optional[SqlLineageCache]=None,\
+                         sql_parse_budget:Optional[SqlParseBudget]=None)->Set[str]:
     
     input_dataset = activity.input_dataset
 
@@ -183,9 +774,14 @@ def resolve_source_table(activity:GenericActivity,\
         sql = get_sql_script(input_source_obj=input_source_obj,\
                                      dataset_type=input_dataset_info.type)
          
+        dialect = get_sql_dialect(dataset_type=input_dataset_info.type)
+
         #ignore when we cannot parse the sql 
         try:
-            source_tables = get_sql_lineage(sql=clean_sql(sql=sql))
+            source_tables = get_sql_lineage(sql=prepare_source_sql(sql=sql,dialect=dialect),\
+                                            dialect=dialect,\
+                                            cache=sql_lineage_cache,\
+                                            budget=sql_parse_budget)
         except Exception:
 
             if logger is not None:
@@ -240,8 +836,7 @@ def resolve_source_table(activity:GenericActivity,\
 
             if input_dataset.linked_service_name is not None:
 
-                linked_service = find_linked_service(linked_services=linked_services,\
-                                                    search_linked_service_name=input_dataset.linked_service_name)
+                linked_service = catalog.find_linked_service(linked_service_name=input_dataset.linked_service_name)
 
                 if linked_service is not None:
                     source_host_prefix = get_linked_service_host_prefix(linked_service=linked_service)
@@ -260,7 +855,7 @@ def resolve_source_table(activity:GenericActivity,\
 
 def resolve_target_table(activity:GenericActivity,\
                          runtime:PipelineRuntimeContext,\
-                         linked_services:List[LinkedService],\
+                         catalog:MetadataCatalog,\
                          is_use_fqn:bool,\
                          synapse_workspace_name:Optional[str],\
                          logger:Optional[Logger])->Optional[str]:
@@ -339,8 +934,7 @@ def resolve_target_table(activity:GenericActivity,\
 
             if output_dataset.linked_service_name is not None:
 
-                linked_service = find_linked_service(linked_services=linked_services,\
-                                                    search_linked_service_name=output_dataset.linked_service_name)
+                linked_service = catalog.find_linked_service(linked_service_name=output_dataset.linked_service_name)
                            
                 if linked_service is not None:
                     target_host_prefix = get_linked_service_host_prefix(linked_service=linked_service)
@@ -372,18 +966,23 @@ def add_source_host_prefix(table_value:str,host_prefix:str)->str:
 
     transform_table_value = f"{host_prefix}.{transform_table_value}"
 
-    return transform_table_value
+    return intern_node_name(node_name=transform_table_value)
 
 
+@instrument()
 def get_pipeline_table_lineage(static_pipeline:StaticPipeline,\
                                 runtime_context:PipelineRuntimeContext,\
-                                linked_services:List[LinkedService],\
+                                catalog:MetadataCatalog,\
                                 is_use_fqn:bool,\
                                 plugins:List[LineagePluginWrapper],\
                                 synapse_workspace_name:Optional[str],\
-                                logger:Optional[Logger])->Tuple[List[ActivityLineageContext],Set[LineageActivityInfo]]:
+                                logger:Optional[Logger],\
+                                sql_lineage_cache:Optional[SqlLineageCache]=None,\
+                                sql_parse_budget:Optional[SqlParseBudget]=None)->Tuple[List[ActivityLineageContext],Set[LineageActivityInfo]]:
     """
     Return lineage of each activity in the pipeline , and activity it have skip
+    sql_lineage_cache : cache of the parsed source sql shared by the pipelines
+    sql_parse_budget : size and time limit of parsing the source sql
     """
     result:List[ActivityLineageContext] = list()
 
@@ -434,8 +1033,7 @@ def get_pipeline_table_lineage(static_pipeline:StaticPipeline,\
                 database_conection = None
 
                 if linked_service_name is not None:
-                    linked_service = find_linked_service(linked_services=linked_services,
-                                        search_linked_service_name=linked_service_name)
+                    linked_service = catalog.find_linked_service(linked_service_name=linked_service_name)
 
                 if linked_service is not None and\
                     not is_sql_pool:   
@@ -475,15 +1073,18 @@ def get_pipeline_table_lineage(static_pipeline:StaticPipeline,\
 
                 if not is_skippped:
 
+                    plugin_lineage_accumulator = LineageAccumulator()
+
                     for plugin_lineage in plugin_lineages:
 
                         source_tables = plugin_lineage[0]
 
                         target_table = plugin_lineage[1]
 
-                        lineage = add_lineage(initial_lineage=lineage,\
-                                          sources=source_tables,\
-                                          target=target_table)
+                        plugin_lineage_accumulator.add(sources=source_tables,\
+                                                       target=target_table)
+                        
+                    lineage = plugin_lineage_accumulator.to_edges()
                         
                     result.append(ActivityLineageContext(
                         pipeline_name=runtime_context.pipeline_name,\
@@ -527,14 +1128,16 @@ def get_pipeline_table_lineage(static_pipeline:StaticPipeline,\
             
             source_tables = resolve_source_table(activity=generic_activity,\
                                                 runtime=runtime_context,\
-                                                linked_services=linked_services,\
+                                                catalog=catalog,\
                                                 is_use_fqn=is_use_fqn,\
                                                 synapse_workspace_name=synapse_workspace_name,\
-                                                logger=logger)
+                                                logger=logger,\
+                                                sql_lineage_cache=sql_lineage_cache,\
+                                                sql_parse_budget=sql_parse_budget)
             
             target_table = resolve_target_table(activity=generic_activity,\
                                                 runtime=runtime_context,\
-                                                linked_services=linked_services,\
+                                                catalog=catalog,\
                                                 is_use_fqn=is_use_fqn,\
                                                 synapse_workspace_name=synapse_workspace_name,\
                                                 logger=logger)
@@ -548,8 +1151,10 @@ def get_pipeline_table_lineage(static_pipeline:StaticPipeline,\
             
             if not is_skippped:
 
+                # sorted so that the order of the sources does not depend on the order of the set
+
                 lineage = add_lineage(initial_lineage=lineage,\
-                                      sources=source_tables,\
+                                      sources=sorted(source_tables),\
                                         target=target_table)
                             
                 result.append(ActivityLineageContext(
@@ -4,7 +4,13 @@ from typing import (
     Set,
     Any
 )
-from lineage import get_pipeline_table_lineage
+from lineage import (
+    get_pipeline_table_lineage,
+    get_source_sql_queries,
+    parse_sql_lineage_in_processes,
+    SqlLineageCache,
+    SqlLineageStore
+)
 from graph import (
     Edge,
     merge_edges
@@ -13,12 +19,14 @@ from model import (
     PipelineLineage,
     PipelineRuntimeContext,
     StaticPipeline,
-    LineageActivityInfo
+    LineageActivityInfo,
+    APIPipelineRun,
+    SqlParseBudget
 )
 from client import (
     get_datasets,
     get_linked_service,
-    get_runtime_context
+    get_runtime_contexts
 )
 from config import (
     get_api_client,
@@ -27,24 +35,72 @@ from config import (
     PLUGIN_FOLDER_PATH,
     OPENLINEAGE_OUTPUT_FILE_PATH,
     OPENLINEAGE_PRODUCER,
+    OPENLINEAGE_OUTPUT_FORMAT,
+    IS_COMPACT_JSON,
+    IS_SORTED_LINEAGE,
+    LINEAGE_OUTPUT_FORMAT,
     IS_USE_FQN,
     LINEAGE_OUTPUT_FILE_PATH,
     IS_DEBUG,
     DATA_FACTORY_OR_SYNAPSE_WORKSPACE_NAME,
-    IS_AZURE_DATA_FACTORY
+    IS_AZURE_DATA_FACTORY,
+    FETCH_CONCURRENCY,
+    IS_ASYNC_CLIENT,
+    IS_INCREMENTAL,
+    INCREMENTAL_STATE_FILE_PATH,
+    RATE_LIMITER,
+    STATIC_PIPELINE_CACHE_FILE_PATH,
+    SQL_PARSE_CACHE_SIZE,
+    SQL_PARSE_MAX_LENGTH,
+    SQL_PARSE_TIMEOUT_SECONDS,
+    SQL_PARSE_PROCESS_COUNT,
+    IS_SQL_LINEAGE_STORE,
+    SQL_LINEAGE_STORE_FILE_PATH,
+    IS_INSTRUMENTATION,
+    RUN_REPORT_FILE_PATH,
+    PROMETHEUS_TEXTFILE_PATH,
+    get_async_api_client,
+    get_static_pipeline_cache
 )
 import json
+import asyncio
 from pathlib import Path
 import logging
 import sys
-from dataclasses import asdict
 from core import get_static_pipeline
+from search import MetadataCatalog
 from util import (
     to_pipeline_lineage_context,
     to_open_lineage,
     get_activity_lineage_infos
 )
 from formatter import LogFormatter
+from state import (
+    load_state,
+    save_state,
+    get_state_time_from,
+    get_changed_pipeline_runs,
+    update_state,
+    load_lineage,
+    merge_pipeline_lineage
+)
+from datetime import (
+    datetime,
+    timezone
+)
+from aioclient import gather_runtime_contexts
+from writer import OpenLineageWriter
+from instrument import (
+    INSTRUMENTATION,
+    write_run_report,
+    write_prometheus_textfile
+)
+from serializer import (
+    dump,
+    to_dictionary_lineage,
+    DEFAULT_BACKEND,
+    LINEAGE_DICTIONARY_FORMAT
+)
 from plugin import (
     PipelineLineageContext,
     ActivityLineageContext
@@ -56,7 +112,6 @@ from pluginhelper import (
     get_writer_plugins,
     resolve_writer_plugins,
 )
-from search import find_latest_pipeline_info
 
 logging.getLogger("azure.mgmt.datafactory").setLevel(logging.ERROR)
 logging.getLogger("azure.synapse.artifacts").setLevel(logging.ERROR)
@@ -81,10 +136,27 @@ def get_logger()->logging.Logger:
 
     return logger
 
+async def get_async_runtime_contexts(pipeline_runs:Dict[str,List[APIPipelineRun]],\
+                                     concurrency:int)->Dict[str,PipelineRuntimeContext]:
+    """
+    Get the runtime contexts using the asynchronous client
+    """
+    
+    async with get_async_api_client() as client:
+
+        return await gather_runtime_contexts(client=client,\
+                                             pipeline_runs=pipeline_runs,\
+                                             concurrency=concurrency)
+
 def main()->int:
 
     logger = get_logger()
 
+    if IS_INSTRUMENTATION:
+        INSTRUMENTATION.enable()
+
+    INSTRUMENTATION.start_stage(name="load_plugins")
+
     logger.info("Loading plugins:")
 
     raw_plugins = load_plugins(logger=logger,\
@@ -101,6 +173,8 @@ def main()->int:
 
     client = get_api_client()
 
+    INSTRUMENTATION.start_stage(name="extract_datasets")
+
     logger.info("Extracting datasets:")
 
     datasets = get_datasets(client=client)
@@ -110,6 +184,9 @@ def main()->int:
         return 1 
     else:
         logger.info("Extracting datasets:success")
+
+    INSTRUMENTATION.start_stage(name="extract_linked_services")
+
     logger.info("Extracting linked service:")
 
     linked_services = get_linked_service(client=client)
@@ -120,6 +197,8 @@ def main()->int:
     else:
         logger.info("Extracting linked service:success")
     
+    INSTRUMENTATION.start_stage(name="extract_pipelines")
+
     logger.info("Extracting pipeline:")
 
     raw_pipelines = client.get_pipelines()
@@ -130,35 +209,104 @@ def main()->int:
     else:
         logger.info("Extracting pipeline:success")
 
+    INSTRUMENTATION.start_stage(name="compile_pipelines")
+
     logger.info("Extracting lineage:")
 
+    catalog = MetadataCatalog(datasets=datasets,\
+                              linked_services=linked_services)
+
     static_pipelines:Dict[str,StaticPipeline] = dict()
 
+    static_pipeline_cache = get_static_pipeline_cache()
+
     for pipeline in raw_pipelines:
 
         static_pipeline = get_static_pipeline(pipeline=pipeline,\
-                                              datasets=datasets)    
+                                              catalog=catalog,\
+                                              static_pipeline_cache=static_pipeline_cache)    
         
         if len(static_pipeline.activities)==0:
             continue
 
         static_pipelines[pipeline.name] = static_pipeline
 
+    if static_pipeline_cache is not None:
 
-    runtime_contexts:Dict[str,PipelineRuntimeContext] = dict()
+        logger.info(f"Compiled pipeline cache hit:{static_pipeline_cache.hit_count} "
+                    f"miss:{static_pipeline_cache.miss_count}")
+
+        try:
+            static_pipeline_cache.save(pipeline_names={x.name for x in raw_pipelines})
+        except Exception:
+            logger.warning(f"Saving compiled pipeline cache to {STATIC_PIPELINE_CACHE_FILE_PATH}:fail")
+
+
+    INSTRUMENTATION.start_stage(name="extract_pipeline_runs")
+
+    state = None
+
+    previous_lineage = None
 
-    for pipeline_name in static_pipelines:
+    if IS_INCREMENTAL:
 
-        latest_pipeline_info = find_latest_pipeline_info(pipeline_runs=client.get_pipeline_runs(pipeline_name=pipeline_name,\
-                                                                        days=DAYS_SEARCH))
+        state = load_state(file_path=INCREMENTAL_STATE_FILE_PATH)
+
+        previous_lineage = load_lineage(file_path=LINEAGE_OUTPUT_FILE_PATH)
+
+        # without the previous lineage to merge into , all the pipelines need to be processed again
+
+        if state is None or previous_lineage is None:
+            logger.info("No previous state:extracting all the pipelines")
+            state = None
+            previous_lineage = None
+
+    watermark = datetime.now(timezone.utc)
+
+    time_from = None
+
+    if state is not None:
+        time_from = get_state_time_from(state=state)
+
+    pipeline_runs = client.get_bulk_pipeline_runs(pipeline_names=list(static_pipelines.keys()),\
+                                                  days=DAYS_SEARCH,\
+                                                  time_from=time_from)
+    
+    if pipeline_runs is None:
+        logger.info("Extracting pipeline run:fail")
+        return 1
+
+    static_pipeline_runs:Dict[str,List[APIPipelineRun]] = {
+        pipeline_name:pipeline_runs.get(pipeline_name,list())
+        for pipeline_name in static_pipelines
+    }
+
+    if state is not None:
+
+        static_pipeline_runs = get_changed_pipeline_runs(state=state,\
+                                                         pipeline_runs=static_pipeline_runs)
         
-        if latest_pipeline_info is None:
-            continue
+        logger.info(f"Changed pipelines:{len(static_pipeline_runs)}/{len(static_pipelines)}")
+
+    INSTRUMENTATION.start_stage(name="extract_runtime_contexts")
 
-        runtime_context = get_runtime_context(client=client,\
-                                              pipeline_run=latest_pipeline_info)           
-        runtime_contexts[runtime_context.pipeline_name] = runtime_context
+    runtime_contexts:Dict[str,PipelineRuntimeContext] = dict()
+
+    if IS_ASYNC_CLIENT:
+        runtime_contexts = asyncio.run(get_async_runtime_contexts(pipeline_runs=static_pipeline_runs,\
+                                                                  concurrency=FETCH_CONCURRENCY))
+    else:
+        runtime_contexts = get_runtime_contexts(client=client,\
+                                                pipeline_runs=static_pipeline_runs,\
+                                                concurrency=FETCH_CONCURRENCY)
     
+    throttle_stats = RATE_LIMITER.get_stats()
+
+    logger.info(f"API requests:{throttle_stats.request_count} "
+                f"throttled:{throttle_stats.throttled_count} "
+                f"retried:{throttle_stats.retry_count} "
+                f"waited:{throttle_stats.wait_seconds:.1f}s")
+
     pipeline_lineage:List[PipelineLineage] = list()
 
     pipeline_lineage_contexts:List[PipelineLineageContext] = list()
@@ -172,68 +320,147 @@ def main()->int:
     if not IS_AZURE_DATA_FACTORY:
         synapse_workspace_name = DATA_FACTORY_OR_SYNAPSE_WORKSPACE_NAME
 
-    for pipeline_name in runtime_contexts:
+    sql_lineage_store = None
+
+    if IS_SQL_LINEAGE_STORE:
+
+        try:
+            sql_lineage_store = SqlLineageStore(file_path=SQL_LINEAGE_STORE_FILE_PATH)
+        except Exception:
+            logger.warning(f"Opening sql lineage store {SQL_LINEAGE_STORE_FILE_PATH}:fail")
+
+    sql_lineage_cache = SqlLineageCache(max_size=SQL_PARSE_CACHE_SIZE,\
+                                        store=sql_lineage_store)
+
+    sql_parse_budget = SqlParseBudget(max_length=SQL_PARSE_MAX_LENGTH,\
+                                      timeout_seconds=SQL_PARSE_TIMEOUT_SECONDS)
+
+    if SQL_PARSE_PROCESS_COUNT>0:
+
+        INSTRUMENTATION.start_stage(name="parse_sql")
+
+        # when it fail , the source sql is parsed one by one while extracting the lineage
+
+        try:
+            parsed_count = parse_sql_lineage_in_processes(queries=get_source_sql_queries(static_pipelines=static_pipelines,\
+                                                                                         runtime_contexts=runtime_contexts),\
+                                                          cache=sql_lineage_cache,\
+                                                          process_count=SQL_PARSE_PROCESS_COUNT,\
+                                                          budget=sql_parse_budget)
+
+            logger.info(f"Parsing {parsed_count} source sql in {SQL_PARSE_PROCESS_COUNT} processes:success")
+        except Exception:
+            logger.warning(f"Parsing source sql in {SQL_PARSE_PROCESS_COUNT} processes:fail")
+
+    INSTRUMENTATION.start_stage(name="extract_lineage")
+
+    # the openlineage events are written as soon as the lineage of each pipeline is found
+
+    try:
+        openlineage_writer = OpenLineageWriter(file_path=OPENLINEAGE_OUTPUT_FILE_PATH,\
+                                               output_format=OPENLINEAGE_OUTPUT_FORMAT)
+    except:
+        logger.info(f"Saving lineage (openlineage) to {OPENLINEAGE_OUTPUT_FILE_PATH}:fail")
+        return 1
+
+    try:
+
+        for pipeline_name in runtime_contexts:
         
-        activity_lineage,lineage_activities = get_pipeline_table_lineage(static_pipeline=static_pipelines[pipeline_name],\
-                                              runtime_context=runtime_contexts[pipeline_name],\
-                                              linked_services=linked_services,\
-                                              is_use_fqn=IS_USE_FQN,\
-                                              plugins=activity_plugins,\
-                                              synapse_workspace_name=synapse_workspace_name,\
-                                              logger=logger)
+            activity_lineage,lineage_activities = get_pipeline_table_lineage(static_pipeline=static_pipelines[pipeline_name],\
+                                                  runtime_context=runtime_contexts[pipeline_name],\
+                                                  catalog=catalog,\
+                                                  is_use_fqn=IS_USE_FQN,\
+                                                  plugins=activity_plugins,\
+                                                  synapse_workspace_name=synapse_workspace_name,\
+                                                  logger=logger,\
+                                                  sql_lineage_cache=sql_lineage_cache,\
+                                                  sql_parse_budget=sql_parse_budget)
         
-        lineage_activity_infos = lineage_activity_infos.union(lineage_activities)
+            lineage_activity_infos = lineage_activity_infos.union(lineage_activities)
         
-        edges:List[List[Edge]] = [x.lineage for x in activity_lineage]
+            edges:List[List[Edge]] = [x.lineage for x in activity_lineage]
         
-        pipeline_lineage.append(PipelineLineage(
-                            pipeline_name=pipeline_name,\
-                            lineage=merge_edges(edges))
-                            )
+            pipeline_lineage.append(PipelineLineage(
+                                pipeline_name=pipeline_name,\
+                                lineage=merge_edges(graphs=edges,is_sorted=IS_SORTED_LINEAGE))
+                                )
+
+            try:
+                (start_event,complete_event) = to_open_lineage(namespace=OPENLINEAGE_NAMESPACE,producer=OPENLINEAGE_PRODUCER,pipeline_lineage=pipeline_lineage[-1])
+
+                openlineage_writer.write(event=start_event)
+                openlineage_writer.write(event=complete_event)
+            except:
+                openlineage_writer.abort()
+                logger.info(f"Saving lineage (openlineage) to {OPENLINEAGE_OUTPUT_FILE_PATH}:fail")
+                return 1
         
-        pipeline_lineage_context = to_pipeline_lineage_context(activity_lineage_context=activity_lineage)
+            pipeline_lineage_context = to_pipeline_lineage_context(activity_lineage_context=activity_lineage)
 
-        if pipeline_lineage_context is None:
+            if pipeline_lineage_context is None:
 
-            current_pipeline_context = runtime_contexts[pipeline_name]
+                current_pipeline_context = runtime_contexts[pipeline_name]
 
-            pipeline_lineage_context = PipelineLineageContext(
-                pipeline_name=pipeline_name,\
-                pipeline_run_id=current_pipeline_context.run_id,\
-                pipeline_run_status=current_pipeline_context.pipeline_run_status,\
-                pipeline_run_start=current_pipeline_context.run_start,\
-                pipeline_run_end=current_pipeline_context.run_end,\
-                lineage=list()
-            )
+                pipeline_lineage_context = PipelineLineageContext(
+                    pipeline_name=pipeline_name,\
+                    pipeline_run_id=current_pipeline_context.run_id,\
+                    pipeline_run_status=current_pipeline_context.pipeline_run_status,\
+                    pipeline_run_start=current_pipeline_context.run_start,\
+                    pipeline_run_end=current_pipeline_context.run_end,\
+                    lineage=list()
+                )
                 
-        pipeline_lineage_contexts.append(pipeline_lineage_context)
+            pipeline_lineage_contexts.append(pipeline_lineage_context)
+
+            activity_lineage_contexts.extend(activity_lineage)
 
-        activity_lineage_contexts.extend(activity_lineage)
+    except BaseException:
+        # do not leave the temporary file when the lineage of the pipeline cannot be extracted
+        openlineage_writer.abort()
+        raise
 
     logger.info("Extracting lineage:success")
 
-    logger.info(f"Lineage found:{len(pipeline_lineage)}")
+    INSTRUMENTATION.start_stage(name="write_lineage")
 
-    openlineage:List[Dict[str,Any]] = list()
+    if sql_lineage_store is not None:
 
-    try:
-        for x in pipeline_lineage:
+        try:
+            sql_lineage_store.close()
+        except Exception:
+            logger.warning(f"Saving sql lineage store {SQL_LINEAGE_STORE_FILE_PATH}:fail")
+
+    sql_parse_stats = sql_lineage_cache.get_stats()
 
-            (start_event,complete_event) = to_open_lineage(namespace=OPENLINEAGE_NAMESPACE,producer=OPENLINEAGE_PRODUCER,pipeline_lineage=x)
+    logger.info(f"SQL parse cache hit:{sql_parse_stats.hit_count} "
+                f"stored:{sql_parse_stats.store_hit_count} "
+                f"miss:{sql_parse_stats.miss_count} "
+                f"evicted:{sql_parse_stats.eviction_count} "
+                f"failed:{sql_parse_stats.failed_count}")
 
-            openlineage.append(start_event)
-            openlineage.append(complete_event)
+    for dialect,dialect_stats in sql_parse_stats.dialect_stats.items():
 
-        output_file_path = Path(OPENLINEAGE_OUTPUT_FILE_PATH)
-        output_file_path.parent.mkdir(parents=True,exist_ok=True)
+        logger.info(f"SQL parse dialect:{dialect} "
+                    f"parsed:{dialect_stats.parse_count} "
+                    f"fallback:{dialect_stats.fallback_count} "
+                    f"seconds:{dialect_stats.parse_seconds:.2f} "
+                    f"max seconds:{dialect_stats.max_parse_seconds:.2f}")
 
+    logger.info(f"Lineage found:{len(pipeline_lineage)}")
 
-        with output_file_path.open("w") as file:
-            json.dump(openlineage,file,indent=4)
+    logger.info(f"Writing json with {DEFAULT_BACKEND}")
+
+    try:
+        openlineage_writer.close()
+
+        INSTRUMENTATION.add_byte_count(name="write.openlineage",\
+                                       byte_count=Path(OPENLINEAGE_OUTPUT_FILE_PATH).stat().st_size)
 
         logger.info(f"Saving lineage (openlineage) to {OPENLINEAGE_OUTPUT_FILE_PATH}:success")
 
     except:
+        openlineage_writer.abort()
         logger.info(f"Saving lineage (openlineage) to {OPENLINEAGE_OUTPUT_FILE_PATH}:fail")
         return 1
     
@@ -241,8 +468,21 @@ def main()->int:
 
         Path(LINEAGE_OUTPUT_FILE_PATH).parent.mkdir(parents=True,exist_ok=True)
 
-        with open(LINEAGE_OUTPUT_FILE_PATH,"w") as file:
-            json.dump([asdict(lineage) for lineage in pipeline_lineage],file,indent=4)
+        output_lineage:Any = pipeline_lineage
+
+        if previous_lineage is not None:
+            output_lineage = merge_pipeline_lineage(previous_lineage=previous_lineage,\
+                                                    pipeline_lineage=pipeline_lineage,\
+                                                    pipeline_names=set(static_pipelines.keys()))
+
+        if LINEAGE_OUTPUT_FORMAT==LINEAGE_DICTIONARY_FORMAT:
+            output_lineage = to_dictionary_lineage(pipeline_lineage=output_lineage)
+
+        with open(LINEAGE_OUTPUT_FILE_PATH,"wb") as file:
+            dump(value=output_lineage,file=file,is_compact=IS_COMPACT_JSON)
+
+            INSTRUMENTATION.add_byte_count(name="write.lineage",\
+                                           byte_count=file.tell())
 
         logger.info(f"Saving lineage to {LINEAGE_OUTPUT_FILE_PATH}:success")
     
@@ -250,8 +490,27 @@ def main()->int:
         logger.info(f"Saving lineage to {LINEAGE_OUTPUT_FILE_PATH}:fail")
         return 1
     
+    if IS_INCREMENTAL:
+
+        INSTRUMENTATION.start_stage(name="save_state")
+
+        try:
+            save_state(file_path=INCREMENTAL_STATE_FILE_PATH,\
+                       state=update_state(state=state,\
+                                          watermark=watermark,\
+                                          runtime_contexts=runtime_contexts,\
+                                          pipeline_names=set(static_pipelines.keys())))
+            
+            logger.info(f"Saving state to {INCREMENTAL_STATE_FILE_PATH}:success")
+
+        except:
+            logger.info(f"Saving state to {INCREMENTAL_STATE_FILE_PATH}:fail")
+            return 1
+    
     if len(writer_plugins)>0:
 
+        INSTRUMENTATION.start_stage(name="write_plugins")
+
         if not resolve_writer_plugins(plugins=writer_plugins,\
                                context=pipeline_lineage_contexts):
             logger.warning("Some plugins fail to write lineage")
@@ -264,7 +523,9 @@ def main()->int:
 
         raw_pipeline_names = {x.name for x in raw_pipelines}
 
-        static_pipeline_names = {key for key in runtime_contexts}
+        # runtime_contexts only has the changed pipelines in the incremental extraction
+
+        static_pipeline_names = set(static_pipelines.keys())
 
         activity_lineage_infos = get_activity_lineage_infos(raw_pipeline_names=raw_pipeline_names,\
                         static_pipeline_names=static_pipeline_names,\
@@ -277,5 +538,41 @@ def main()->int:
 
     return 0
 
+def save_run_report(exit_code:int)->None:
+    """
+    Write the timers and the counters of the run when the instrumentation is enabled
+    """
+
+    if not INSTRUMENTATION.is_enabled:
+        return
+
+    logger = logging.getLogger("azure-lineage")
+
+    report = INSTRUMENTATION.get_report(exit_code=exit_code)
+
+    try:
+        write_run_report(file_path=RUN_REPORT_FILE_PATH,report=report)
+        logger.info(f"Saving run report to {RUN_REPORT_FILE_PATH}:success")
+    except Exception:
+        logger.warning(f"Saving run report to {RUN_REPORT_FILE_PATH}:fail")
+
+    if PROMETHEUS_TEXTFILE_PATH=="":
+        return
+
+    try:
+        write_prometheus_textfile(file_path=PROMETHEUS_TEXTFILE_PATH,report=report)
+        logger.info(f"Saving prometheus textfile to {PROMETHEUS_TEXTFILE_PATH}:success")
+    except Exception:
+        logger.warning(f"Saving prometheus textfile to {PROMETHEUS_TEXTFILE_PATH}:fail")
+
 if __name__=="__main__":
-    sys.exit(main())
\ No newline at end of file
+
+    # main can raise , the report of the failed run is still written
+    exit_code = 1
+
+    try:
+        exit_code = main()
+    finally:
+        save_run_report(exit_code=exit_code)
+
+    sys.exit(exit_code)
\ No newline at end of file
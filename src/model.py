@@ -102,6 +102,79 @@ class PipelineLineage:
     lineage:List[Edge]
 
 
+@dataclass
+class PipelineRunState:
+    run_id:str
+    run_end:Optional[datetime]
+
+@dataclass
+class ExtractionState:
+    # pipeline runs updated after this time are not processed yet
+    watermark:datetime
+    # last processed run of each pipeline
+    pipeline_runs:Dict[str,PipelineRunState]
+
+@dataclass
+class SqlDialectStats:
+    # number of sql parsed
+    parse_count:int = 0
+    # number of sql which exceed the parse budget and are scanned for the tables instead
+    fallback_count:int = 0
+    # total time spent on parsing (including the parsing which exceed the budget)
+    parse_seconds:float = 0
+    # longest time spent on parsing a sql
+    max_parse_seconds:float = 0
+
+@dataclass
+class SqlParseCacheStats:
+    # number of sql found in the cache
+    hit_count:int
+    # number of sql found in the persistent store
+    store_hit_count:int
+    # number of sql which need to be parsed
+    miss_count:int
+    # number of sql removed from the cache when it is full
+    eviction_count:int
+    # number of sql in the cache which cannot be parsed
+    failed_count:int
+    # number of sql in the cache
+    size:int
+    # dialect ("default" when there is no dialect) -> parse statistics of the dialect
+    dialect_stats:Dict[str,SqlDialectStats] = field(default_factory=dict)
+
+@dataclass
+class SqlParseBudget:
+    # sql longer than it is not parsed. No limit if it is 0
+    max_length:int = 0
+    # parsing is stopped after it. No limit if it is 0
+    timeout_seconds:float = 0
+
+@dataclass
+class CallStats:
+    # number of calls (or http requests)
+    call_count:int = 0
+    # number of calls which raise or return the failed result
+    error_count:int = 0
+    # bytes received or written by the calls
+    byte_count:int = 0
+    # total seconds of the calls
+    seconds:float = 0
+    # seconds of the slowest call
+    max_seconds:float = 0
+
+@dataclass
+class ThrottleStats:
+    # number of requests sent to the api (including retry)
+    request_count:int
+    # number of requests which is throttled by the api
+    throttled_count:int
+    # number of requests which is retried after being throttled
+    retry_count:int
+    # total seconds waited for the rate limit and the throttling
+    wait_seconds:float
+    # current requests per second allowed by the rate limiter
+    requests_per_second:float
+
 @dataclass
 class APIDatasetResource:
     dataset_name:str
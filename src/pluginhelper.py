@@ -40,6 +40,7 @@ from abc import ABC
 import sys
 from types import ModuleType
 from core import resolve_parameter
+from instrument import instrument
 from util import (
     has_field,
     create_parameter
@@ -227,6 +228,7 @@ def get_activity_plugins(plugins:List[BasePluginWrapper])->List[LineagePluginWra
 def get_writer_plugins(plugins:List[BasePluginWrapper])->List[LineageWriterPluginWrapper]:
     return [x for x in plugins if isinstance(x,LineageWriterPluginWrapper)]
 
+@instrument()
 def resolve_activity_plugins(plugins:List[LineagePluginWrapper],\
                     context:PluginContext,\
                     connection:Optional[LinkedServiceConnection])->Optional[PluginLineage]:
@@ -241,6 +243,7 @@ def resolve_activity_plugins(plugins:List[LineagePluginWrapper],\
         
     return None
 
+@instrument(failed_result=False)
 def resolve_writer_plugins(plugins:List[LineageWriterPluginWrapper],\
                            context:LineageContext)->bool:
 
@@ -0,0 +1,448 @@
+from azure.mgmt.datafactory.models import (
+    DatasetResource,
+    LinkedServiceResource,
+    PipelineResource,
+    PipelineRun,
+    ActivityRun,
+    RunFilterParameters
+)
+from azure.core.exceptions import DeserializationError
+from typing import (
+    List,
+    Optional,
+    Dict,
+    Any,
+    Iterator
+)
+from model import (
+    APIDatasetResource,
+    APITriggerResource,
+    APIPipelineResource,
+    APIPipelineRun,
+    APIActivityRun,
+    APILinkedServiceResource
+)
+from datetime import datetime
+from pathlib import Path
+from munch import Munch
+from client import (
+    AzureClient,
+    RateLimiter
+)
+from apiutil import (
+    to_api_dataset_resource,
+    to_api_linked_service_resource,
+    to_api_raw_linked_service_resource,
+    to_api_pipeline_resource,
+    to_api_pipeline_run,
+    to_api_activity_run
+)
+from aioclient import AsyncAzureClient
+from search import (
+    group_pipeline_runs,
+    find_latest_pipeline_info
+)
+import json
+import os
+import sys
+
+# files of the snapshot. Each file is the raw rest json which the api respond with
+# so that the snapshot is deserialized with the sdk models like the respond of the live client
+
+DATASET_SNAPSHOT = "datasets.json"
+
+LINKED_SERVICE_SNAPSHOT = "linkedservices.json"
+
+PIPELINE_SNAPSHOT = "pipelines.json"
+
+TRIGGER_SNAPSHOT = "triggers.json"
+
+PIPELINE_RUN_SNAPSHOT = "pipelineruns.json"
+
+# pipeline run id -> activity runs of the pipeline run
+ACTIVITY_RUN_SNAPSHOT = "activityruns.json"
+
+def load_snapshot(folder_path:Path,file_name:str,default:Any=None)->Any:
+    """
+    Return the default if the snapshot does not have the file.
+    Raise the exception when the file cannot be read
+    """
+
+    file_path = folder_path.joinpath(file_name)
+
+    if default is not None and not file_path.exists():
+        return default
+
+    with file_path.open("r") as file:
+        return json.load(file)
+
+def save_snapshot(folder_path:Path,file_name:str,value:Any)->None:
+
+    folder_path.mkdir(parents=True,exist_ok=True)
+
+    file_path = folder_path.joinpath(file_name)
+
+    temp_file_path = file_path.with_suffix(".tmp")
+
+    with temp_file_path.open("w") as file:
+        json.dump(value,file)
+
+    os.replace(temp_file_path,file_path)
+
+class ReplayClient:
+    """
+    Client which replay the snapshot of the factory (or workspace) in the folder instead of calling the api.
+    It has the same methods as DataFactoryClient. The time window of the run queries is ignored
+    because the runs of the snapshot are recorded at the fixed time
+    """
+    def __init__(self,folder_path:str):
+
+        self.folder_path = Path(folder_path)
+
+        # the runs are read once. The artifacts are deserialized each time like they are downloaded each time
+
+        self.pipeline_runs:Optional[List[APIPipelineRun]] = None
+
+        self.raw_activity_runs:Optional[Dict[str,List[Dict[str,Any]]]] = None
+
+    def get_datasets(self)->Optional[List[APIDatasetResource]]:
+
+        try:
+            dataset_resources = [DatasetResource.deserialize(x) for x in load_snapshot(folder_path=self.folder_path,\
+                                                                                          file_name=DATASET_SNAPSHOT)]
+
+            return [to_api_dataset_resource(dataset_resource=x) for x in dataset_resources]
+        except Exception:
+            return None
+
+    def get_linked_service(self)->Optional[List[APILinkedServiceResource]]:
+
+        try:
+            linked_services:List[APILinkedServiceResource] = list()
+
+            for raw_linked_service in load_snapshot(folder_path=self.folder_path,\
+                                                    file_name=LINKED_SERVICE_SNAPSHOT):
+
+                try:
+                    linked_services.append(to_api_linked_service_resource(linked_service_resource=LinkedServiceResource.deserialize(raw_linked_service)))
+
+                except DeserializationError:
+
+                    # the same as FallbackDataFactoryClient
+
+                    linked_services.append(to_api_raw_linked_service_resource(raw_linked_service=raw_linked_service))
+
+            return linked_services
+
+        except Exception:
+            return None
+
+    def get_triggers(self)->Optional[List[APITriggerResource]]:
+
+        try:
+            return [
+                APITriggerResource(
+                    trigger_name=raw_trigger["name"],\
+                    trigger_type=raw_trigger["properties"]["type"],\
+                    runtime_state=raw_trigger["properties"].get("runtimeState"),\
+                    pipeline_names=[x["pipelineReference"]["referenceName"] for x in raw_trigger["properties"].get("pipelines",list())]
+                )
+                for raw_trigger in load_snapshot(folder_path=self.folder_path,\
+                                                 file_name=TRIGGER_SNAPSHOT,\
+                                                 default=list())
+            ]
+        except Exception:
+            return None
+
+    def get_pipelines(self)->Optional[List[APIPipelineResource]]:
+
+        try:
+            return [
+                to_api_pipeline_resource(pipeline_resource=PipelineResource.deserialize(x))
+                for x in load_snapshot(folder_path=self.folder_path,\
+                                       file_name=PIPELINE_SNAPSHOT)
+            ]
+        except Exception:
+            return None
+
+    def get_all_pipeline_runs(self)->List[APIPipelineRun]:
+
+        if self.pipeline_runs is None:
+            self.pipeline_runs = [to_api_pipeline_run(pipeline_run=PipelineRun.deserialize(x))
+                                  for x in load_snapshot(folder_path=self.folder_path,\
+                                                         file_name=PIPELINE_RUN_SNAPSHOT,\
+                                                         default=list())]
+
+        return self.pipeline_runs
+
+    def get_pipeline_runs(self,pipeline_name:str,days:int=1)->Optional[List[APIPipelineRun]]:
+
+        if days<1:
+            return None
+
+        try:
+            return [x for x in self.get_all_pipeline_runs() if x.pipeline_name==pipeline_name]
+        except Exception:
+            return None
+
+    def get_bulk_pipeline_runs(self,pipeline_names:List[str],days:int=1,time_from:Optional[datetime]=None)->Optional[Dict[str,List[APIPipelineRun]]]:
+        """
+        time_from : only get the pipeline runs which end after it (incremental extraction)
+        """
+
+        if days<1:
+            return None
+
+        names = set(pipeline_names)
+
+        try:
+            pipeline_runs = [x for x in self.get_all_pipeline_runs() if x.pipeline_name in names]
+
+            if time_from is not None:
+                pipeline_runs = [x for x in pipeline_runs if x.run_end is None or x.run_end>=time_from]
+
+            return group_pipeline_runs(pipeline_runs=pipeline_runs)
+
+        except Exception:
+            return None
+
+    def iter_pipeline_runs(self,filter_params:RunFilterParameters)->Iterator[APIPipelineRun]:
+
+        names = set()
+
+        for run_filter in filter_params.filters or list():
+            if run_filter.operand=="PipelineName":
+                names.update(run_filter.values)
+
+        for pipeline_run in self.get_all_pipeline_runs():
+            if pipeline_run.pipeline_name in names:
+                yield pipeline_run
+
+    def get_activities_run(self,pipeline_run:APIPipelineRun)->Optional[List[APIActivityRun]]:
+
+        try:
+            return list(self.iter_activities_run(pipeline_run=pipeline_run))
+        except Exception:
+            return None
+
+    def iter_activities_run(self,pipeline_run:APIPipelineRun)->Iterator[APIActivityRun]:
+
+        if self.raw_activity_runs is None:
+            self.raw_activity_runs = load_snapshot(folder_path=self.folder_path,\
+                                                   file_name=ACTIVITY_RUN_SNAPSHOT,\
+                                                   default=dict())
+
+        for raw_activity_run in self.raw_activity_runs.get(pipeline_run.run_id,list()):
+            yield to_api_activity_run(activity_run=ActivityRun.deserialize(raw_activity_run))
+
+class AsyncReplayClient:
+    """
+    Asynchronous ReplayClient. It has the same methods as AsyncDataFactoryClient
+    """
+    def __init__(self,folder_path:str):
+        self.client = ReplayClient(folder_path=folder_path)
+
+    async def close(self)->None:
+        pass
+
+    async def get_datasets(self)->Optional[List[APIDatasetResource]]:
+        return self.client.get_datasets()
+
+    async def get_linked_service(self)->Optional[List[APILinkedServiceResource]]:
+        return self.client.get_linked_service()
+
+    async def get_pipelines(self)->Optional[List[APIPipelineResource]]:
+        return self.client.get_pipelines()
+
+    async def get_pipeline_runs(self,pipeline_name:str,days:int=1)->Optional[List[APIPipelineRun]]:
+        return self.client.get_pipeline_runs(pipeline_name=pipeline_name,\
+                                             days=days)
+
+    async def get_bulk_pipeline_runs(self,pipeline_names:List[str],days:int=1,time_from:Optional[datetime]=None)->Optional[Dict[str,List[APIPipelineRun]]]:
+        return self.client.get_bulk_pipeline_runs(pipeline_names=pipeline_names,\
+                                                  days=days,\
+                                                  time_from=time_from)
+
+    async def get_activities_run(self,pipeline_run:APIPipelineRun)->Optional[List[APIActivityRun]]:
+        return self.client.get_activities_run(pipeline_run=pipeline_run)
+
+class ReplayAzureClient(AzureClient):
+    """
+    AzureClient which replay the snapshot in the folder. It does not need the credentials
+    """
+    def __init__(self,\
+                 folder_path:str,\
+                 rate_limiter:Optional[RateLimiter]=None):
+
+        # AzureClient.__init__ is not called because it create the credential
+
+        self.resource_group_name = ""
+        self.data_factory_or_workspace = Path(folder_path).name
+
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+
+        self.rate_limiter = rate_limiter
+
+        self.client = ReplayClient(folder_path=folder_path)
+
+class AsyncReplayAzureClient(AsyncAzureClient):
+    """
+    AsyncAzureClient which replay the snapshot in the folder. It does not need the credentials
+    """
+    def __init__(self,\
+                 folder_path:str,\
+                 rate_limiter:Optional[RateLimiter]=None):
+
+        self.resource_group_name = ""
+        self.data_factory_or_workspace = Path(folder_path).name
+
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+
+        self.rate_limiter = rate_limiter
+
+        self.client = AsyncReplayClient(folder_path=folder_path)
+
+    async def close(self)->None:
+        await self.client.close()
+
+def to_raw_model(value:Any)->Any:
+    """
+    Raw rest json of the sdk model (or the munch of the fallback client)
+    """
+
+    if hasattr(value,"serialize"):
+        return value.serialize(keep_readonly=True)
+
+    if isinstance(value,dict):
+        return Munch.toDict(value) if isinstance(value,Munch) else value
+
+    return value
+
+def to_raw_datetime(value:Optional[datetime])->Optional[str]:
+
+    if value is None:
+        return None
+
+    return value.isoformat()
+
+def to_raw_pipeline_run(pipeline_run:APIPipelineRun)->Dict[str,Any]:
+    return {
+        "pipelineName":pipeline_run.pipeline_name,
+        "runId":pipeline_run.run_id,
+        "runStart":to_raw_datetime(pipeline_run.run_start),
+        "runEnd":to_raw_datetime(pipeline_run.run_end),
+        "status":pipeline_run.run_status,
+        "isLatest":pipeline_run.is_latest,
+        "parameters":pipeline_run.parameters
+    }
+
+def to_raw_activity_run(activity_run:APIActivityRun)->Dict[str,Any]:
+    return {
+        "activityName":activity_run.activity_name,
+        "activityType":activity_run.activity_type,
+        "pipelineRunId":activity_run.run_id,
+        "activityRunStart":to_raw_datetime(activity_run.run_start),
+        "activityRunEnd":to_raw_datetime(activity_run.run_end),
+        "status":activity_run.run_status,
+        "input":to_raw_model(activity_run.input)
+    }
+
+def record_snapshot(client:AzureClient,\
+                    folder_path:str,\
+                    days:int=1)->bool:
+    """
+    Save the artifacts and the runs of the last days of the factory (or workspace) as the snapshot which ReplayClient replay.
+    Only the activity runs of the latest run of each pipeline are saved because only they are used for the lineage
+    Return False if some of them cannot be downloaded
+    """
+
+    datasets = client.get_datasets()
+
+    linked_services = client.get_linked_service()
+
+    pipelines = client.get_pipelines()
+
+    triggers = client.get_triggers()
+
+    if datasets is None or linked_services is None or pipelines is None or triggers is None:
+        return False
+
+    pipeline_runs = client.get_bulk_pipeline_runs(pipeline_names=[x.name for x in pipelines],\
+                                                  days=days)
+
+    if pipeline_runs is None:
+        return False
+
+    activity_runs:Dict[str,List[Dict[str,Any]]] = dict()
+
+    for pipeline_name in pipeline_runs:
+
+        latest_pipeline_run = find_latest_pipeline_info(pipeline_runs=pipeline_runs[pipeline_name])
+
+        if latest_pipeline_run is None:
+            continue
+
+        activities_run = client.get_activities_run(pipeline_run=latest_pipeline_run)
+
+        if activities_run is None:
+            return False
+
+        activity_runs[latest_pipeline_run.run_id] = [to_raw_activity_run(activity_run=x) for x in activities_run]
+
+    snapshot_folder_path = Path(folder_path)
+
+    save_snapshot(folder_path=snapshot_folder_path,\
+                  file_name=DATASET_SNAPSHOT,\
+                  value=[{"name":x.dataset_name,"properties":to_raw_model(x.properties)} for x in datasets])
+
+    save_snapshot(folder_path=snapshot_folder_path,\
+                  file_name=LINKED_SERVICE_SNAPSHOT,\
+                  value=[{"name":x.linked_service_name,"properties":to_raw_model(x.properties)} for x in linked_services])
+
+    save_snapshot(folder_path=snapshot_folder_path,\
+                  file_name=PIPELINE_SNAPSHOT,\
+                  value=[{"name":x.name,"properties":{"activities":[to_raw_model(y) for y in x.activities]}} for x in pipelines])
+
+    save_snapshot(folder_path=snapshot_folder_path,\
+                  file_name=TRIGGER_SNAPSHOT,\
+                  value=[{
+                      "name":x.trigger_name,
+                      "properties":{
+                          "type":x.trigger_type,
+                          "runtimeState":x.runtime_state,
+                          "pipelines":[{"pipelineReference":{"referenceName":y,"type":"PipelineReference"}} for y in x.pipeline_names]
+                      }
+                  } for x in triggers])
+
+    save_snapshot(folder_path=snapshot_folder_path,\
+                  file_name=PIPELINE_RUN_SNAPSHOT,\
+                  value=[to_raw_pipeline_run(pipeline_run=y) for x in pipeline_runs.values() for y in x])
+
+    save_snapshot(folder_path=snapshot_folder_path,\
+                  file_name=ACTIVITY_RUN_SNAPSHOT,\
+                  value=activity_runs)
+
+    return True
+
+if __name__=="__main__":
+
+    # python replay.py <snapshot folder> : record the factory (or workspace) of the configuration
+
+    from config import (
+        get_api_client,
+        DAYS_SEARCH
+    )
+
+    if len(sys.argv)!=2:
+        print("usage: python replay.py <snapshot folder>")
+        sys.exit(1)
+
+    if not record_snapshot(client=get_api_client(),\
+                           folder_path=sys.argv[1],\
+                           days=DAYS_SEARCH):
+        print(f"Recording snapshot to {sys.argv[1]}:fail")
+        sys.exit(1)
+
+    print(f"Recording snapshot to {sys.argv[1]}:success")
@@ -1,4 +1,4 @@
-from typing import List,Optional
+from typing import List,Optional,Dict,Iterable
 from model import Dataset,LinkedService,APIPipelineRun
 
 def find_dataset(datasets:List[Dataset],search_dataset_name:str)->Optional[Dataset]:
@@ -19,6 +19,55 @@ def find_linked_service(linked_services:List[LinkedService],search_linked_servic
     
     return None
 
+class MetadataCatalog:
+    """
+    Lookup table of the datasets and linked services by name.
+    The name is first matched exactly and then case-insensitively as the factory/workspace names are case-insensitive
+    """
+    def __init__(self,\
+                 datasets:List[Dataset],\
+                 linked_services:List[LinkedService]):
+        
+        self.datasets = datasets
+
+        self.linked_services = linked_services
+
+        self.dataset_names:Dict[str,Dataset] = dict()
+
+        self.lower_dataset_names:Dict[str,Dataset] = dict()
+
+        # keep the first one when the name is duplicated as find_dataset does
+
+        for dataset in reversed(datasets):
+            self.dataset_names[dataset.name] = dataset
+            self.lower_dataset_names[dataset.name.lower()] = dataset
+
+        self.linked_service_names:Dict[str,LinkedService] = dict()
+
+        self.lower_linked_service_names:Dict[str,LinkedService] = dict()
+
+        for linked_service in reversed(linked_services):
+            self.linked_service_names[linked_service.name] = linked_service
+            self.lower_linked_service_names[linked_service.name.lower()] = linked_service
+
+    def find_dataset(self,dataset_name:str)->Optional[Dataset]:
+
+        dataset = self.dataset_names.get(dataset_name)
+
+        if dataset is None:
+            dataset = self.lower_dataset_names.get(dataset_name.lower())
+
+        return dataset
+    
+    def find_linked_service(self,linked_service_name:str)->Optional[LinkedService]:
+
+        linked_service = self.linked_service_names.get(linked_service_name)
+
+        if linked_service is None:
+            linked_service = self.lower_linked_service_names.get(linked_service_name.lower())
+
+        return linked_service
+
 def find_latest_pipeline_info(pipeline_runs:List[APIPipelineRun])->Optional[APIPipelineRun]:
     """
     Get only the latest pipeline run to get the last run of the pipeline
@@ -28,4 +77,36 @@ def find_latest_pipeline_info(pipeline_runs:List[APIPipelineRun])->Optional[APIP
     if len(pipeline_run)>0:
         return max(pipeline_run,key=lambda x:x.run_start)
         
-    return None
\ No newline at end of file
+    return None
+
+class LatestPipelineRunTracker:
+    """
+    Track the pipelines which do not have the latest run yet while reading the pipeline runs ordered from the latest run start.
+    The first latest run of the pipeline is the one find_latest_pipeline_info return ,
+    so the reader can stop reading the next pages when it is complete
+    """
+    def __init__(self,pipeline_names:Iterable[str]):
+        self.pipeline_names = set(pipeline_names)
+
+    def add(self,pipeline_run:APIPipelineRun)->None:
+        if pipeline_run.is_latest:
+            self.pipeline_names.discard(pipeline_run.pipeline_name)
+
+    def is_complete(self)->bool:
+        return len(self.pipeline_names)==0
+
+def group_pipeline_runs(pipeline_runs:List[APIPipelineRun])->Dict[str,List[APIPipelineRun]]:
+    """
+    Group the pipeline runs by the pipeline name
+    """
+
+    grouped_pipeline_runs:Dict[str,List[APIPipelineRun]] = dict()
+
+    for pipeline_run in pipeline_runs:
+        
+        if pipeline_run.pipeline_name not in grouped_pipeline_runs:
+            grouped_pipeline_runs[pipeline_run.pipeline_name] = list()
+
+        grouped_pipeline_runs[pipeline_run.pipeline_name].append(pipeline_run)
+
+    return grouped_pipeline_runs
@@ -0,0 +1,201 @@
+from typing import (
+    Any,
+    Dict,
+    List,
+    BinaryIO
+)
+from dataclasses import (
+    fields,
+    is_dataclass
+)
+import json
+import io
+
+# the fastest json library which is installed is used.
+# orjson and msgspec encode the dataclass (PipelineLineage,Edge) directly.
+# json is given the fields of the dataclass one level at a time instead of dataclasses.asdict which copy the whole tree
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+ORJSON_BACKEND = "orjson"
+
+MSGSPEC_BACKEND = "msgspec"
+
+JSON_BACKEND = "json"
+
+def get_default_backend()->str:
+
+    if orjson is not None:
+        return ORJSON_BACKEND
+
+    if msgspec is not None:
+        return MSGSPEC_BACKEND
+
+    return JSON_BACKEND
+
+DEFAULT_BACKEND = get_default_backend()
+
+def encode_dataclass(value:Any)->Dict[str,Any]:
+    """
+    Shallow dict of the dataclass. The fields which are the dataclass are encoded when json reach them
+    """
+
+    if is_dataclass(value) and not isinstance(value,type):
+        return {x.name:getattr(value,x.name) for x in fields(value)}
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value:Any,is_compact:bool=False,backend:str=DEFAULT_BACKEND)->bytes:
+    """
+    Encode the value which can contain the dataclass to utf-8 json.
+    is_compact : whether to write without the indentation and the whitespace
+    backend : ORJSON_BACKEND,MSGSPEC_BACKEND or JSON_BACKEND. It must be installed
+    """
+
+    if backend==ORJSON_BACKEND:
+
+        # orjson only support the indentation of 2 spaces
+        option = 0 if is_compact else orjson.OPT_INDENT_2
+
+        return orjson.dumps(value,option=option)
+
+    if backend==MSGSPEC_BACKEND:
+
+        raw_value = msgspec.json.encode(value)
+
+        if is_compact:
+            return raw_value
+
+        return msgspec.json.format(raw_value,indent=4)
+
+    if backend==JSON_BACKEND:
+
+        if is_compact:
+            raw_value = json.dumps(value,default=encode_dataclass,separators=(",",":"))
+        else:
+            raw_value = json.dumps(value,default=encode_dataclass,indent=4)
+
+        return raw_value.encode("utf-8")
+
+    raise ValueError(f"unsupported json backend {backend}")
+
+def dump(value:Any,file:BinaryIO,is_compact:bool=False,backend:str=DEFAULT_BACKEND)->None:
+    """
+    Write the value to the file opened in binary mode
+    """
+
+    if backend!=JSON_BACKEND:
+        file.write(dumps(value=value,is_compact=is_compact,backend=backend))
+        return
+
+    # json write the value part by part instead of building the whole text
+
+    text_file = io.TextIOWrapper(file,encoding="utf-8")
+
+    if is_compact:
+        json.dump(value,text_file,default=encode_dataclass,separators=(",",":"))
+    else:
+        json.dump(value,text_file,default=encode_dataclass,indent=4)
+
+    text_file.flush()
+
+    text_file.detach()
+
+# lineage.json is the list of {pipeline_name,lineage:[{node_name,parent_nodes}]}
+LINEAGE_JSON_FORMAT = "json"
+
+# lineage.json is {nodes:[node name],pipelines:[{pipeline_name,edges:[[node index,parent index]]}]}
+LINEAGE_DICTIONARY_FORMAT = "dictionary"
+
+LINEAGE_FORMATS = {LINEAGE_JSON_FORMAT,LINEAGE_DICTIONARY_FORMAT}
+
+# parent index of the node which does not have parent
+NO_PARENT_INDEX = -1
+
+def to_dictionary_lineage(pipeline_lineage:List[Any])->Dict[str,Any]:
+    """
+    Encode the lineage so that each node name is written once.
+    Each edge is the [node index,parent index] pairs for its parents (or [node index,NO_PARENT_INDEX])
+    pipeline_lineage : PipelineLineage or its dict (lineage of the previous run)
+    """
+
+    node_indexes:Dict[str,int] = dict()
+
+    pipelines:List[Dict[str,Any]] = list()
+
+    def get_node_index(node_name:str)->int:
+
+        node_index = node_indexes.get(node_name)
+
+        if node_index is None:
+            node_index = len(node_indexes)
+            node_indexes[node_name] = node_index
+
+        return node_index
+
+    for lineage in pipeline_lineage:
+
+        if isinstance(lineage,dict):
+            pipeline_name = lineage["pipeline_name"]
+            edges = [(x["node_name"],x["parent_nodes"]) for x in lineage["lineage"]]
+        else:
+            pipeline_name = lineage.pipeline_name
+            edges = [(x.node_name,x.parent_nodes) for x in lineage.lineage]
+
+        raw_edges:List[List[int]] = list()
+
+        for node_name,parent_nodes in edges:
+
+            node_index = get_node_index(node_name=node_name)
+
+            if len(parent_nodes)==0:
+                raw_edges.append([node_index,NO_PARENT_INDEX])
+
+            for parent_node in parent_nodes:
+                raw_edges.append([node_index,get_node_index(node_name=parent_node)])
+
+        pipelines.append({"pipeline_name":pipeline_name,"edges":raw_edges})
+
+    return {
+        "nodes":list(node_indexes.keys()),
+        "pipelines":pipelines
+    }
+
+def is_dictionary_lineage(raw_lineage:Any)->bool:
+    return isinstance(raw_lineage,dict) and "nodes" in raw_lineage and "pipelines" in raw_lineage
+
+def from_dictionary_lineage(raw_lineage:Dict[str,Any])->List[Dict[str,Any]]:
+    """
+    Decode the lineage written by to_dictionary_lineage to the list of {pipeline_name,lineage:[{node_name,parent_nodes}]}
+    """
+
+    nodes:List[str] = raw_lineage["nodes"]
+
+    pipeline_lineage:List[Dict[str,Any]] = list()
+
+    for pipeline in raw_lineage["pipelines"]:
+
+        # node name -> parents in the order of the edges
+        edges:Dict[str,List[str]] = dict()
+
+        for node_index,parent_index in pipeline["edges"]:
+
+            parent_nodes = edges.setdefault(nodes[node_index],list())
+
+            if parent_index!=NO_PARENT_INDEX:
+                parent_nodes.append(nodes[parent_index])
+
+        pipeline_lineage.append({
+            "pipeline_name":pipeline["pipeline_name"],
+            "lineage":[{"node_name":node_name,"parent_nodes":parent_nodes} for node_name,parent_nodes in edges.items()]
+        })
+
+    return pipeline_lineage
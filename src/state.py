@@ -0,0 +1,184 @@
+from typing import (
+    Dict,
+    List,
+    Set,
+    Any,
+    Optional
+)
+from model import (
+    ExtractionState,
+    PipelineRunState,
+    PipelineRuntimeContext,
+    PipelineLineage,
+    APIPipelineRun
+)
+from search import find_latest_pipeline_info
+from serializer import (
+    is_dictionary_lineage,
+    from_dictionary_lineage
+)
+from datetime import (
+    datetime,
+    timedelta
+)
+from dataclasses import asdict
+from pathlib import Path
+import json
+import os
+
+# the pipeline runs are queried again from a bit before the watermark
+# so that the run which is updated late in the run log is not missed
+
+WATERMARK_OVERLAP = timedelta(minutes=10)
+
+def load_state(file_path:str)->Optional[ExtractionState]:
+    """
+    Return None if there is no state or the state cannot be read
+    """
+
+    try:
+        with open(file_path,"r") as file:
+            raw_state = json.load(file)
+
+        return ExtractionState(
+            watermark=datetime.fromisoformat(raw_state["watermark"]),\
+            pipeline_runs={
+                pipeline_name:PipelineRunState(
+                    run_id=raw_run["run_id"],\
+                    run_end=datetime.fromisoformat(raw_run["run_end"]) if raw_run["run_end"] is not None else None
+                )
+                for pipeline_name,raw_run in raw_state["pipeline_runs"].items()
+            }
+        )
+
+    except Exception:
+        return None
+
+def save_state(file_path:str,state:ExtractionState)->None:
+
+    raw_state = {
+        "watermark":state.watermark.isoformat(),
+        "pipeline_runs":{
+            pipeline_name:{
+                "run_id":run_state.run_id,
+                "run_end":run_state.run_end.isoformat() if run_state.run_end is not None else None
+            }
+            for pipeline_name,run_state in state.pipeline_runs.items()
+        }
+    }
+
+    Path(file_path).parent.mkdir(parents=True,exist_ok=True)
+
+    temp_file_path = f"{file_path}.tmp"
+
+    with open(temp_file_path,"w") as file:
+        json.dump(raw_state,file,indent=4)
+
+    os.replace(temp_file_path,file_path)
+
+def get_state_time_from(state:ExtractionState)->datetime:
+    """
+    Get the time from which the pipeline runs need to be queried
+    """
+    return state.watermark - WATERMARK_OVERLAP
+
+def is_processed_run(state:ExtractionState,pipeline_run:APIPipelineRun)->bool:
+    """
+    Check whether the pipeline run is already processed.
+    The run which was in progress is processed again once it end
+    """
+
+    run_state = state.pipeline_runs.get(pipeline_run.pipeline_name)
+
+    if run_state is None:
+        return False
+
+    return run_state.run_id==pipeline_run.run_id and \
+        run_state.run_end==pipeline_run.run_end
+
+def get_changed_pipeline_runs(state:ExtractionState,\
+                              pipeline_runs:Dict[str,List[APIPipelineRun]])->Dict[str,List[APIPipelineRun]]:
+    """
+    Get only the pipelines whose latest run is not processed yet
+    pipeline_runs (pipeline_name,pipeline runs) : pipeline runs updated after the watermark
+    """
+
+    changed_pipeline_runs:Dict[str,List[APIPipelineRun]] = dict()
+
+    for pipeline_name,runs in pipeline_runs.items():
+
+        latest_pipeline_info = find_latest_pipeline_info(pipeline_runs=runs)
+
+        if latest_pipeline_info is None or \
+            is_processed_run(state=state,pipeline_run=latest_pipeline_info):
+            continue
+
+        changed_pipeline_runs[pipeline_name] = runs
+
+    return changed_pipeline_runs
+
+def update_state(state:Optional[ExtractionState],\
+                 watermark:datetime,\
+                 runtime_contexts:Dict[str,PipelineRuntimeContext],\
+                 pipeline_names:Set[str])->ExtractionState:
+    """
+    Create the new state after processing the runtime contexts
+    pipeline_names : pipelines which still exist. The state of the removed pipelines is dropped
+    """
+
+    pipeline_runs:Dict[str,PipelineRunState] = dict()
+
+    if state is not None:
+        pipeline_runs = {
+            pipeline_name:run_state
+            for pipeline_name,run_state in state.pipeline_runs.items()
+            if pipeline_name in pipeline_names
+        }
+
+    for pipeline_name,runtime_context in runtime_contexts.items():
+        pipeline_runs[pipeline_name] = PipelineRunState(run_id=runtime_context.run_id,\
+                                                        run_end=runtime_context.run_end)
+
+    return ExtractionState(watermark=watermark,\
+                           pipeline_runs=pipeline_runs)
+
+def load_lineage(file_path:str)->Optional[List[Dict[str,Any]]]:
+    """
+    Load the lineage written by the previous run. Return None if it cannot be read
+    """
+
+    try:
+        with open(file_path,"r") as file:
+            raw_lineage = json.load(file)
+
+        if is_dictionary_lineage(raw_lineage=raw_lineage):
+            return from_dictionary_lineage(raw_lineage=raw_lineage)
+        
+        return raw_lineage
+    except Exception:
+        return None
+
+def merge_pipeline_lineage(previous_lineage:List[Dict[str,Any]],\
+                           pipeline_lineage:List[PipelineLineage],\
+                           pipeline_names:Set[str])->List[Dict[str,Any]]:
+    """
+    Replace the lineage of the rebuilt pipelines in the previous lineage.
+    pipeline_names : pipelines which still exist. The lineage of the removed pipelines is dropped
+    """
+
+    rebuilt_lineage = {x.pipeline_name:asdict(x) for x in pipeline_lineage}
+
+    merged_lineage:List[Dict[str,Any]] = list()
+
+    for lineage in previous_lineage:
+
+        pipeline_name = lineage["pipeline_name"]
+
+        if pipeline_name not in pipeline_names:
+            continue
+
+        merged_lineage.append(rebuilt_lineage.pop(pipeline_name,lineage))
+
+    merged_lineage.extend(rebuilt_lineage.values())
+
+    return merged_lineage
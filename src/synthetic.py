@@ -0,0 +1,306 @@
+from typing import (
+    List,
+    Dict,
+    Any,
+    Optional
+)
+from datetime import (
+    datetime,
+    timedelta,
+    timezone
+)
+from pathlib import Path
+from dataclasses import dataclass
+from replay import (
+    save_snapshot,
+    DATASET_SNAPSHOT,
+    LINKED_SERVICE_SNAPSHOT,
+    PIPELINE_SNAPSHOT,
+    TRIGGER_SNAPSHOT,
+    PIPELINE_RUN_SNAPSHOT,
+    ACTIVITY_RUN_SNAPSHOT
+)
+import random
+
+# start of the first synthetic pipeline run
+RUN_START = datetime(2025,1,1,tzinfo=timezone.utc)
+
+@dataclass
+class SyntheticFactory:
+    # number of pipelines
+    pipeline_count:int = 100
+    # number of copy activities in the top level of each pipeline
+    activity_count:int = 10
+    # levels of the ForEach and If activities nested in each other
+    nesting_depth:int = 2
+    # number of copy activities in each branch of the nested activity
+    branch_activity_count:int = 2
+    # number of tables (one dataset per table)
+    table_count:int = 1000
+    # number of azure sql databases the tables are in
+    linked_service_count:int = 4
+    # fraction of the copy activities which copy with the source query instead of the table
+    query_ratio:float = 0.5
+    seed:int = 0
+
+class SyntheticFactoryBuilder:
+    """
+    Build the snapshot of the synthetic data factory of copy activities between azure sql tables
+    """
+    def __init__(self,factory:SyntheticFactory):
+
+        self.factory = factory
+
+        self.randomizer = random.Random(factory.seed)
+
+        # activity runs of the pipeline which is being built
+        self.activity_runs:List[Dict[str,Any]] = list()
+
+        self.activity_index = 0
+
+    def get_linked_service_name(self,index:int)->str:
+        return f"AzureSql{index}"
+
+    def get_dataset_name(self,table_index:int)->str:
+        return f"Table{table_index}"
+
+    def get_query_dataset_name(self,linked_service_index:int)->str:
+        return f"Query{linked_service_index}"
+
+    def get_table_name(self,table_index:int)->str:
+        return f"schema_{table_index%10}.table_{table_index}"
+
+    def get_linked_services(self)->List[Dict[str,Any]]:
+
+        return [
+            {
+                "name":self.get_linked_service_name(index=x),
+                "properties":{
+                    "type":"AzureSqlDatabase",
+                    "typeProperties":{
+                        "connectionString":f"Data Source=tcp:server{x}.database.windows.net,1433;Initial Catalog=database{x};"
+                    }
+                }
+            }
+            for x in range(self.factory.linked_service_count)
+        ]
+
+    def get_datasets(self)->List[Dict[str,Any]]:
+
+        # the dataset without the table is the source of the copy activities which copy with the source query
+
+        query_datasets = [
+            {
+                "name":self.get_query_dataset_name(linked_service_index=x),
+                "properties":{
+                    "type":"AzureSqlTable",
+                    "linkedServiceName":{
+                        "referenceName":self.get_linked_service_name(index=x),
+                        "type":"LinkedServiceReference"
+                    },
+                    "typeProperties":{}
+                }
+            }
+            for x in range(self.factory.linked_service_count)
+        ]
+
+        return query_datasets+[
+            {
+                "name":self.get_dataset_name(table_index=x),
+                "properties":{
+                    "type":"AzureSqlTable",
+                    "linkedServiceName":{
+                        "referenceName":self.get_linked_service_name(index=x%self.factory.linked_service_count),
+                        "type":"LinkedServiceReference"
+                    },
+                    "typeProperties":{
+                        "schema":f"schema_{x%10}",
+                        "table":f"table_{x}"
+                    }
+                }
+            }
+            for x in range(self.factory.table_count)
+        ]
+
+    def get_source_query(self,table_index:int)->str:
+
+        join_table_index = self.randomizer.randrange(self.factory.table_count)
+
+        return (f"SELECT a.id,b.name FROM {self.get_table_name(table_index=table_index)} AS a "
+                f"JOIN {self.get_table_name(table_index=join_table_index)} AS b ON a.id=b.id "
+                f"WHERE a.updated_at>'2025-01-01'")
+
+    def get_activity_name(self,activity_type:str)->str:
+
+        self.activity_index += 1
+
+        return f"{activity_type}{self.activity_index}"
+
+    def get_copy_activity(self,run_id:str,depends_on:Optional[str])->Dict[str,Any]:
+
+        name = self.get_activity_name(activity_type="Copy")
+
+        source_index = self.randomizer.randrange(self.factory.table_count)
+
+        sink_index = self.randomizer.randrange(self.factory.table_count)
+
+        source:Dict[str,Any] = {"type":"AzureSqlSource"}
+
+        source_dataset_name = self.get_dataset_name(table_index=source_index)
+
+        if self.randomizer.random()<self.factory.query_ratio:
+            source["sqlReaderQuery"] = self.get_source_query(table_index=source_index)
+            source_dataset_name = self.get_query_dataset_name(linked_service_index=source_index%self.factory.linked_service_count)
+
+        self.activity_runs.append({
+            "activityName":name,
+            "activityType":"Copy",
+            "pipelineRunId":run_id,
+            "status":"Succeeded",
+            "input":{"source":source,"sink":{"type":"AzureSqlSink"}}
+        })
+
+        return {
+            "name":name,
+            "type":"Copy",
+            "dependsOn":self.get_depends_on(depends_on=depends_on),
+            "inputs":[{"referenceName":source_dataset_name,"type":"DatasetReference"}],
+            "outputs":[{"referenceName":self.get_dataset_name(table_index=sink_index),"type":"DatasetReference"}],
+            "typeProperties":{
+                "source":{"type":"AzureSqlSource"},
+                "sink":{"type":"AzureSqlSink"}
+            }
+        }
+
+    def get_depends_on(self,depends_on:Optional[str])->List[Dict[str,Any]]:
+
+        if depends_on is None:
+            return list()
+
+        return [{"activity":depends_on,"dependencyConditions":["Succeeded"]}]
+
+    def get_branch_activities(self,run_id:str,depth:int)->List[Dict[str,Any]]:
+        """
+        Copy activities which run one after another followed by the nested activity of the next level
+        """
+
+        activities:List[Dict[str,Any]] = list()
+
+        depends_on = None
+
+        for _ in range(self.factory.branch_activity_count):
+            activities.append(self.get_copy_activity(run_id=run_id,depends_on=depends_on))
+            depends_on = activities[-1]["name"]
+
+        if depth>0:
+            activities.append(self.get_nested_activity(run_id=run_id,depth=depth,depends_on=depends_on))
+
+        return activities
+
+    def get_nested_activity(self,run_id:str,depth:int,depends_on:Optional[str])->Dict[str,Any]:
+        """
+        ForEach and If activity in turn from the top level
+        """
+
+        if (self.factory.nesting_depth-depth)%2==0:
+
+            return {
+                "name":self.get_activity_name(activity_type="ForEach"),
+                "type":"ForEach",
+                "dependsOn":self.get_depends_on(depends_on=depends_on),
+                "typeProperties":{
+                    "items":{"value":"@pipeline().parameters.items","type":"Expression"},
+                    "activities":self.get_branch_activities(run_id=run_id,depth=depth-1)
+                }
+            }
+
+        return {
+            "name":self.get_activity_name(activity_type="If"),
+            "type":"IfCondition",
+            "dependsOn":self.get_depends_on(depends_on=depends_on),
+            "typeProperties":{
+                "expression":{"value":"@bool(pipeline().parameters.is_full)","type":"Expression"},
+                "ifTrueActivities":self.get_branch_activities(run_id=run_id,depth=depth-1),
+                "ifFalseActivities":self.get_branch_activities(run_id=run_id,depth=depth-1)
+            }
+        }
+
+    def get_pipeline(self,pipeline_name:str,run_id:str)->Dict[str,Any]:
+
+        self.activity_index = 0
+
+        activities:List[Dict[str,Any]] = list()
+
+        depends_on = None
+
+        for _ in range(self.factory.activity_count):
+            activities.append(self.get_copy_activity(run_id=run_id,depends_on=depends_on))
+            depends_on = activities[-1]["name"]
+
+        if self.factory.nesting_depth>0:
+            activities.append(self.get_nested_activity(run_id=run_id,\
+                                                       depth=self.factory.nesting_depth,\
+                                                       depends_on=depends_on))
+
+        return {
+            "name":pipeline_name,
+            "properties":{
+                "activities":activities,
+                "parameters":{
+                    "items":{"type":"Array"},
+                    "is_full":{"type":"Bool"}
+                }
+            }
+        }
+
+    def save(self,folder_path:str)->None:
+
+        snapshot_folder_path = Path(folder_path)
+
+        pipelines:List[Dict[str,Any]] = list()
+
+        pipeline_runs:List[Dict[str,Any]] = list()
+
+        activity_runs:Dict[str,List[Dict[str,Any]]] = dict()
+
+        for pipeline_index in range(self.factory.pipeline_count):
+
+            pipeline_name = f"Pipeline{pipeline_index}"
+
+            run_id = f"{pipeline_name}-run"
+
+            run_start = RUN_START+timedelta(minutes=pipeline_index)
+
+            self.activity_runs = list()
+
+            pipelines.append(self.get_pipeline(pipeline_name=pipeline_name,run_id=run_id))
+
+            for activity_run in self.activity_runs:
+                activity_run["activityRunStart"] = run_start.isoformat()
+                activity_run["activityRunEnd"] = (run_start+timedelta(minutes=1)).isoformat()
+
+            activity_runs[run_id] = self.activity_runs
+
+            pipeline_runs.append({
+                "pipelineName":pipeline_name,
+                "runId":run_id,
+                "runStart":run_start.isoformat(),
+                "runEnd":(run_start+timedelta(minutes=10)).isoformat(),
+                "status":"Succeeded",
+                "isLatest":True,
+                "parameters":{"items":"[1,2]","is_full":"true"}
+            })
+
+        save_snapshot(folder_path=snapshot_folder_path,file_name=LINKED_SERVICE_SNAPSHOT,value=self.get_linked_services())
+        save_snapshot(folder_path=snapshot_folder_path,file_name=DATASET_SNAPSHOT,value=self.get_datasets())
+        save_snapshot(folder_path=snapshot_folder_path,file_name=PIPELINE_SNAPSHOT,value=pipelines)
+        save_snapshot(folder_path=snapshot_folder_path,file_name=TRIGGER_SNAPSHOT,value=list())
+        save_snapshot(folder_path=snapshot_folder_path,file_name=PIPELINE_RUN_SNAPSHOT,value=pipeline_runs)
+        save_snapshot(folder_path=snapshot_folder_path,file_name=ACTIVITY_RUN_SNAPSHOT,value=activity_runs)
+
+def save_synthetic_snapshot(folder_path:str,factory:SyntheticFactory)->None:
+    """
+    Save the snapshot of the synthetic factory which ReplayClient replay.
+    The same factory (with the same seed) give the same snapshot
+    """
+    SyntheticFactoryBuilder(factory=factory).save(folder_path=folder_path)
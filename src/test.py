@@ -4,13 +4,31 @@ from model import (
     Resolved,
     Unresolved,
     Parameter,
-    ParameterType
+    ParameterType,
+    APIPipelineRun,
+    APIActivityRun,
+    APIPipelineResource,
+    Dataset,
+    DatasetType,
+    ExtractionState,
+    PipelineRunState,
+    PipelineLineage,
+    PipelineRuntimeContext,
+    SqlParseBudget,
+    StaticPipeline,
+    GenericActivity,
+    QueryDataset,
+    SingleTableDataset
 )
 from graph import (
     get_node_names,
     get_parent_nodes,
     Edge,
-    merge_edge
+    merge_edge,
+    merge_edges,
+    remove_node,
+    replace_node_with_edge,
+    ActivityGraph
 )
 from core import (
     branch_to_edges,
@@ -21,18 +39,128 @@ from core import (
     resolve_expression,
     resolve_table_expression,
     normalize_blob_path,
-    resolve_dataset_parameter
+    resolve_dataset_parameter,
+    get_static_pipeline,
+    expand_activities
 )
 from typing import (
     List,
-    Dict
+    Dict,
+    Optional,
+    Tuple,
+    Any
 )
 from lineage import (
     clean_sql,
-    get_sql_lineage
+    get_sql_lineage,
+    SqlLineageCache,
+    SqlLineageStore,
+    scan_sql_tables,
+    get_sql_hash,
+    get_pipeline_table_lineage,
+    get_source_sql_queries,
+    parse_sql_lineage_in_processes
 )
 from copy import deepcopy
-from connector import get_mongodb_host
+from connector import (
+    get_mongodb_host,
+    get_sql_dialect
+)
+from plugin import ActivityLineageContext
+from util import (
+    get_batches,
+    add_lineage,
+    LineageAccumulator,
+    to_pipeline_lineage_context
+)
+from search import (
+    MetadataCatalog,
+    group_pipeline_runs,
+    find_latest_pipeline_info,
+    LatestPipelineRunTracker
+)
+from client import (
+    get_runtime_contexts,
+    RateLimiter,
+    get_retry_after,
+    get_rate_limit_remaining,
+    get_datasets,
+    get_linked_service,
+    DataFactoryClient,
+    SynapseClient
+)
+import client as client_module
+from aioclient import (
+    AsyncDataFactoryClient,
+    gather_runtime_contexts
+)
+from aiohttp import web
+from azure.core.credentials import AccessToken
+from azure.core.pipeline.policies import SansIOHTTPPolicy
+from azure.core.pipeline.transport import RequestsTransport
+import asyncio
+import json
+from datetime import (
+    datetime,
+    timezone
+)
+from cache import StaticPipelineCache
+from azure.mgmt.datafactory.models import (
+    CopyActivity,
+    ForEachActivity,
+    SqlServerStoredProcedureActivity,
+    DatasetReference,
+    Expression,
+    CopySource,
+    CopySink,
+    ActivityDependency
+)
+import tempfile
+import random
+import os
+import io
+from state import (
+    load_state,
+    save_state,
+    update_state,
+    get_changed_pipeline_runs,
+    merge_pipeline_lineage,
+    load_lineage
+)
+from dataclasses import asdict
+from serializer import (
+    dump,
+    dumps,
+    to_dictionary_lineage,
+    from_dictionary_lineage,
+    JSON_BACKEND,
+    ORJSON_BACKEND
+)
+from writer import (
+    OpenLineageWriter,
+    NDJSON_OUTPUT_FORMAT
+)
+from instrument import (
+    INSTRUMENTATION,
+    instrument,
+    record_http_request,
+    write_run_report,
+    to_prometheus_text,
+    HTTP_REQUEST_NAME
+)
+from replay import (
+    ReplayAzureClient,
+    AsyncReplayAzureClient,
+    record_snapshot
+)
+from synthetic import (
+    SyntheticFactory,
+    save_synthetic_snapshot
+)
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+from urllib.parse import urlparse
+import requests
 
 # virtual-dom test
 
@@ -459,6 +587,59 @@ def test_virtual_graph_foreach_with_unsupported_body():
     assert "A" in get_parent_nodes("Body", edges)
     assert "Body" in get_parent_nodes("Next", edges)
 
+def random_activities(rng:random.Random,\
+                      names:List[str],\
+                      depth:int=0)->List[Activity]:
+    """
+    Generate the random activities (include nested If/ForEach/While) which depends on the previous activities
+    """
+    
+    activities:List[Activity] = list()
+
+    for _ in range(rng.randint(0,5) if depth>0 else rng.randint(1,10)):
+
+        name = f"Activity{len(names)}"
+
+        names.append(name)
+
+        depends_on = [x.activity_name for x in activities if rng.random()<0.3]
+
+        kind = rng.random()
+
+        if depth<3 and kind<0.15:
+            activities.append(if_activity(name=name,\
+                                          true_branch=random_activities(rng=rng,names=names,depth=depth+1),\
+                                          false_branch=random_activities(rng=rng,names=names,depth=depth+1),\
+                                          depends_on=depends_on))
+        elif depth<3 and kind<0.3:
+            activities.append(rng.choice([for_each_activity,while_activity])(name=name,\
+                                                                               body_children=random_activities(rng=rng,names=names,depth=depth+1),\
+                                                                               depends_on=depends_on))
+        else:
+            activities.append(rng.choice([copy_activity,procedure_activity,unsupported_activity])(name=name,\
+                                                                                                  depends_on=depends_on))
+            
+    return activities
+
+def test_virtual_graph_same_as_flatten_and_simplify():
+
+    rng = random.Random(0)
+
+    for _ in range(500):
+
+        activities = random_activities(rng=rng,names=list())
+
+        edges = branch_to_edges(activities=activities)
+        edges = get_flatten_branches(activities=activities,edges=edges)
+        edges = get_simplify_graph(activities=activities,edges=edges)
+
+        virtual_graph = get_virtual_graph(activities=activities)
+
+        assert [x.node_name for x in virtual_graph]==[x.node_name for x in edges]
+
+        for edge in edges:
+            assert get_parent_nodes(edge.node_name,virtual_graph)==set(edge.parent_nodes)
+
 # expression resolver test
 
 
@@ -559,6 +740,18 @@ def test_pipeline_interpolated_with_surrounding_text():
 
     assert result == Resolved("First Name: Mr Last Name: Smith")
 
+def test_interpolated_repeated_token():
+
+    result = resolve_expression(
+        "@{pipeline().parameters.env}/@{dataset().table}_@{pipeline().parameters.env}",
+        dataset_parameters={"table": "@{pipeline().parameters.env}"},
+        pipeline_parameters={"env": "prod"},
+        linked_service_parameters={}
+    )
+
+    # the resolved value is not resolved again
+    assert result == Resolved("prod/@{pipeline().parameters.env}_prod")
+
 def test_pipeline_interpolated_missing_param():
 
     result = resolve_expression("@{pipeline().parameters.env}", {}, {},{})
@@ -695,6 +888,1337 @@ def test_get_mongodb_host_srv():
 
     assert mongodb_host=="mongodb-host1.com"
 
+def pipeline_run(pipeline_name:str,\
+                 run_id:str,\
+                 run_start:datetime,\
+                 is_latest:bool=True)->APIPipelineRun:
+    
+    return APIPipelineRun(pipeline_name=pipeline_name,\
+                          run_id=run_id,\
+                          run_start=run_start,\
+                          run_end=run_start,\
+                          run_status="Succeeded",\
+                          is_latest=is_latest,\
+                          parameters=None)
+
+def test_get_batches():
+
+    batches = get_batches(values=["A","B","C","D","E"],batch_size=2)
+
+    assert batches==[["A","B"],["C","D"],["E"]]
+
+def test_get_batches_empty():
+
+    assert get_batches(values=[],batch_size=2)==[]
+
+def test_group_pipeline_runs_latest_run():
+
+    pipeline_runs = [
+        pipeline_run(pipeline_name="P1",run_id="1",run_start=datetime(2025,1,1)),
+        pipeline_run(pipeline_name="P2",run_id="2",run_start=datetime(2025,1,1)),
+        pipeline_run(pipeline_name="P1",run_id="3",run_start=datetime(2025,1,2)),
+        pipeline_run(pipeline_name="P1",run_id="4",run_start=datetime(2025,1,3),is_latest=False)
+    ]
+
+    grouped_pipeline_runs = group_pipeline_runs(pipeline_runs=pipeline_runs)
+
+    assert len(grouped_pipeline_runs["P1"])==3
+    assert len(grouped_pipeline_runs["P2"])==1
+    assert find_latest_pipeline_info(pipeline_runs=grouped_pipeline_runs["P1"]).run_id=="3"
+
+def test_latest_pipeline_run_tracker():
+
+    latest_run_tracker = LatestPipelineRunTracker(pipeline_names=["P1","P2"])
+
+    latest_run_tracker.add(pipeline_run=pipeline_run(pipeline_name="P1",run_id="1",run_start=datetime(2025,1,3),is_latest=False))
+    latest_run_tracker.add(pipeline_run=pipeline_run(pipeline_name="P1",run_id="2",run_start=datetime(2025,1,2)))
+
+    assert not latest_run_tracker.is_complete()
+
+    latest_run_tracker.add(pipeline_run=pipeline_run(pipeline_name="P2",run_id="3",run_start=datetime(2025,1,1)))
+
+    assert latest_run_tracker.is_complete()
+
+class FakeActivityRunClient:
+
+    def get_activities_run(self,pipeline_run:APIPipelineRun)->List[APIActivityRun]:
+
+        return [APIActivityRun(activity_name=f"Copy{pipeline_run.pipeline_name}",\
+                               activity_type="Copy",\
+                               input={"source":{"sqlReaderQuery":"SELECT 1"}},\
+                               run_id=pipeline_run.run_id,\
+                               run_start=pipeline_run.run_start,\
+                               run_end=pipeline_run.run_end,\
+                               run_status="Succeeded")]
+
+def test_get_runtime_contexts_concurrent_same_as_sequential():
+
+    pipeline_runs = {
+        f"P{index}":[pipeline_run(pipeline_name=f"P{index}",run_id=str(index),run_start=datetime(2025,1,1))]
+        for index in range(10)
+    }
+
+    pipeline_runs["NoRun"] = list()
+
+    sequential = get_runtime_contexts(client=FakeActivityRunClient(),\
+                                      pipeline_runs=pipeline_runs,\
+                                      concurrency=1)
+    
+    concurrent = get_runtime_contexts(client=FakeActivityRunClient(),\
+                                      pipeline_runs=pipeline_runs,\
+                                      concurrency=4)
+
+    assert list(concurrent.keys())==list(sequential.keys())
+    assert "NoRun" not in concurrent
+    assert concurrent==sequential
+    assert "CopyP3" in concurrent["P3"].activity_source_inputs
+
+class FailingActivityRunClient(FakeActivityRunClient):
+    """
+    Activity run query of P3 fail like the client after the retries run out
+    """
+
+    def get_activities_run(self,pipeline_run:APIPipelineRun)->Optional[List[APIActivityRun]]:
+
+        if pipeline_run.pipeline_name=="P3":
+            return None
+        
+        return super().get_activities_run(pipeline_run=pipeline_run)
+
+class AsyncFailingActivityRunClient:
+
+    async def get_activities_run(self,pipeline_run:APIPipelineRun)->Optional[List[APIActivityRun]]:
+        return FailingActivityRunClient().get_activities_run(pipeline_run=pipeline_run)
+
+def test_get_runtime_contexts_skip_failed_activity_runs():
+
+    pipeline_runs = {
+        f"P{index}":[pipeline_run(pipeline_name=f"P{index}",run_id=str(index),run_start=datetime(2025,1,1))]
+        for index in range(5)
+    }
+
+    for concurrency in [1,4]:
+
+        runtime_contexts = get_runtime_contexts(client=FailingActivityRunClient(),\
+                                                pipeline_runs=pipeline_runs,\
+                                                concurrency=concurrency)
+        
+        assert set(runtime_contexts.keys())=={"P0","P1","P2","P4"}
+
+    runtime_contexts = asyncio.run(gather_runtime_contexts(client=AsyncFailingActivityRunClient(),\
+                                                           pipeline_runs=pipeline_runs,\
+                                                           concurrency=2))
+    
+    assert set(runtime_contexts.keys())=={"P0","P1","P2","P4"}
+
+# recorded response of the data factory api
+# key : (http method,last segment of the url path,continuation token of the request)
+
+RECORDED_RESPONSES:Dict[tuple,Dict] = {
+    ("GET","datasets",None):{
+        "value":[{
+            "name":"SqlTable",
+            "properties":{
+                "type":"AzureSqlTable",
+                "linkedServiceName":{"referenceName":"AzureSql","type":"LinkedServiceReference"},
+                "typeProperties":{"schema":"dbo","table":"customer"}
+            }
+        }]
+    },
+    ("POST","queryPipelineRuns",None):{
+        "value":[{"pipelineName":"P1","runId":"P1-1","runStart":"2025-01-01T00:00:00Z","runEnd":"2025-01-01T01:00:00Z","isLatest":True,"status":"Succeeded"}],
+        "continuationToken":"page-2"
+    },
+    ("POST","queryPipelineRuns","page-2"):{
+        "value":[{"pipelineName":"P2","runId":"P2-1","runStart":"2025-01-01T00:00:00Z","runEnd":"2025-01-01T01:00:00Z","isLatest":True,"status":"Succeeded"}]
+    },
+    ("POST","queryActivityruns",None):{
+        "value":[{"activityName":"CopyCustomer","activityType":"Copy","pipelineRunId":"P1-1","status":"Succeeded",
+                  "input":{"source":{"type":"AzureSqlSource","sqlReaderQuery":"SELECT * FROM dbo.customer"}}}],
+        "continuationToken":"page-2"
+    },
+    ("POST","queryActivityruns","page-2"):{
+        "value":[{"activityName":"CopyOrder","activityType":"Copy","pipelineRunId":"P1-1","status":"Succeeded",
+                  "input":{"source":{"type":"AzureSqlSource","sqlReaderQuery":"SELECT * FROM dbo.order"}}}]
+    }
+}
+
+class FakeAsyncCredential:
+
+    async def get_token(self,*scopes,**kwargs)->AccessToken:
+        return AccessToken("token",9999999999)
+    
+    async def close(self)->None:
+        pass
+
+async def replay_data_factory(test_function,\
+                              rate_limiter:Optional[RateLimiter]=None,\
+                              throttled_count:int=0)->None:
+    """
+    Run the test function against local http server which replay the recorded responses
+    throttled_count : number of first requests which are throttled by the server
+    """
+
+    if rate_limiter is None:
+        rate_limiter = RateLimiter()
+
+    throttled:List[int] = list()
+
+    async def handler(request:web.Request)->web.Response:
+
+        if len(throttled)<throttled_count:
+
+            throttled.append(1)
+
+            return web.json_response({"error":{"code":"TooManyRequests"}},\
+                                     status=429,\
+                                     headers={"Retry-After":"0"})
+
+        continuation_token = None
+
+        if request.method=="POST":
+            continuation_token = json.loads(await request.text()).get("continuationToken")
+
+        key = (request.method,request.path.split("/")[-1],continuation_token)
+
+        return web.json_response(RECORDED_RESPONSES.get(key,{"value":[]}))
+
+    app = web.Application()
+    app.router.add_route("*","/{path:.*}",handler)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+
+    site = web.TCPSite(runner,"127.0.0.1",0)
+    await site.start()
+
+    port = site._server.sockets[0].getsockname()[1]
+
+    client = AsyncDataFactoryClient(credential=FakeAsyncCredential(),\
+                                    subscription_id="subscription",\
+                                    resource_group_name="resource-group",\
+                                    data_factory_name="data-factory",\
+                                    rate_limiter=rate_limiter,\
+                                    base_url=f"http://127.0.0.1:{port}",\
+                                    authentication_policy=SansIOHTTPPolicy())
+    
+    try:
+        await test_function(client)
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+def test_async_client_replay_datasets():
+
+    async def test_function(client:AsyncDataFactoryClient):
+
+        datasets = await client.get_datasets()
+
+        assert len(datasets)==1
+        assert datasets[0].dataset_name=="SqlTable"
+        assert datasets[0].linked_service_name=="AzureSql"
+        assert datasets[0].azure_data_type=="AzureSqlTable"
+
+    asyncio.run(replay_data_factory(test_function))
+
+def test_async_client_replay_runtime_contexts():
+
+    async def test_function(client:AsyncDataFactoryClient):
+
+        pipeline_runs = await client.get_bulk_pipeline_runs(pipeline_names=["P1","P2"])
+
+        assert set(pipeline_runs.keys())=={"P1","P2"}
+
+        runtime_contexts = await gather_runtime_contexts(client=client,\
+                                                         pipeline_runs=pipeline_runs,\
+                                                         concurrency=2)
+        
+        assert runtime_contexts["P1"].run_id=="P1-1"
+        assert runtime_contexts["P1"].activity_source_inputs["CopyCustomer"]["sqlReaderQuery"]=="SELECT * FROM dbo.customer"
+
+    asyncio.run(replay_data_factory(test_function))
+
+def test_async_client_replay_retry_throttled_request():
+
+    rate_limiter = RateLimiter(backoff_factor=0.01)
+
+    async def test_function(client:AsyncDataFactoryClient):
+
+        datasets = await client.get_datasets()
+
+        assert len(datasets)==1
+
+    asyncio.run(replay_data_factory(test_function,\
+                                    rate_limiter=rate_limiter,\
+                                    throttled_count=2))
+    
+    stats = rate_limiter.get_stats()
+
+    assert stats.throttled_count==2
+    assert stats.retry_count==2
+    assert stats.request_count==3
+
+class FakeCredential:
+
+    def get_token(self,*scopes,**kwargs)->AccessToken:
+        return AccessToken("token",9999999999)
+
+class RecordedResponseAdapter(HTTPAdapter):
+    """
+    Requests adapter of the sync sdk clients which return the recorded responses instead of sending the requests
+    """
+    def __init__(self):
+        super().__init__()
+        # key of each request in the order they are sent
+        self.request_keys:List[tuple] = list()
+
+    def send(self,request:requests.PreparedRequest,**kwargs)->requests.Response:
+
+        continuation_token = None
+
+        if request.method=="POST":
+            continuation_token = json.loads(request.body).get("continuationToken")
+
+        key = (request.method,urlparse(request.url).path.split("/")[-1],continuation_token)
+
+        self.request_keys.append(key)
+
+        body = json.dumps(RECORDED_RESPONSES.get(key,{"value":[]})).encode()
+
+        return self.build_response(req=request,\
+                                   resp=HTTPResponse(body=io.BytesIO(body),\
+                                                     headers={"Content-Type":"application/json"},\
+                                                     status=200,\
+                                                     preload_content=False))
+
+def get_recorded_sync_client(is_data_factory:bool)->Tuple[Any,RecordedResponseAdapter]:
+    """
+    DataFactoryClient or SynapseClient whose sdk client send the requests to RecordedResponseAdapter
+    """
+
+    adapter = RecordedResponseAdapter()
+
+    def get_transport(connection_pool_size:int)->RequestsTransport:
+
+        session = requests.Session()
+        session.mount("https://",adapter)
+
+        return RequestsTransport(session=session,\
+                                 session_owner=True)
+
+    # the transport is only created with the sdk client
+
+    original_get_transport = client_module.get_transport
+
+    client_module.get_transport = get_transport
+
+    try:
+        if is_data_factory:
+            client = DataFactoryClient(credential=FakeCredential(),\
+                                       subscription_id="subscription",\
+                                       resource_group_name="resource-group",\
+                                       data_factory_name="data-factory",\
+                                       rate_limiter=RateLimiter())
+        else:
+            client = SynapseClient(credential=FakeCredential(),\
+                                   workspace_name="workspace",\
+                                   rate_limiter=RateLimiter())
+    finally:
+        client_module.get_transport = original_get_transport
+        
+    return client,adapter
+
+def test_sync_client_follow_continuation_token():
+
+    for is_data_factory in [True,False]:
+
+        client,adapter = get_recorded_sync_client(is_data_factory=is_data_factory)
+
+        pipeline_runs = client.get_bulk_pipeline_runs(pipeline_names=["P1","P2"])
+
+        assert set(pipeline_runs.keys())=={"P1","P2"}
+
+        activity_runs = client.get_activities_run(pipeline_run=pipeline_runs["P1"][0])
+
+        assert [x.activity_name for x in activity_runs]==["CopyCustomer","CopyOrder"]
+
+        assert adapter.request_keys==[
+            ("POST","queryPipelineRuns",None),
+            ("POST","queryPipelineRuns","page-2"),
+            ("POST","queryActivityruns",None),
+            ("POST","queryActivityruns","page-2")
+        ]
+
+def test_sync_client_stop_paging_after_latest_runs():
+
+    for is_data_factory in [True,False]:
+
+        client,adapter = get_recorded_sync_client(is_data_factory=is_data_factory)
+
+        # the latest run of P1 is in the first page
+
+        pipeline_runs = client.get_bulk_pipeline_runs(pipeline_names=["P1"])
+
+        assert pipeline_runs["P1"][0].run_id=="P1-1"
+
+        assert adapter.request_keys==[("POST","queryPipelineRuns",None)]
+
+def test_rate_limiter_stop_retry_after_max_retry():
+
+    rate_limiter = RateLimiter(max_retry=1)
+
+    assert rate_limiter.is_retry(status_code=429,attempt=0)
+    assert not rate_limiter.is_retry(status_code=429,attempt=1)
+    assert not rate_limiter.is_retry(status_code=200,attempt=0)
+    assert rate_limiter.get_stats().throttled_count==2
+
+def test_rate_limiter_decrease_rate_on_low_remaining_quota():
+
+    rate_limiter = RateLimiter(requests_per_second=10,low_remaining_threshold=100)
+
+    rate_limiter.update(headers={"x-ms-ratelimit-remaining-subscription-reads":"50"})
+
+    assert rate_limiter.get_stats().requests_per_second==5
+
+    rate_limiter.update(headers={"x-ms-ratelimit-remaining-subscription-reads":"11000"})
+
+    assert rate_limiter.get_stats().requests_per_second==5.5
+
+def test_get_retry_after():
+
+    assert get_retry_after(headers={"retry-after":"7"})==7
+    assert get_retry_after(headers={"x-ms-retry-after-ms":"1500"})==1.5
+    assert get_retry_after(headers={})==None
+
+def test_get_rate_limit_remaining():
+
+    headers = {
+        "x-ms-ratelimit-remaining-subscription-reads":"11999",
+        "x-ms-ratelimit-remaining-tenant-reads":"200",
+        "content-type":"application/json"
+    }
+
+    assert get_rate_limit_remaining(headers=headers)==200
+
+def test_get_changed_pipeline_runs():
+
+    run_time = datetime(2025,1,1,tzinfo=timezone.utc)
+
+    state = ExtractionState(watermark=run_time,\
+                            pipeline_runs={
+                                "A":PipelineRunState(run_id="a1",run_end=run_time),
+                                "B":PipelineRunState(run_id="b1",run_end=run_time),
+                                "C":PipelineRunState(run_id="c1",run_end=None)
+                            })
+    
+    in_progress_run = pipeline_run(pipeline_name="C",run_id="c1",run_start=run_time)
+    
+    pipeline_runs = {
+        "A":[pipeline_run(pipeline_name="A",run_id="a1",run_start=run_time)],
+        "B":[pipeline_run(pipeline_name="B",run_id="b2",run_start=run_time)],
+        # the run which was in progress has ended
+        "C":[in_progress_run],
+        "D":[pipeline_run(pipeline_name="D",run_id="d1",run_start=run_time)],
+        "E":list()
+    }
+
+    changed_pipeline_runs = get_changed_pipeline_runs(state=state,\
+                                                      pipeline_runs=pipeline_runs)
+    
+    assert set(changed_pipeline_runs.keys())=={"B","C","D"}
+
+def test_state_round_trip():
+
+    run_time = datetime(2025,1,1,tzinfo=timezone.utc)
+
+    state = ExtractionState(watermark=run_time,\
+                            pipeline_runs={
+                                "A":PipelineRunState(run_id="a1",run_end=run_time),
+                                "B":PipelineRunState(run_id="b1",run_end=None)
+                            })
+    
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        file_path = os.path.join(folder_path,"state.json")
+
+        save_state(file_path=file_path,state=state)
+
+        assert load_state(file_path=file_path)==state
+
+    assert load_state(file_path="not_exist.json") is None
+
+def test_update_state_drop_removed_pipeline():
+
+    run_time = datetime(2025,1,1,tzinfo=timezone.utc)
+
+    state = ExtractionState(watermark=run_time,\
+                            pipeline_runs={
+                                "A":PipelineRunState(run_id="a1",run_end=run_time),
+                                "B":PipelineRunState(run_id="b1",run_end=run_time)
+                            })
+    
+    runtime_context = PipelineRuntimeContext(pipeline_name="C",\
+                                             run_id="c1",\
+                                             run_start=run_time,\
+                                             run_end=run_time,\
+                                             pipeline_parameters=dict(),\
+                                             activity_source_inputs=dict(),\
+                                             pipeline_run_status="Succeeded")
+
+    new_state = update_state(state=state,\
+                             watermark=datetime(2025,1,2,tzinfo=timezone.utc),\
+                             runtime_contexts={"C":runtime_context},\
+                             pipeline_names={"A","C"})
+    
+    assert set(new_state.pipeline_runs.keys())=={"A","C"}
+    assert new_state.watermark==datetime(2025,1,2,tzinfo=timezone.utc)
+
+def test_merge_pipeline_lineage():
+
+    previous_lineage = [
+        {"pipeline_name":"A","lineage":[]},
+        {"pipeline_name":"B","lineage":[]},
+        {"pipeline_name":"C","lineage":[]}
+    ]
+
+    pipeline_lineage = [
+        PipelineLineage(pipeline_name="B",lineage=[Edge(node_name="t",parent_nodes=["s"])]),
+        PipelineLineage(pipeline_name="D",lineage=[])
+    ]
+
+    merged_lineage = merge_pipeline_lineage(previous_lineage=previous_lineage,\
+                                            pipeline_lineage=pipeline_lineage,\
+                                            pipeline_names={"A","B","D"})
+    
+    assert [x["pipeline_name"] for x in merged_lineage]==["A","B","D"]
+    assert merged_lineage[1]["lineage"]==[{"node_name":"t","parent_nodes":["s"]}]
+
+def copy_pipeline()->APIPipelineResource:
+
+    copy_activity = CopyActivity(name="Copy",\
+                                 inputs=[DatasetReference(type="DatasetReference",reference_name="Source")],\
+                                 outputs=[DatasetReference(type="DatasetReference",reference_name="Sink")],\
+                                 source=CopySource(),\
+                                 sink=CopySink())
+    
+    procedure_activity = SqlServerStoredProcedureActivity(name="Procedure",\
+                                                          stored_procedure_name="dbo.load",\
+                                                          depends_on=[ActivityDependency(activity="Copy",dependency_conditions=["Succeeded"])])
+    
+    for_each_activity = ForEachActivity(name="ForEach",\
+                                        items=Expression(type="Expression",value="@pipeline().parameters.tables"),\
+                                        activities=[copy_activity,procedure_activity])
+    
+    return APIPipelineResource(name="Pipeline",activities=[for_each_activity])
+
+def static_pipeline_catalog(sink_dataset_type:DatasetType)->MetadataCatalog:
+    return MetadataCatalog(datasets=[
+        Dataset(name="Source",type=DatasetType.Unsupported,linked_service_name="SqlServer",info=None),
+        Dataset(name="Sink",type=sink_dataset_type,linked_service_name="SqlServer",info=None)
+    ],linked_services=list())
+
+def test_static_pipeline_cache():
+
+    pipeline = copy_pipeline()
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        file_path = os.path.join(folder_path,"static_pipelines.pickle")
+
+        static_pipeline = get_static_pipeline(pipeline=pipeline,\
+                                              catalog=static_pipeline_catalog(sink_dataset_type=DatasetType.Unsupported))
+
+        static_pipeline_cache = StaticPipelineCache(file_path=file_path)
+
+        get_static_pipeline(pipeline=pipeline,\
+                            catalog=static_pipeline_catalog(sink_dataset_type=DatasetType.Unsupported),\
+                            static_pipeline_cache=static_pipeline_cache)
+        
+        static_pipeline_cache.save()
+        
+        static_pipeline_cache = StaticPipelineCache(file_path=file_path)
+
+        cached_static_pipeline = get_static_pipeline(pipeline=pipeline,\
+                                                     catalog=static_pipeline_catalog(sink_dataset_type=DatasetType.Unsupported),\
+                                                     static_pipeline_cache=static_pipeline_cache)
+        
+        assert static_pipeline_cache.hit_count==1
+        assert cached_static_pipeline==static_pipeline
+        assert cached_static_pipeline.activities["Procedure"].raw_activity is pipeline.activities[0].activities[1]
+
+        # the dataset used by the pipeline has changed
+
+        changed_static_pipeline = get_static_pipeline(pipeline=pipeline,\
+                                                      catalog=static_pipeline_catalog(sink_dataset_type=DatasetType.Blob),\
+                                                      static_pipeline_cache=static_pipeline_cache)
+        
+        assert static_pipeline_cache.miss_count==1
+        assert changed_static_pipeline.activities["Copy"].is_output_supported
+
+def test_activity_graph_remove_node_connect_parents_to_children():
+
+    graph = ActivityGraph.from_edges(edges=[
+        Edge(node_name="A",parent_nodes=[]),
+        Edge(node_name="B",parent_nodes=[]),
+        Edge(node_name="C",parent_nodes=["A","B"]),
+        Edge(node_name="D",parent_nodes=["X","C"]),
+        Edge(node_name="E",parent_nodes=["C"])
+    ])
+
+    assert graph.remove_node(node_name="C")
+    assert not graph.remove_node(node_name="C")
+
+    assert graph.get_node_names()==["A","B","D","E"]
+    assert graph.get_parents(node_name="D")==["X","A","B"]
+    assert graph.get_children(node_name="A")==["D","E"]
+    assert graph.get_children(node_name="C")==[]
+
+def test_activity_graph_replace_node_with_graph():
+
+    edges = [
+        Edge(node_name="Prev",parent_nodes=[]),
+        Edge(node_name="FE",parent_nodes=["Prev"]),
+        Edge(node_name="Next",parent_nodes=["FE"])
+    ]
+
+    replace_edges = [
+        Edge(node_name="Body1",parent_nodes=[]),
+        Edge(node_name="Body2",parent_nodes=["Body1"]),
+        Edge(node_name="Alone",parent_nodes=[])
+    ]
+
+    new_edges = replace_node_with_edge(node_name="FE",\
+                                       replace_edges=replace_edges,\
+                                       edges=edges)
+    
+    assert get_node_names(edges=new_edges)=={"Prev","Next","Body1","Body2","Alone"}
+    assert get_parent_nodes(node_name="Next",edges=new_edges)=={"Body2","Alone"}
+    assert "Prev" in get_parent_nodes(node_name="Body1",edges=new_edges)
+    assert get_parent_nodes(node_name="Alone",edges=new_edges)=={"Prev"}
+
+    assert replace_node_with_edge(node_name="Missing",\
+                                  replace_edges=replace_edges,\
+                                  edges=edges) is None
+
+def test_remove_node_keep_edge_order():
+
+    edges = [
+        Edge(node_name="A",parent_nodes=[]),
+        Edge(node_name="B",parent_nodes=["A"]),
+        Edge(node_name="C",parent_nodes=["B"])
+    ]
+
+    new_edges = remove_node(node_name="B",edges=edges)
+
+    assert new_edges==[Edge(node_name="A",parent_nodes=[]),Edge(node_name="C",parent_nodes=["A"])]
+    assert remove_node(node_name="B",edges=new_edges) is None
+
+def test_metadata_catalog_find_by_name():
+
+    datasets = [
+        Dataset(name="Sales",type=DatasetType.AzureSQL,linked_service_name="SqlServer",info=None),
+        Dataset(name="sales",type=DatasetType.Blob,linked_service_name="Storage",info=None),
+        Dataset(name="Orders",type=DatasetType.AzureSQL,linked_service_name="SqlServer",info=None)
+    ]
+
+    catalog = MetadataCatalog(datasets=datasets,\
+                              linked_services=list())
+    
+    assert catalog.find_dataset(dataset_name="Sales").type==DatasetType.AzureSQL
+    assert catalog.find_dataset(dataset_name="sales").type==DatasetType.Blob
+    assert catalog.find_dataset(dataset_name="ORDERS").name=="Orders"
+    assert catalog.find_dataset(dataset_name="Customers") is None
+    assert catalog.find_linked_service(linked_service_name="SqlServer") is None
+
+def test_sql_lineage_cache_hit_and_eviction():
+
+    cache = SqlLineageCache(max_size=2)
+
+    assert get_sql_lineage(sql="select * from a",cache=cache)=={"a"}
+    assert get_sql_lineage(sql="  select * from a\r\n",cache=cache)=={"a"}
+    assert get_sql_lineage(sql="select * from b",cache=cache)=={"b"}
+    # the same sql in other dialect is parsed again
+    assert get_sql_lineage(sql="select * from b",dialect="tsql",cache=cache)=={"b"}
+
+    stats = cache.get_stats()
+
+    assert stats.hit_count==1
+    assert stats.miss_count==3
+    assert stats.eviction_count==1
+    assert stats.size==2
+
+def test_sql_lineage_cache_parse_failure():
+
+    cache = SqlLineageCache()
+
+    failed_count = 0
+
+    for _ in range(2):
+        try:
+            get_sql_lineage(sql="select from where (",cache=cache)
+        except Exception:
+            failed_count += 1
+
+    assert failed_count==2
+
+    stats = cache.get_stats()
+
+    assert stats.hit_count==1
+    assert stats.failed_count==1
+
+def test_sql_lineage_store_across_runs():
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        file_path = os.path.join(folder_path,"sql_lineage.sqlite")
+
+        cache = SqlLineageCache(store=SqlLineageStore(file_path=file_path))
+
+        assert get_sql_lineage(sql="select * from a join b on a.id=b.id",cache=cache)=={"a","b"}
+
+        try:
+            get_sql_lineage(sql="select from where (",cache=cache)
+        except Exception:
+            pass
+
+        cache.store.close()
+
+        # next run does not parse the sql again
+
+        cache = SqlLineageCache(store=SqlLineageStore(file_path=file_path))
+
+        assert get_sql_lineage(sql="select * from a join b on a.id=b.id",cache=cache)=={"a","b"}
+        assert cache.get(sql="select from where (",dialect=None)==(True,None)
+
+        stats = cache.get_stats()
+
+        assert stats.store_hit_count==2
+        assert stats.miss_count==0
+
+        cache.store.close()
+
+def test_sql_lineage_store_invalidated_on_version_change():
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        file_path = os.path.join(folder_path,"sql_lineage.sqlite")
+
+        store = SqlLineageStore(file_path=file_path)
+        store.put(sql_hash="hash",tables=frozenset({"a"}))
+        store.connection.execute("UPDATE meta SET value='0.0.0:0' WHERE key='version'")
+        store.close()
+
+        store = SqlLineageStore(file_path=file_path)
+
+        assert store.get(sql_hash="hash")==(False,None)
+
+        store.close()
+
+def test_get_sql_lineage_scoped_cte():
+
+    # c is only the cte inside the derived table
+    sql = "select * from (with c as (select * from a) select * from c) x join c on 1=1"
+
+    assert get_sql_lineage(sql=sql)=={"a","c"}
+
+    # the qualified table is not the cte
+    assert get_sql_lineage(sql="with c as (select * from dbo.c) select * from c")=={"dbo.c"}
+
+    # recursive cte refer to itself
+    sql = """
+    with tree as (select id,parent_id from hr.node where parent_id is null
+    union all select n.id,n.parent_id from hr.node n join tree t on n.parent_id=t.id)
+    select * from tree
+    """
+
+    assert get_sql_lineage(sql=sql)=={"hr.node"}
+
+def test_get_sql_lineage_interned_name():
+
+    first_table = get_sql_lineage(sql="select * from db.sales.orders").pop()
+
+    second_table = get_sql_lineage(sql="select id from db.sales.orders where id>1").pop()
+
+    assert first_table=="db.sales.orders"
+    assert first_table is second_table
+
+def test_get_sql_dialect():
+
+    assert get_sql_dialect(dataset_type=DatasetType.Oracle)=="oracle"
+    assert get_sql_dialect(dataset_type=DatasetType.AzureSQL)=="tsql"
+    assert get_sql_dialect(dataset_type=DatasetType.OnPrimeMSSQL)=="tsql"
+    assert get_sql_dialect(dataset_type=DatasetType.Synapse)=="tsql"
+    assert get_sql_dialect(dataset_type=DatasetType.Blob) is None
+
+def test_get_sql_lineage_tsql_bracket():
+
+    sql = "SELECT * FROM [dbo].[order detail] WITH (NOLOCK) JOIN [dbo].[customer] c ON 1=1"
+
+    assert get_sql_lineage(sql=sql,dialect="tsql")=={"dbo.order detail","dbo.customer"}
+
+def test_get_sql_lineage_tsql_temporary_table():
+
+    sql = "SELECT * FROM #temp t JOIN dbo.X x ON 1=1 JOIN ##global_temp g ON 1=1"
+
+    assert get_sql_lineage(sql=sql,dialect="tsql")=={"dbo.X"}
+
+    # the table which is named temp is not the temporary table
+
+    assert get_sql_lineage(sql="SELECT * FROM temp t JOIN dbo.X x ON 1=1",dialect="tsql")=={"temp","dbo.X"}
+
+def test_scan_sql_tables():
+
+    sql = """
+    WITH recent AS (SELECT * FROM sales.orders o WHERE o.id>1)
+    SELECT * FROM recent r, hr.staff s, hr.dept
+    JOIN "sales"."customer" c ON r.id=c.id
+    WHERE r.id IN (SELECT id FROM archive.orders)
+    """
+
+    assert scan_sql_tables(sql=sql,dialect="oracle")=={"sales.orders","sales.customer","hr.staff","hr.dept","archive.orders"}
+
+def test_sql_parse_budget_max_length():
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        file_path = os.path.join(folder_path,"sql_lineage.sqlite")
+
+        cache = SqlLineageCache(store=SqlLineageStore(file_path=file_path))
+
+        budget = SqlParseBudget(max_length=20)
+
+        assert get_sql_lineage(sql="select * from a join b on a.id=b.id",dialect="oracle",cache=cache,budget=budget)=={"a","b"}
+        assert get_sql_lineage(sql="select * from c",dialect="oracle",cache=cache,budget=budget)=={"c"}
+
+        stats = cache.get_stats().dialect_stats["oracle"]
+
+        assert stats.parse_count==2
+        assert stats.fallback_count==1
+
+        # the scanned tables are not kept across the runs
+
+        assert cache.store.get(sql_hash=get_sql_hash(sql="select * from a join b on a.id=b.id",dialect="oracle"))==(False,None)
+
+        cache.store.close()
+
+def test_sql_parse_budget_timeout():
+
+    sql = " UNION ALL ".join(f"SELECT a,b,c FROM s.t{x} WHERE a>{x}" for x in range(3000))
+
+    cache = SqlLineageCache()
+
+    tables = get_sql_lineage(sql=sql,cache=cache,budget=SqlParseBudget(timeout_seconds=0.001))
+
+    assert len(tables)==3000
+
+    assert cache.get_stats().dialect_stats["default"].fallback_count==1
+
+def query_copy_pipeline(pipeline_name:str,\
+                        sqls:List[Tuple[str,DatasetType]])->Tuple[StaticPipeline,PipelineRuntimeContext]:
+    """
+    Pipeline of the copy activities whose source is the sql
+    """
+
+    activities:Dict[str,GenericActivity] = dict()
+
+    activity_source_inputs:Dict[str,Dict[str,Any]] = dict()
+
+    for index,(sql,dataset_type) in enumerate(sqls):
+
+        name = f"Copy{index}"
+
+        activities[name] = GenericActivity(name=name,\
+                                           activity_type=ActivityType.Copy,\
+                                           input_dataset=Dataset(name="Source",\
+                                                                 type=dataset_type,\
+                                                                 linked_service_name=None,\
+                                                                 info=QueryDataset(name="Source",type=dataset_type,reference_name=None)),\
+                                           output_dataset=Dataset(name="Sink",\
+                                                                  type=DatasetType.AzureSQL,\
+                                                                  linked_service_name=None,\
+                                                                  info=SingleTableDataset(name="Sink",\
+                                                                                          type=DatasetType.AzureSQL,\
+                                                                                          schema=Parameter(value="dbo",parameter_type=ParameterType.Static),\
+                                                                                          table=Parameter(value=f"sink{index}",parameter_type=ParameterType.Static),\
+                                                                                          reference_name=None)),\
+                                           input_dataset_parameters=dict(),\
+                                           output_dataset_parameters=dict(),\
+                                           is_input_supported=True,\
+                                           is_output_supported=True,\
+                                           raw_activity=None)
+        
+        # the last activity is not run
+        if index<len(sqls)-1:
+
+            query_key = "oracleReaderQuery" if dataset_type==DatasetType.Oracle else "sqlReaderQuery"
+
+            activity_source_inputs[name] = {query_key:sql}
+
+    static_pipeline = StaticPipeline(pipeline_name=pipeline_name,\
+                                     virtual_graph=[Edge(node_name=x,parent_nodes=list()) for x in activities],\
+                                     activities=activities)
+    
+    runtime_context = PipelineRuntimeContext(pipeline_name=pipeline_name,\
+                                             run_id=f"{pipeline_name}-run",\
+                                             run_start=datetime(2024,1,1),\
+                                             run_end=datetime(2024,1,1),\
+                                             pipeline_run_status="Succeeded",\
+                                             pipeline_parameters=dict(),\
+                                             activity_source_inputs=activity_source_inputs)
+    
+    return (static_pipeline,runtime_context)
+
+def test_parse_sql_lineage_in_processes_same_as_serial():
+
+    sqls = [
+        ("select * from [dbo].[a] join [dbo].[b] on a.id=b.id",DatasetType.AzureSQL),
+        ("with c as (select * from hr.staff) select * from c",DatasetType.Oracle),
+        ("select * from sales.orders",DatasetType.OnPrimeMSSQL),
+        ("select from where (",DatasetType.Synapse)
+    ]
+
+    randomizer = random.Random(7)
+
+    static_pipelines:Dict[str,StaticPipeline] = dict()
+
+    runtime_contexts:Dict[str,PipelineRuntimeContext] = dict()
+
+    for index in range(20):
+
+        pipeline_sqls = [randomizer.choice(sqls) for _ in range(5)]
+
+        pipeline_sqls.insert(0,(f"select * from t{index}",DatasetType.AzureSQL))
+
+        static_pipelines[f"P{index}"],runtime_contexts[f"P{index}"] = query_copy_pipeline(pipeline_name=f"P{index}",sqls=pipeline_sqls)
+
+    def extract_lineage(cache:SqlLineageCache)->List[Any]:
+        return [get_pipeline_table_lineage(static_pipeline=static_pipelines[x],\
+                                           runtime_context=runtime_contexts[x],\
+                                           catalog=MetadataCatalog(datasets=list(),linked_services=list()),\
+                                           is_use_fqn=False,\
+                                           plugins=list(),\
+                                           synapse_workspace_name=None,\
+                                           logger=None,\
+                                           sql_lineage_cache=cache) for x in runtime_contexts]
+    
+    serial_lineage = extract_lineage(cache=SqlLineageCache(max_size=2))
+
+    cache = SqlLineageCache(max_size=2)
+
+    queries = get_source_sql_queries(static_pipelines=static_pipelines,runtime_contexts=runtime_contexts)
+
+    # the last activity of each pipeline is not run
+
+    assert len(queries)==20*5
+
+    assert parse_sql_lineage_in_processes(queries=queries,cache=cache,process_count=2)==24
+
+    assert extract_lineage(cache=cache)==serial_lineage
+
+    stats = cache.get_stats()
+
+    assert stats.miss_count==0
+    assert stats.eviction_count==0
+    assert stats.failed_count==1
+
+def test_openlineage_writer():
+
+    events = [{"eventType":"START","job":{"name":f"P{x}"}} for x in range(3)]
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        file_path = os.path.join(folder_path,"out","openlineage.json")
+
+        writer = OpenLineageWriter(file_path=file_path)
+
+        for event in events:
+            writer.write(event=event)
+
+        writer.close()
+
+        with open(file_path,"r") as file:
+            assert json.load(file)==events
+
+        writer = OpenLineageWriter(file_path=file_path,output_format=NDJSON_OUTPUT_FORMAT)
+
+        for event in events:
+            writer.write(event=event)
+
+        writer.close()
+
+        with open(file_path,"r") as file:
+            assert [json.loads(x) for x in file]==events
+
+        # nothing is written
+
+        writer = OpenLineageWriter(file_path=file_path)
+
+        writer.close()
+
+        with open(file_path,"r") as file:
+            assert json.load(file)==[]
+
+def test_openlineage_writer_abort_keep_previous_file():
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        file_path = os.path.join(folder_path,"openlineage.json")
+
+        writer = OpenLineageWriter(file_path=file_path)
+        writer.write(event={"eventType":"START"})
+        writer.close()
+
+        writer = OpenLineageWriter(file_path=file_path)
+        writer.write(event={"eventType":"COMPLETE"})
+        writer.abort()
+
+        with open(file_path,"r") as file:
+            assert json.load(file)==[{"eventType":"START"}]
+
+        assert os.listdir(folder_path)==["openlineage.json"]
+
+def test_serializer_dataclass_same_as_asdict():
+
+    lineage = [
+        PipelineLineage(pipeline_name="A",lineage=[Edge(node_name="t",parent_nodes=["s1","s2"])]),
+        {"pipeline_name":"B","lineage":[]}
+    ]
+
+    expected = [asdict(lineage[0]),lineage[1]]
+
+    backends = [JSON_BACKEND]
+
+    try:
+        import orjson
+        backends.append(ORJSON_BACKEND)
+    except ImportError:
+        pass
+
+    for backend in backends:
+        for is_compact in [True,False]:
+
+            raw_lineage = dumps(value=lineage,is_compact=is_compact,backend=backend)
+
+            assert json.loads(raw_lineage)==expected
+            assert (b"\n" not in raw_lineage)==is_compact
+
+            file = io.BytesIO()
+
+            dump(value=lineage,file=file,is_compact=is_compact,backend=backend)
+
+            assert file.getvalue()==raw_lineage
+
+def test_dictionary_lineage_round_trip():
+
+    pipeline_lineage = [
+        PipelineLineage(pipeline_name="A",lineage=[Edge(node_name="s",parent_nodes=[]),\
+                                                   Edge(node_name="t",parent_nodes=["s","u"])]),
+        {"pipeline_name":"B","lineage":[{"node_name":"v","parent_nodes":["t","s"]}]}
+    ]
+
+    raw_lineage = to_dictionary_lineage(pipeline_lineage=pipeline_lineage)
+
+    assert raw_lineage["nodes"]==["s","t","u","v"]
+    assert raw_lineage["pipelines"][0]["edges"]==[[0,-1],[1,0],[1,2]]
+
+    assert from_dictionary_lineage(raw_lineage=raw_lineage)==[asdict(pipeline_lineage[0]),pipeline_lineage[1]]
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        file_path = os.path.join(folder_path,"lineage.json")
+
+        with open(file_path,"w") as file:
+            json.dump(raw_lineage,file)
+
+        assert load_lineage(file_path=file_path)==[asdict(pipeline_lineage[0]),pipeline_lineage[1]]
+
+def test_add_lineage_intern_node_name():
+
+    # build the name at runtime so that it is not the same constant object
+    target = "".join(["db.","dbo.target"])
+    source = "".join(["db.","dbo.source"])
+
+    lineage = add_lineage(initial_lineage=list(),sources={source},target=target)
+    lineage = add_lineage(initial_lineage=lineage,sources={"".join(["db.","dbo.source"])},target="".join(["db.","dbo.other"]))
+
+    assert lineage[0].parent_nodes[0] is lineage[1].parent_nodes[0]
+
+def test_lineage_accumulator_same_as_add_lineage():
+
+    randomizer = random.Random(3)
+
+    tables = [f"dbo.t{x}" for x in range(30)]
+
+    for _ in range(50):
+
+        lineage:List[Edge] = list()
+
+        accumulator = LineageAccumulator()
+
+        for _ in range(randomizer.randint(1,40)):
+
+            sources = set(randomizer.sample(tables,randomizer.randint(0,4)))
+
+            target = randomizer.choice(tables)
+
+            lineage = add_lineage(initial_lineage=lineage,sources=sources,target=target)
+
+            accumulator.add(sources=sources,target=target)
+
+        assert accumulator.to_edges()==lineage
+
+def test_to_pipeline_lineage_context_merge_activities():
+
+    activity_lineage = [
+        ActivityLineageContext(pipeline_name="P",\
+                               pipeline_run_id="run",\
+                               pipeline_run_status="Succeeded",\
+                               pipeline_run_start=datetime(2024,1,1),\
+                               pipeline_run_end=datetime(2024,1,1),\
+                               activity_name=f"Copy{x}",\
+                               activity_type="Copy",\
+                               lineage=[Edge(node_name="t",parent_nodes=[f"s{x}","s0"])])
+        for x in range(3)
+    ]
+
+    pipeline_context = to_pipeline_lineage_context(activity_lineage_context=activity_lineage)
+
+    assert [x.node_name for x in pipeline_context.lineage]==["t"]
+    assert pipeline_context.lineage[0].parent_nodes==["s0","s1","s2"]
+
+def pairwise_merge_edges(graphs:List[List[Edge]])->List[Edge]:
+
+    if len(graphs)==0:
+        return list()
+
+    merge_graph = graphs[0]
+
+    for index in range(1,len(graphs)):
+        merge_graph = merge_edge(left_edges=merge_graph,right_edges=graphs[index])
+
+    return merge_graph
+
+def test_merge_edges_same_as_pairwise_merge():
+
+    randomizer = random.Random(5)
+
+    tables = [f"dbo.t{x}" for x in range(40)]
+
+    for _ in range(100):
+
+        graphs = [
+            [Edge(node_name=randomizer.choice(tables),parent_nodes=randomizer.sample(tables,randomizer.randint(0,3)))
+             for _ in range(randomizer.randint(1,4))]
+            for _ in range(randomizer.randint(2,30))
+        ]
+
+        assert merge_edges(graphs=graphs)==pairwise_merge_edges(graphs=graphs)
+
+        sorted_edges = merge_edges(graphs=graphs,is_sorted=True)
+
+        assert [x.node_name for x in sorted_edges]==sorted(x.node_name for x in sorted_edges)
+        assert sorted_edges==merge_edges(graphs=list(reversed(graphs)),is_sorted=True)
+
+# instrumentation test
+
+def test_instrument_count_calls_and_errors():
+
+    @instrument(name="test.get_items",failed_result=None)
+    def get_items(is_failed:bool)->Optional[List[int]]:
+        return None if is_failed else [1]
+
+    @instrument(name="test.fetch_items")
+    async def fetch_items()->List[int]:
+        raise ValueError("fail")
+
+    INSTRUMENTATION.enable()
+
+    try:
+        get_items(is_failed=False)
+        get_items(is_failed=True)
+
+        try:
+            asyncio.run(fetch_items())
+        except ValueError:
+            pass
+
+        record_http_request(seconds=0.5,status_code=429,headers={"Content-Length":"100"})
+        record_http_request(seconds=0.25,status_code=200,headers={})
+
+        report = INSTRUMENTATION.get_report(exit_code=0)
+
+    finally:
+        INSTRUMENTATION.disable()
+
+    assert report["calls"]["test.get_items"]["call_count"]==2
+    assert report["calls"]["test.get_items"]["error_count"]==1
+    assert report["calls"]["test.fetch_items"]["error_count"]==1
+
+    http_stats = report["calls"][HTTP_REQUEST_NAME]
+
+    assert http_stats["call_count"]==2
+    assert http_stats["error_count"]==1
+    assert http_stats["byte_count"]==100
+    assert http_stats["max_seconds"]==0.5
+
+def test_instrument_disabled():
+
+    @instrument(name="test.disabled")
+    def get_value()->int:
+        return 1
+
+    INSTRUMENTATION.enable()
+    INSTRUMENTATION.disable()
+
+    assert get_value()==1
+
+    INSTRUMENTATION.start_stage(name="disabled")
+    INSTRUMENTATION.add_byte_count(name="test.disabled",byte_count=10)
+
+    report = INSTRUMENTATION.get_report(exit_code=0)
+
+    assert report["calls"]=={}
+    assert report["stages"]=={}
+
+def test_run_report():
+
+    INSTRUMENTATION.enable()
+
+    try:
+        INSTRUMENTATION.start_stage(name="extract_datasets")
+        INSTRUMENTATION.start_stage(name="extract_lineage")
+        INSTRUMENTATION.record(name="AzureClient.get_datasets",seconds=1.5)
+
+        report = INSTRUMENTATION.get_report(exit_code=1)
+
+    finally:
+        INSTRUMENTATION.disable()
+
+    assert list(report["stages"].keys())==["extract_datasets","extract_lineage"]
+    assert report["failed_stage"]=="extract_lineage"
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        file_path = os.path.join(folder_path,"report","run_report.json")
+
+        write_run_report(file_path=file_path,report=report)
+
+        with open(file_path,"r") as file:
+            assert json.load(file)["calls"]["AzureClient.get_datasets"]["seconds"]==1.5
+
+    text = to_prometheus_text(report=report)
+
+    assert "azure_lineage_exit_code 1\n" in text
+    assert 'azure_lineage_stage_seconds{stage="extract_lineage"}' in text
+    assert 'azure_lineage_calls_total{name="AzureClient.get_datasets"} 1\n' in text
+    assert "# TYPE azure_lineage_errors_total counter" in text
+
+# replay test
+
+def get_replay_runtime_contexts(client:ReplayAzureClient)->Dict[str,PipelineRuntimeContext]:
+
+    pipeline_names = [x.name for x in client.get_pipelines()]
+
+    return get_runtime_contexts(client=client,\
+                                pipeline_runs=client.get_bulk_pipeline_runs(pipeline_names=pipeline_names),\
+                                concurrency=2)
+
+def test_replay_synthetic_factory():
+
+    factory = SyntheticFactory(pipeline_count=5,\
+                               activity_count=3,\
+                               nesting_depth=3,\
+                               table_count=20,\
+                               linked_service_count=2)
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        save_synthetic_snapshot(folder_path=folder_path,factory=factory)
+
+        client = ReplayAzureClient(folder_path=folder_path)
+
+        assert len(get_datasets(client=client))==22
+        assert len(get_linked_service(client=client))==2
+
+        pipelines = client.get_pipelines()
+
+        assert [x.name for x in pipelines]==[f"Pipeline{x}" for x in range(5)]
+
+        # 3 copies , ForEach(2 copies , If(2 copies , ForEach(2 copies)) x 2)
+        activity_types = [x.type for x in expand_activities(raw_activities=pipelines[0].activities).values()]
+
+        assert activity_types.count("ForEach")==3
+        assert activity_types.count("IfCondition")==1
+        assert activity_types.count("Copy")==3+2+2*(2+2)
+
+        runtime_contexts = get_replay_runtime_contexts(client=client)
+
+        assert set(runtime_contexts.keys())=={x.name for x in pipelines}
+        assert runtime_contexts["Pipeline0"].pipeline_parameters["is_full"]=="true"
+        assert any("sqlReaderQuery" in x for x in runtime_contexts["Pipeline0"].activity_source_inputs.values())
+
+        # the same factory give the same snapshot
+
+        with tempfile.TemporaryDirectory() as other_folder_path:
+
+            save_synthetic_snapshot(folder_path=other_folder_path,factory=factory)
+
+            for file_name in os.listdir(folder_path):
+                with open(os.path.join(folder_path,file_name),"rb") as file,\
+                    open(os.path.join(other_folder_path,file_name),"rb") as other_file:
+                    assert file.read()==other_file.read()
+
+def test_replay_missing_snapshot():
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        client = ReplayAzureClient(folder_path=folder_path)
+
+        assert client.get_datasets() is None
+        assert client.get_pipelines() is None
+        assert client.get_triggers()==[]
+        assert client.get_bulk_pipeline_runs(pipeline_names=["P1"])=={}
+
+def test_record_snapshot_replay_same_as_recorded():
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        recorded_folder_path = os.path.join(folder_path,"recorded")
+
+        save_synthetic_snapshot(folder_path=folder_path,\
+                                factory=SyntheticFactory(pipeline_count=3,table_count=10,nesting_depth=2))
+
+        client = ReplayAzureClient(folder_path=folder_path)
+
+        assert record_snapshot(client=client,folder_path=recorded_folder_path)
+
+        recorded_client = ReplayAzureClient(folder_path=recorded_folder_path)
+
+        assert [asdict(x) for x in get_datasets(client=recorded_client)]==[asdict(x) for x in get_datasets(client=client)]
+        assert [x.serialize() for x in recorded_client.get_pipelines()[0].activities]==[x.serialize() for x in client.get_pipelines()[0].activities]
+        assert get_replay_runtime_contexts(client=recorded_client)==get_replay_runtime_contexts(client=client)
+
+def test_async_replay_same_as_sync():
+
+    with tempfile.TemporaryDirectory() as folder_path:
+
+        save_synthetic_snapshot(folder_path=folder_path,\
+                                factory=SyntheticFactory(pipeline_count=4,table_count=10))
+
+        client = ReplayAzureClient(folder_path=folder_path)
+
+        async def get_async_runtime_contexts()->Dict[str,PipelineRuntimeContext]:
+
+            async with AsyncReplayAzureClient(folder_path=folder_path) as async_client:
+
+                pipeline_names = [x.name for x in await async_client.get_pipelines()]
+
+                return await gather_runtime_contexts(client=async_client,\
+                                                     pipeline_runs=await async_client.get_bulk_pipeline_runs(pipeline_names=pipeline_names),\
+                                                     concurrency=2)
+
+        assert asyncio.run(get_async_runtime_contexts())==get_replay_runtime_contexts(client=client)
+
 def run_all_test():
 
     tests = [func for func_name,func in list(globals().items()) if func_name.startswith("test_")]
@@ -13,11 +13,13 @@ from typing import (
     Dict,
     Optional,
     Any,
-    Tuple
+    Tuple,
+    Iterable
 )
 from graph import (
     Edge,
-    merge_edge
+    merge_edge,
+    intern_node_name
 )
 from plugin import (
     LineageEdge,
@@ -60,13 +62,61 @@ def has_field(obj:object,field_name:str)->bool:
     return hasattr(obj,field_name)
 
 
+def get_batches(values:List[Any],batch_size:int)->List[List[Any]]:
+    """
+    Split the values into the list of batch which have at most batch_size values
+    """
+
+    if batch_size<1:
+        return [list(values)]
+
+    return [values[index:index+batch_size] for index in range(0,len(values),batch_size)]
+
+class LineageAccumulator:
+    """
+    Lineage which is built edge by edge.
+    It give the same edges as calling add_lineage for each edge
+    but the edge is added without rebuilding the whole lineage so building n edges is O(n) instead of O(n^2)
+    """
+    def __init__(self):
+        # target -> sources (dict with None value to keep the order of the sources)
+        self.sources:Dict[str,Dict[str,None]] = dict()
+
+    def __len__(self)->int:
+        return len(self.sources)
+
+    def add(self,sources:Iterable[str],target:str)->None:
+        """
+        Add the sources of the target. The sources which the target already have are ignored
+        """
+
+        target_sources = self.sources.get(target)
+
+        if target_sources is None:
+            target_sources = dict()
+            self.sources[intern_node_name(node_name=target)] = target_sources
+
+        for source in sources:
+            if source not in target_sources:
+                target_sources[intern_node_name(node_name=source)] = None
+
+    def extend(self,edges:Iterable[Edge])->None:
+        for edge in edges:
+            self.add(sources=edge.parent_nodes,target=edge.node_name)
+
+    def to_edges(self)->List[Edge]:
+        return [Edge(node_name=target,parent_nodes=list(sources)) for target,sources in self.sources.items()]
+
+    def to_lineage_edges(self)->List[LineageEdge]:
+        return [LineageEdge(node_name=target,parent_nodes=list(sources)) for target,sources in self.sources.items()]
+
 def add_lineage(initial_lineage:List[Edge],\
-                sources:Set[str],\
+                sources:Iterable[str],\
                 target:str)->List[Edge]:
     
     new_edge = Edge(
-        node_name=target,
-        parent_nodes=list(sources)
+        node_name=intern_node_name(node_name=target),
+        parent_nodes=[intern_node_name(node_name=x) for x in sources]
     )
 
     if len(initial_lineage)==0:
@@ -103,17 +153,12 @@ def to_pipeline_lineage_context(activity_lineage_context:List[ActivityLineageCon
     if len(pipeline_names)>1:
         return None
     
-    pipeline_lineage:List[Edge] = list()
+    pipeline_lineage = LineageAccumulator()
 
     first_activity = activity_lineage_context[0]
 
     for activity_context in activity_lineage_context:
-
-        for lineage in activity_context.lineage:
-
-            pipeline_lineage = add_lineage(initial_lineage=pipeline_lineage,\
-                                           sources=set(lineage.parent_nodes),\
-                                           target=lineage.node_name)
+        pipeline_lineage.extend(edges=activity_context.lineage)
             
     return PipelineLineageContext(
         pipeline_name=first_activity.pipeline_name,\
@@ -121,7 +166,7 @@ def to_pipeline_lineage_context(activity_lineage_context:List[ActivityLineageCon
         pipeline_run_status=first_activity.pipeline_run_status,\
         pipeline_run_start=first_activity.pipeline_run_start,\
         pipeline_run_end=first_activity.pipeline_run_end,\
-        lineage=to_lineage_edge(edges=pipeline_lineage)
+        lineage=pipeline_lineage.to_lineage_edges()
     )
 
 def get_activity_lineage_infos(raw_pipeline_names:Set[str],\
@@ -0,0 +1,97 @@
+from typing import (
+    Dict,
+    Any,
+    Optional,
+    BinaryIO
+)
+from pathlib import Path
+from serializer import dumps
+import os
+
+# json array of the events
+JSON_OUTPUT_FORMAT = "json"
+
+# one event per line (the format of the openlineage file transport)
+NDJSON_OUTPUT_FORMAT = "ndjson"
+
+OUTPUT_FORMATS = {JSON_OUTPUT_FORMAT,NDJSON_OUTPUT_FORMAT}
+
+class OpenLineageWriter:
+    """
+    Write the openlineage events to the file one by one so that the events of the whole run are not kept in memory.
+    The events are written to the temporary file which replace the file when the writer is closed
+    """
+    def __init__(self,file_path:str,output_format:str=JSON_OUTPUT_FORMAT):
+        """
+        output_format : JSON_OUTPUT_FORMAT or NDJSON_OUTPUT_FORMAT
+        """
+
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"unsupported openlineage output format {output_format}")
+
+        self.file_path = Path(file_path)
+
+        self.output_format = output_format
+
+        self.event_count = 0
+
+        self.file_path.parent.mkdir(parents=True,exist_ok=True)
+
+        self.temp_file_path = self.file_path.with_name(f"{self.file_path.name}.tmp")
+
+        self.file:Optional[BinaryIO] = self.temp_file_path.open("wb")
+
+        if self.output_format==JSON_OUTPUT_FORMAT:
+            self.file.write(b"[")
+
+    def write(self,event:Dict[str,Any])->None:
+
+        raw_event = dumps(value=event,is_compact=True)
+
+        if self.output_format==JSON_OUTPUT_FORMAT:
+
+            if self.event_count>0:
+                self.file.write(b",")
+
+            self.file.write(b"\n")
+            self.file.write(raw_event)
+
+        else:
+            self.file.write(raw_event)
+            self.file.write(b"\n")
+
+        self.event_count += 1
+
+    def close(self)->None:
+        """
+        Finish the file and replace the output file with it
+        """
+
+        if self.file is None:
+            return
+
+        if self.output_format==JSON_OUTPUT_FORMAT:
+            self.file.write(b"\n]" if self.event_count>0 else b"]")
+
+        self.file.close()
+
+        self.file = None
+
+        os.replace(self.temp_file_path,self.file_path)
+
+    def abort(self)->None:
+        """
+        Remove the unfinished file. The output file of the previous run is kept
+        """
+
+        if self.file is None:
+            return
+
+        self.file.close()
+
+        self.file = None
+
+        try:
+            os.remove(self.temp_file_path)
+        except OSError:
+            pass